@@ -0,0 +1,166 @@
+import os
+
+import pandas as pd
+
+import GuildData
+from Storage import FileStorage, atomic_write
+from logging_config import setup_logging
+
+# pyarrow is optional. Without it analytics read the CSV files directly.
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+logger = setup_logging()
+
+# Tables whose history is archived
+ARCHIVE_TABLES = ("points", "interviews")
+# Columns with few distinct values, stored dictionary-encoded
+DICTIONARY_COLUMNS = {"Name", "Pledge", "Brother", "Requester"}
+# Each update appends the new rows as one part file. Beyond this many parts they are merged into one.
+MAX_PARTS = 64
+
+
+def available(storage=None) -> bool:
+    """
+    Check if archives can be used for a storage backend (pyarrow is installed and the data is on disk)
+    """
+    storage = storage or GuildData.storage()
+    return pq is not None and isinstance(storage, FileStorage)
+
+
+def archive_dir(storage, table: str) -> str:
+    return storage.path(f"{table}_archive")
+
+
+def _manifest_name(table: str) -> str:
+    # Lists the archive's part files and the CSV position they cover
+    return f"{table}_archive"
+
+
+def _to_arrow(df: pd.DataFrame):
+    arrow_table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, field in enumerate(arrow_table.schema):
+        if field.name in DICTIONARY_COLUMNS and pa.types.is_string(field.type):
+            arrow_table = arrow_table.set_column(i, field.name, arrow_table.column(i).dictionary_encode())
+    return arrow_table
+
+
+def _write_part(storage, table: str, arrow_table, number: int) -> str:
+    directory = archive_dir(storage, table)
+    os.makedirs(directory, exist_ok=True)
+    name = f"part-{number:05d}.parquet"
+    sink = pa.BufferOutputStream()
+    pq.write_table(arrow_table, sink)
+    atomic_write(os.path.join(directory, name), sink.getvalue().to_pybytes())
+    return name
+
+
+def _remove_unlisted(storage, table: str, parts: list[str]):
+    # Drops parts replaced by a rebuild or merge, and any left behind by a crash before the manifest was written
+    directory = archive_dir(storage, table)
+    for name in os.listdir(directory):
+        if name.endswith(".parquet") and name not in parts:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError as e:
+                logger.warning(f"Could not remove old archive part {name}: {str(e)}")
+
+
+def _to_pandas(arrow_table) -> pd.DataFrame:
+    df = arrow_table.to_pandas()
+    # Dictionary columns come back as categoricals; callers group and compare them as plain strings
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(object)
+    return df
+
+
+def _read(storage, table: str, manifest: dict):
+    directory = archive_dir(storage, table)
+    parts = [pq.read_table(os.path.join(directory, name)) for name in manifest["parts"]]
+    # A part whose rows were all missing a value has a null column where the others have a type
+    return pa.concat_tables(parts, promote_options="default")
+
+
+def update(storage=None, table: str = "points") -> int:
+    """
+    Bring a table's archive up to date with the rows currently in its CSV file.
+    Only rows added since the last update are parsed, and they are written as a new part file, so the
+    archived history is never rewritten unless the CSV file was or the parts need merging.
+
+    :param storage: Storage to archive, defaults to the current guild's
+    :param table: Table name
+    :return: Number of rows added to the archive
+    """
+    storage = storage or GuildData.storage()
+    if not available(storage):
+        return 0
+
+    manifest = storage.read_json(_manifest_name(table))
+    tail = storage.read_tail(table, manifest["position"]) if manifest is not None else None
+    if tail is None:
+        # First update, or the CSV file was rewritten: start over with the whole file as one part
+        rows, position = storage.read_tail(table)
+        parts = []
+        number = manifest["next"] if manifest is not None else 0
+    else:
+        rows, position = tail
+        if rows.empty:
+            return 0
+        parts = list(manifest["parts"])
+        number = manifest["next"]
+
+    parts.append(_write_part(storage, table, _to_arrow(rows), number))
+    number += 1
+    if len(parts) > MAX_PARTS:
+        try:
+            merged = _read(storage, table, {"parts": parts})
+        except Exception as e:
+            logger.warning(f"Rebuilding unreadable {table} archive: {str(e)}")
+            rows, position = storage.read_tail(table)
+            merged = _to_arrow(rows)
+        parts = [_write_part(storage, table, merged, number)]
+        number += 1
+    # The part files are on disk before the manifest points at them, so a crash never loses archived rows
+    storage.write_json(_manifest_name(table), {"parts": parts, "position": position, "next": number})
+    _remove_unlisted(storage, table, parts)
+    logger.info(f"Archived {len(rows)} {table} rows in {len(parts)} parts")
+    return len(rows)
+
+
+def load_table(table: str, storage=None) -> pd.DataFrame:
+    """
+    Read a whole table for analytics. Archived rows are decoded from the typed, columnar Parquet parts
+    and only the rows written since the last archive update are parsed from the CSV file. Rows are
+    returned with pledge names, like Storage.read_table.
+
+    :param table: Table name
+    :param storage: Storage to read, defaults to the current guild's
+    :return: The table as a DataFrame
+    """
+    storage = storage or GuildData.storage()
+    if not available(storage) or storage.pending(table):
+        return storage.read_table(table)
+    manifest = storage.read_json(_manifest_name(table))
+    if manifest is None:
+        return storage.read_table(table)
+    try:
+        arrow_table = _read(storage, table, manifest)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable {table} archive: {str(e)}")
+        return storage.read_table(table)
+
+    tail = storage.read_tail(table, manifest["position"])
+    if tail is None:
+        # The CSV file was rewritten since the archive was updated
+        return storage.read_table(table)
+    rows, _ = tail
+    df = _to_pandas(arrow_table)
+    if not rows.empty:
+        df = pd.concat([df, rows], ignore_index=True)
+    # The archive holds pledge IDs, so renames and merges never make it stale
+    return storage.resolve(table, df)
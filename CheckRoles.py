@@ -1,8 +1,25 @@
 import discord
+from discord import app_commands
 
+import GuildData
 
 # Get configured logger
 
+BROTHER_ROLE = "Brother"
+VP_INTERNAL_ROLE = "VP Internal"
+
+# Guild ID -> {role name: set of role IDs with that name}
+# Kept up to date by invalidate_roles() from the guild role events in main.py
+_role_cache: dict[int, dict[str, frozenset]] = {}
+
+
+async def _deny(interaction: discord.Interaction, message: str):
+    # Deferred interactions can only be answered with a followup
+    if interaction.response.is_done():
+        await interaction.followup.send(message, ephemeral=True)
+    else:
+        await interaction.response.send_message(message, ephemeral=True)
+
 
 def check_pledge(name):
     """
@@ -12,12 +29,63 @@ def check_pledge(name):
     Returns:
         bool: True if pledge exists, False otherwise
     """
-    with open('pledges.csv', 'r') as fil:
-        pledge_names = [line.rstrip('\n') for line in fil]
-        if name in pledge_names:
-            return True
-        else:
-            return False
+    pledge_names = GuildData.storage().read_pledges()
+    if name in pledge_names:
+        return True
+    else:
+        return False
+
+
+def _build_role_map(guild) -> dict[str, frozenset]:
+    role_map = {}
+    for role in guild.roles:
+        role_map.setdefault(role.name, set()).add(role.id)
+    role_map = {name: frozenset(ids) for name, ids in role_map.items()}
+    _role_cache[guild.id] = role_map
+    return role_map
+
+
+def get_role_ids(guild, role_name: str) -> frozenset:
+    """
+    Get the IDs of the roles with a given name in a guild, using the per-guild cache
+    Args:
+        guild (discord.Guild): The guild to look in
+        role_name (str): Name of the role
+    Returns:
+        frozenset: Role IDs, empty if the guild has no such role
+    """
+    role_map = _role_cache.get(guild.id)
+    if role_map is None or role_name not in role_map:
+        # Rebuild on a miss in case the role was created before the cache saw it
+        role_map = _build_role_map(guild)
+    return role_map.get(role_name, frozenset())
+
+
+def invalidate_roles(guild_id: int = None):
+    """
+    Drop the cached roles for a guild, or for every guild if no ID is given
+    """
+    if guild_id is None:
+        _role_cache.clear()
+    else:
+        _role_cache.pop(guild_id, None)
+
+
+def has_role(interaction: discord.Interaction, role_name: str) -> bool:
+    """
+    Check if the user who triggered the interaction has a role, without sending any message
+    Args:
+        interaction (discord.Interaction): The interaction to check
+        role_name (str): Name of the required role
+    Returns:
+        bool: True if the user has the role, False otherwise
+    """
+    if interaction.guild is None:
+        return False
+    role_ids = get_role_ids(interaction.guild, role_name)
+    if not role_ids:
+        return False
+    return not role_ids.isdisjoint(role.id for role in interaction.user.roles)
 
 
 async def check_vp_internal_role(interaction: discord.Interaction) -> bool:
@@ -31,12 +99,8 @@ async def check_vp_internal_role(interaction: discord.Interaction) -> bool:
         an ephemeral message to the user and returns ``False``.
     :rtype: bool
     """
-    vp_role = discord.utils.get(interaction.guild.roles, name="VP Internal")
-    if vp_role is None or vp_role not in interaction.user.roles:
-        await interaction.response.send_message(
-            "You must have the VP Internal role to use this command.",
-            ephemeral=True
-        )
+    if not has_role(interaction, VP_INTERNAL_ROLE):
+        await _deny(interaction, "You must have the VP Internal role to use this command.")
         return False
     return True
 
@@ -51,8 +115,36 @@ async def check_brother_role(interaction: discord.Interaction) -> bool:
     Returns:
         bool: True if user has Brother role, False otherwise
     """
-    brother_role = discord.utils.get(interaction.guild.roles, name="Brother")
-    if brother_role is None or brother_role not in interaction.user.roles:
-        await interaction.response.send_message("You must have the Brother role to use this command.", ephemeral=True)
+    if not has_role(interaction, BROTHER_ROLE):
+        await _deny(interaction, "You must have the Brother role to use this command.")
         return False
     return True
+
+
+def require_role(role_name: str):
+    """
+    App command check that only lets members with the given role run the command.
+    Failures raise app_commands.MissingRole, which the tree error handler reports to the user.
+
+    :param role_name: Name of the required role
+    """
+    def predicate(interaction: discord.Interaction) -> bool:
+        if not has_role(interaction, role_name):
+            raise app_commands.MissingRole(role_name)
+        return True
+
+    return app_commands.check(predicate)
+
+
+def brother_only():
+    """
+    App command check requiring the Brother role
+    """
+    return require_role(BROTHER_ROLE)
+
+
+def vp_internal_only():
+    """
+    App command check requiring the VP Internal role
+    """
+    return require_role(VP_INTERNAL_ROLE)
@@ -0,0 +1,45 @@
+import time
+from collections import OrderedDict
+
+
+class ExpiringCache:
+    """
+    A bounded least-recently-used mapping whose entries expire a fixed time after they were stored.
+    Not thread safe; callers that share one across threads hold their own lock.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key) -> tuple[bool, object]:
+        """
+        Look up a key, dropping it if it has expired
+        Returns:
+            tuple: (whether the key was found, its value or None)
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        stored_at, value = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def put(self, key, value):
+        """
+        Store a value, dropping the least recently used entries beyond max_entries
+        """
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,236 @@
+import contextvars
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+from Storage import FileStorage, MemoryStorage, PLEDGES_FILE, TABLES
+from logging_config import setup_logging
+
+logger = setup_logging()
+
+# Root directory for all data files
+DATA_DIR = os.getenv("DATA_DIR", ".")
+# Directory holding one data directory per guild
+GUILD_DATA_DIR = os.getenv("GUILD_DATA_DIR", os.path.join(DATA_DIR, "guilds"))
+# "file" for CSV files on disk, "memory" to keep everything in memory
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "file")
+# Buffer table writes in memory and write them to disk in groups (see FileStorage). Set WRITE_BEHIND=0 to
+# write every change to disk immediately.
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "1") == "1"
+# Guild that adopts data files left in the working directory by older versions of the bot
+PRIMARY_GUILD_ID = os.getenv("PRIMARY_GUILD_ID")
+# Stores that have not been used for this many seconds are evicted
+IDLE_TIMEOUT = 30 * 60
+
+
+def make_storage(directory: str):
+    """
+    Create a storage backend of the configured type for a directory
+    """
+    if STORAGE_BACKEND == "memory":
+        return MemoryStorage()
+    return FileStorage(directory, write_behind=WRITE_BEHIND)
+
+
+class GuildStore:
+    """
+    The data of a single guild, kept in its own storage backend.
+    Derived data that is expensive to rebuild can be kept in `cache` and is dropped when the store is evicted.
+    """
+
+    def __init__(self, guild_id, storage):
+        self.guild_id = guild_id
+        self.storage = storage
+        self.cache = {}
+        self.last_used = time.monotonic()
+
+    def path(self, filename: str) -> str:
+        """
+        Get the path of one of this guild's files
+        """
+        return self.storage.path(filename)
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+
+class GuildRegistry:
+    """
+    Lazily loads a GuildStore the first time a guild is used and evicts stores that go idle
+    """
+
+    def __init__(self, root: str = GUILD_DATA_DIR):
+        self.root = root
+        self._stores: dict[int, GuildStore] = {}
+
+    def get(self, guild_id: int) -> GuildStore:
+        """
+        Get the store for a guild, loading it if needed
+        """
+        store = self._stores.get(guild_id)
+        if store is None:
+            directory = os.path.join(self.root, str(guild_id))
+            store = GuildStore(guild_id, make_storage(directory))
+            if not os.path.exists(directory) and str(guild_id) == PRIMARY_GUILD_ID:
+                _adopt_legacy_files(directory)
+            store.storage.ensure_files()
+            self._stores[guild_id] = store
+            logger.info(f"Loaded data store for guild {guild_id}")
+        store.touch()
+        return store
+
+    def loaded(self) -> list[GuildStore]:
+        """
+        Get the stores that are currently loaded
+        """
+        return list(self._stores.values())
+
+    def evict_idle(self, max_idle: float = IDLE_TIMEOUT) -> int:
+        """
+        Drop stores that have not been used recently, flushing and snapshotting their files first.
+        Stores kept only in memory are never dropped, since they hold the guild's only copy of its data.
+        Returns:
+            int: Number of stores evicted
+        """
+        now = time.monotonic()
+        idle = [guild_id for guild_id, store in self._stores.items()
+                if now - store.last_used > max_idle and isinstance(store.storage, FileStorage)]
+        evicted = 0
+        for guild_id in idle:
+            storage = self._stores[guild_id].storage
+            try:
+                storage.flush()
+            except Exception as e:
+                # Keep the store so its buffered writes are not lost
+                logger.error(f"Failed to flush data of guild {guild_id}: {str(e)}")
+                continue
+            try:
+                storage.snapshot()
+            except Exception as e:
+                logger.error(f"Failed to snapshot data of guild {guild_id}: {str(e)}")
+            del self._stores[guild_id]
+            evicted += 1
+            logger.info(f"Evicted idle data store for guild {guild_id}")
+        return evicted
+
+
+def _adopt_legacy_files(directory: str):
+    if STORAGE_BACKEND != "file":
+        return
+    os.makedirs(directory, exist_ok=True)
+    for filename in [PLEDGES_FILE] + [filename for filename, _ in TABLES.values()]:
+        legacy = os.path.join(DATA_DIR, filename)
+        if os.path.exists(legacy):
+            shutil.copy2(legacy, os.path.join(directory, filename))
+            logger.info(f"Copied legacy {filename} into {directory}")
+
+
+registry = GuildRegistry()
+
+# Store used outside of any guild, e.g. in scripts and tests. Uses DATA_DIR itself.
+default_store = GuildStore(None, make_storage(DATA_DIR))
+
+# Store of the guild the current command is running for, None for the default store. Every interaction
+# runs in its own asyncio task with its own copy of the context, so guilds never see each other's store.
+_current_store = contextvars.ContextVar("current_store", default=None)
+
+
+def current() -> GuildStore:
+    """
+    Get the store of the guild the current command is running for
+    """
+    return _current_store.get() or default_store
+
+
+def storage():
+    """
+    Get the storage backend of the guild the current command is running for
+    """
+    return current().storage
+
+
+def path(filename: str) -> str:
+    """
+    Get the path of a file for the current guild
+    """
+    return current().path(filename)
+
+
+def activate(guild_id: int = None) -> GuildStore:
+    """
+    Make a guild's store current for the rest of the running task. None selects the default store.
+    """
+    store = None if guild_id is None else registry.get(guild_id)
+    _current_store.set(store)
+    return store or default_store
+
+
+@contextmanager
+def use_guild(guild_id: int = None):
+    """
+    Context manager that makes a guild's store current inside the block
+    """
+    store = None if guild_id is None else registry.get(guild_id)
+    token = _current_store.set(store)
+    try:
+        yield store or default_store
+    finally:
+        _current_store.reset(token)
+
+
+@contextmanager
+def use_store(store: GuildStore):
+    """
+    Context manager that makes a specific store current inside the block, e.g. an in-memory store in tests
+    """
+    token = _current_store.set(store)
+    try:
+        yield store
+    finally:
+        _current_store.reset(token)
+
+
+def loaded_stores() -> list[GuildStore]:
+    """
+    Get the default store and every loaded guild store
+    """
+    return [default_store] + registry.loaded()
+
+
+def flush_all() -> int:
+    """
+    Write all buffered changes of every loaded store to disk
+    Returns:
+        int: Number of files written
+    """
+    written = 0
+    for store in loaded_stores():
+        try:
+            written += store.storage.flush()
+        except Exception as e:
+            logger.error(f"Failed to flush data of guild {store.guild_id}: {str(e)}")
+    return written
+
+
+def configure(data_dir: str = None, backend: str = None, write_behind: bool = None):
+    """
+    Change where and how data is kept. Flushes and drops every loaded guild store.
+
+    :param data_dir: Root directory for data files
+    :param backend: "file" or "memory"
+    :param write_behind: Whether file storage buffers writes until flushed
+    """
+    global DATA_DIR, GUILD_DATA_DIR, STORAGE_BACKEND, WRITE_BEHIND, registry, default_store
+    flush_all()
+    if data_dir is not None:
+        DATA_DIR = data_dir
+        GUILD_DATA_DIR = os.path.join(data_dir, "guilds")
+    if backend is not None:
+        if backend not in ("file", "memory"):
+            raise ValueError(f"Unknown storage backend: {backend}")
+        STORAGE_BACKEND = backend
+    if write_behind is not None:
+        WRITE_BEHIND = write_behind
+    registry = GuildRegistry(GUILD_DATA_DIR)
+    default_store = GuildStore(None, make_storage(DATA_DIR))
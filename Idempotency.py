@@ -0,0 +1,60 @@
+import hashlib
+import os
+import threading
+
+from ExpiringCache import ExpiringCache
+from PointSystem import logger
+
+# Seconds during which an identical request from the same member is answered with the first result
+WINDOW_SECONDS = float(os.getenv("IDEMPOTENCY_SECONDS", "60"))
+# Maximum number of remembered requests
+MAX_ENTRIES = 1024
+
+
+def request_key(command: str, guild_id, user_id, *args) -> str:
+    """
+    Get a content hash identifying a request: the command, where and by whom it was run and its arguments.
+    Text arguments are compared with surrounding whitespace removed.
+    """
+    parts = [command, guild_id, user_id] + [arg.strip() if isinstance(arg, str) else arg for arg in args]
+    return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()
+
+
+class IdempotencyCache:
+    """
+    Remembers the results of recent write requests so a retried or double-submitted request returns the
+    original result instead of writing again. Entries expire WINDOW_SECONDS after the request first ran,
+    and the least recently used are dropped beyond max_entries.
+    """
+
+    def __init__(self, window: float = WINDOW_SECONDS, max_entries: int = MAX_ENTRIES):
+        self._results = ExpiringCache(window, max_entries)
+        self._lock = threading.Lock()
+
+    def run(self, key: str, func, *args, failed=1):
+        """
+        Run func(*args) unless the same request ran within the window, in which case its result is returned
+
+        :param key: Key from request_key
+        :param func: Function performing the write
+        :param args: Arguments passed to func
+        :param failed: Result meaning the request failed; failures are not remembered so they can be retried
+        :return: The result of func, or of the original request
+        """
+        with self._lock:
+            hit, result = self._results.get(key)
+            if hit:
+                logger.info(f"Ignoring repeated request {key[:12]}, returning its original result")
+                return result
+            # Held while running so a concurrent duplicate waits for the first result instead of writing too
+            result = func(*args)
+            if result != failed:
+                self._results.put(key, result)
+            return result
+
+    def clear(self):
+        """
+        Forget all remembered requests
+        """
+        with self._lock:
+            self._results.clear()
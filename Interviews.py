@@ -1,7 +1,10 @@
 import pandas as pd
 
+import Archive
+import GuildData
 from CheckRoles import check_pledge
 from PointSystem import logger
+from Storage import PLEDGE_ID
 
 
 def add_interview(pledge, brother, quality, time):
@@ -19,18 +22,12 @@ def add_interview(pledge, brother, quality, time):
     if not check_pledge(pledge):
         logger.error('pledge does not exist')
         return 1
-    try:
-        df = pd.read_csv('interviews.csv')
-    except Exception as e:
-        logger.error(f'error reading interviews.csv {e}')
-        return 1
     try:
         if quality not in [0, 1]:
             logger.error('Invalid quality')
             return 1
-        added_interview = [time, pledge, brother, quality]
-        df.loc[len(df)] = added_interview
-        df.to_csv('interviews.csv', index=False)
+        added_interview = {"Time": time, "Pledge": pledge, "Brother": brother, "Quality": quality}
+        GuildData.storage().append_rows("interviews", [added_interview])
         return 0
     except Exception as e:
         logger.error(f'Error adding interview {e}')
@@ -45,8 +42,9 @@ def get_pledge_interviews(pledge):
     """
     try:
         if check_pledge(pledge):
-            df = pd.read_csv('interviews.csv')
-            return df.loc[df['Pledge'] == pledge]
+            storage = GuildData.storage()
+            df = storage.read_table("interviews")
+            return df.loc[storage.pledge_rows("interviews", df, pledge)]
         else:
             return 1
     except Exception as e:
@@ -56,7 +54,7 @@ def get_pledge_interviews(pledge):
 
 def get_brother_interviews(brother):
     try:
-        df = pd.read_csv('interviews.csv')
+        df = GuildData.storage().read_table("interviews")
         return df.loc[df['Brother'] == brother]
     except Exception as e:
         logger.error(f'error getting brother {e}')
@@ -70,11 +68,11 @@ def interview_rankings(df=None):
     """
     if df is None:
         try:
-            df = pd.read_csv('interviews.csv')
+            df = Archive.load_table("interviews")
         except Exception as e:
             logger.error(f'error reading interviews.csv {e}')
             return 1
-    df = df.drop(["Brother", "Quality", "Time"], axis=1)
+    df = df.drop(["Brother", "Quality", "Time", PLEDGE_ID], axis=1, errors="ignore")
     grouped = df.groupby('Pledge')
     counts = grouped.value_counts()
     counts = counts.sort_values(ascending=False)
@@ -89,13 +87,14 @@ def get_quality_interviews(pledge, interview_df=None):
     :return: np.int(64)
     """
     if check_pledge(pledge):
+        storage = GuildData.storage()
         if interview_df is None:
-            interview_df = pd.read_csv('interviews.csv')
-            interviews = interview_df[interview_df["Pledge"] == pledge]["Quality"].sum()
+            interview_df = Archive.load_table("interviews")
+            interviews = interview_df[storage.pledge_rows("interviews", interview_df, pledge)]["Quality"].sum()
             interviews = int(interviews)
             return interviews
         elif interview_df is not None:
-            interviews = interview_df[interview_df["Pledge"] == pledge]["Quality"].sum()
+            interviews = interview_df[storage.pledge_rows("interviews", interview_df, pledge)]["Quality"].sum()
             interviews = int(interviews)
             return interviews
     return None
@@ -110,7 +109,7 @@ def interview_summary(df=None):
     # Load data
     if df is None:
         try:
-            df_input = pd.read_csv('interviews.csv')
+            df_input = Archive.load_table("interviews")
         except Exception as e:
             logger.error(f'error reading interviews.csv: {e}')
             return 1
@@ -118,13 +117,12 @@ def interview_summary(df=None):
         df_input = df
     df_output = pd.DataFrame(columns=["Pledge", "NumberOfInterviews", "PercentQuality"])
     # Get Pledge Names
-    with open('pledges.csv', 'r') as fil:
-        pledge_names = [line.rstrip('\n') for line in fil]
+    pledge_names = GuildData.storage().read_pledges()
     df_output['Pledge'] = pledge_names
     # count the number of interviews that each pledge has
     number_of_interviews = []
     for i in pledge_names:
-        number_of_interviews.append(df_input["Pledge"].value_counts().get(i, 0))
+        number_of_interviews.append(int(GuildData.storage().pledge_rows("interviews", df_input, i).sum()))
     df_output['NumberOfInterviews'] = number_of_interviews
     # Get the Quality interview data
     number_of_quality_interviews = []
@@ -143,11 +141,11 @@ def brother_interview_rankings(df=None):
     """
     if df is None:
         try:
-            df = pd.read_csv('interviews.csv')
+            df = Archive.load_table("interviews")
         except Exception as e:
             logger.error(f'error reading interviews.csv {e}')
             return 1
-    df = df.drop(["Pledge", "Quality", "Time"], axis=1)
+    df = df.drop(["Pledge", "Quality", "Time", PLEDGE_ID], axis=1, errors="ignore")
     grouped = df.groupby('Brother')
     counts = grouped.value_counts()
     counts = counts.sort_values(ascending=False)
@@ -0,0 +1,315 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+import Archive
+import GuildData
+from Storage import PLEDGE_ID
+from logging_config import setup_logging
+
+logger = setup_logging()
+
+# Name of the ledger checkpoint in each guild's storage
+CHECKPOINT_NAME = "ledger_checkpoint"
+# A new checkpoint is only written once at least this many rows were added since the last one
+CHECKPOINT_ROWS = 1
+
+_lock = threading.RLock()
+
+
+def _plain(value):
+    # numpy scalars -> Python numbers so totals can be stored as JSON
+    if value is pd.NA:
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+
+def _row_key(row) -> tuple:
+    # Pledge IDs rather than names, so renaming a pledge doesn't look like a rewritten ledger
+    return tuple(_plain(row[column]) for column in ("Time", PLEDGE_ID, "Point_Change"))
+
+
+def _owner_ids(df: pd.DataFrame, owners: dict = None) -> pd.Series:
+    # The pledge each row counts towards, following merges; each pledge's own ID without an owner map
+    ids = df[PLEDGE_ID]
+    return ids if owners is None else ids.map(owners)
+
+
+class LedgerState:
+    """
+    Per-pledge totals and latest comments folded from the points ledger (Points.csv), by pledge ID.
+    Rows of merged pledges count towards the pledge they were merged into.
+    `rows` is the number of ledger rows folded in, and `position` where they end in the stored table.
+    """
+
+    def __init__(self):
+        self.totals: dict[int, float] = {}
+        self.last_comments: dict[int, str] = {}
+        self.rows = 0
+        self.last_row = None
+        self.position = None
+        self.registry = None
+        self.version = None
+
+    def apply(self, df: pd.DataFrame, owners: dict = None):
+        """
+        Fold ledger rows into the totals
+
+        :param df: Ledger rows with their pledge IDs
+        :param owners: Pledge ID -> ID of the pledge its rows count towards, from Storage.pledge_owners()
+        """
+        if df.empty:
+            return
+        counted = df.assign(Owner=_owner_ids(df, owners)).dropna(subset=["Owner"])
+        for pledge_id, change in counted.groupby("Owner", sort=False)["Point_Change"].sum().items():
+            pledge_id = int(pledge_id)
+            self.totals[pledge_id] = _plain(self.totals.get(pledge_id, 0) + change)
+        for _, row in counted.drop_duplicates("Owner", keep="last").iterrows():
+            comment = row["Comments"]
+            self.last_comments[int(row["Owner"])] = None if pd.isna(comment) else str(comment)
+        self.rows += len(df)
+        self.last_row = _row_key(df.iloc[-1])
+
+    def total(self, pledge_id: int):
+        return self.totals.get(pledge_id, 0)
+
+    def to_dict(self) -> dict:
+        return {
+            "totals": self.totals,
+            "last_comments": self.last_comments,
+            "rows": self.rows,
+            "last_row": list(self.last_row) if self.last_row is not None else None,
+            "position": self.position,
+            "registry": self.registry,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LedgerState":
+        state = cls()
+        # JSON object keys are strings; checkpoints from before totals were kept by ID fail here and are replayed
+        state.totals = {int(pledge_id): total for pledge_id, total in data["totals"].items()}
+        state.last_comments = {int(pledge_id): comment for pledge_id, comment in data["last_comments"].items()}
+        state.rows = data["rows"]
+        state.last_row = tuple(data["last_row"]) if data["last_row"] is not None else None
+        state.position = data["position"]
+        state.registry = data.get("registry")
+        return state
+
+
+def load(storage) -> tuple[LedgerState, int]:
+    """
+    Rebuild the ledger state from the latest checkpoint, replaying only the rows written after it.
+    Falls back to replaying the full history if the ledger was rewritten or pledges were renamed or
+    merged since the checkpoint.
+    Returns:
+        tuple: (LedgerState, number of rows replayed)
+    """
+    data = storage.read_json(CHECKPOINT_NAME)
+    registry = storage.registry_fingerprint()
+    state = LedgerState()
+    if data is not None:
+        try:
+            state = LedgerState.from_dict(data)
+        except Exception as e:
+            logger.warning(f"Ignoring invalid ledger checkpoint: {str(e)}")
+
+    tail = None
+    if state.position is not None and state.registry == registry:
+        tail = storage.read_tail("points", state.position)
+    if tail is None:
+        if data is not None:
+            logger.warning("Points ledger or pledges changed since the last checkpoint, replaying the full history")
+        state = LedgerState()
+        tail = storage.read_tail("points")
+    rows, state.position = tail
+    state.registry = registry
+    state.apply(storage.resolve("points", rows), storage.pledge_owners())
+    return state, len(rows)
+
+
+def checkpoint(storage=None, min_rows: int = CHECKPOINT_ROWS) -> LedgerState:
+    """
+    Write a checkpoint of the ledger totals if at least min_rows rows were added since the last one
+
+    :param storage: Storage to checkpoint, defaults to the current guild's
+    :param min_rows: Minimum number of new rows needed to write a new checkpoint
+    :return: The up-to-date ledger state
+    """
+    storage = storage or GuildData.storage()
+    state, replayed = load(storage)
+    if replayed >= min_rows:
+        storage.write_json(CHECKPOINT_NAME, state.to_dict())
+        logger.info(f"Wrote ledger checkpoint covering {state.rows} rows")
+    return state
+
+
+def get_ledger() -> LedgerState:
+    """
+    Get the ledger state of the current guild, kept in memory and brought up to date with new rows
+    """
+    store = GuildData.current()
+    storage = store.storage
+    with _lock:
+        version = storage.version("points")
+        state = store.cache.get("ledger")
+        if state is not None and state.version == version:
+            return state
+
+        registry = storage.registry_fingerprint()
+        if state is None and not storage.pending("points"):
+            state, _ = load(storage)
+        else:
+            df = storage.read_table("points")
+            owners = storage.pledge_owners()
+            # Merges change which pledge rows count towards, so the totals are folded again
+            appended = state is not None and state.registry == registry and len(df) >= state.rows and (
+                state.rows == 0 or _row_key(df.iloc[state.rows - 1]) == state.last_row)
+            if appended:
+                state.apply(df.iloc[state.rows:], owners)
+            else:
+                state = LedgerState()
+                state.apply(df, owners)
+            state.registry = registry
+            # Only states loaded from storage know where their rows end
+            state.position = None
+        state.version = version
+        store.cache["ledger"] = state
+        return state
+
+
+class PointHistory:
+    """
+    The points ledger as contiguous arrays sorted by pledge, then time: int32 pledge codes, float64 timestamps,
+    int16 point changes and int64 running totals per pledge. Pledges are numbered in order of appearance and
+    comments are interned, so each distinct string is stored once. A pledge's rows are one contiguous slice,
+    so per-pledge queries are a binary search on a view and nothing is converted to pandas until it is plotted.
+    Pledges are looked up by pledge ID, and rows of merged pledges count towards the pledge they were merged into.
+    """
+
+    def __init__(self, df: pd.DataFrame, owners: dict = None):
+        df = df.assign(Owner=_owner_ids(df, owners)).dropna(subset=["Time", "Owner"])
+        owner_codes, pledges = pd.factorize(df["Owner"].astype("int64"), sort=False)
+        times = df["Time"].to_numpy(dtype=np.float64)
+        changes = df["Point_Change"].fillna(0).to_numpy()
+        comment_codes, comments = pd.factorize(df["Comments"], sort=False)
+
+        # Stable sort by pledge, then time
+        order = np.lexsort((times, owner_codes))
+        self.pledges: list[int] = [int(pledge_id) for pledge_id in pledges]
+        self._codes: dict[int, int] = {pledge_id: i for i, pledge_id in enumerate(self.pledges)}
+        self.pledge_ids = owner_codes[order].astype(np.int32)
+        self.times = times[order]
+        self.changes = self._compact_changes(changes[order])
+        self._comment_ids = comment_codes[order].astype(np.int32)
+        self._comments = comments.to_numpy(dtype=object)
+
+        self.running = np.cumsum(self.changes, dtype=np.int64 if self.changes.dtype.kind == "i" else np.float64)
+        self._starts = np.searchsorted(self.pledge_ids, np.arange(len(self.pledges)), side="left")
+        self._ends = np.searchsorted(self.pledge_ids, np.arange(len(self.pledges)), side="right")
+        # Make the running totals restart at the first row of every pledge
+        offsets = np.zeros(len(self.pledges), dtype=self.running.dtype)
+        has_previous = self._starts > 0
+        offsets[has_previous] = self.running[self._starts[has_previous] - 1]
+        self.running -= np.repeat(offsets, self._ends - self._starts)
+
+    @staticmethod
+    def _compact_changes(changes: np.ndarray) -> np.ndarray:
+        # Point changes are small whole numbers; keep anything else exactly as it is
+        changes = changes.astype(np.float64)
+        limits = np.iinfo(np.int16)
+        if np.all(np.mod(changes, 1) == 0) and (changes.size == 0 or (
+                changes.min() >= limits.min and changes.max() <= limits.max)):
+            return changes.astype(np.int16)
+        return changes
+
+    @property
+    def rows(self) -> int:
+        return len(self.times)
+
+    def _slice(self, pledge_id: int):
+        code = self._codes.get(pledge_id)
+        if code is None:
+            return None
+        return slice(self._starts[code], self._ends[code])
+
+    def _count(self, rows: slice, as_of: float) -> int:
+        # Number of the pledge's rows at or before as_of
+        return int(np.searchsorted(self.times[rows], as_of, side="right"))
+
+    def total(self, pledge_id: int, as_of: float):
+        """
+        Get a pledge's total points at a moment
+        Args:
+            pledge_id (int): Pledge ID
+            as_of (float): Unix timestamp
+        """
+        rows = self._slice(pledge_id)
+        if rows is None:
+            return 0
+        count = self._count(rows, as_of)
+        return _plain(self.running[rows.start + count - 1]) if count else 0
+
+    def last_comment(self, pledge_id: int, as_of: float):
+        """
+        Get the comment of a pledge's latest points change at a moment, None if there is none
+        """
+        rows = self._slice(pledge_id)
+        if rows is None:
+            return None
+        count = self._count(rows, as_of)
+        if not count:
+            return None
+        comment_id = self._comment_ids[rows.start + count - 1]
+        return None if comment_id < 0 else str(self._comments[comment_id])
+
+    def series(self, pledge_id: int) -> tuple:
+        """
+        Get the times of a pledge's points changes and the running total after each, as views into the ledger arrays
+        """
+        rows = self._slice(pledge_id)
+        if rows is None:
+            return np.array([], dtype=np.float64), np.array([], dtype=self.running.dtype)
+        return self.times[rows], self.running[rows]
+
+    def nbytes(self) -> int:
+        """
+        Get the memory used by the ledger arrays, not counting the interned strings
+        """
+        return sum(array.nbytes for array in (self.pledge_ids, self.times, self.changes, self.running,
+                                              self._comment_ids, self._starts, self._ends))
+
+
+def get_history() -> PointHistory:
+    """
+    Get the point history of the current guild, rebuilt only when the ledger changed
+    """
+    store = GuildData.current()
+    with _lock:
+        version = store.storage.version("points")
+        cached = store.cache.get("history")
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        history = PointHistory(Archive.load_table("points", store.storage), store.storage.pledge_owners())
+        store.cache["history"] = (version, history)
+        return history
+
+
+def parse_as_of(text: str, end_of_day: bool = True) -> float:
+    """
+    Parse a point in time given as "YYYY-MM-DD" (the end of that day, or its start if end_of_day is False)
+    or "YYYY-MM-DD HH:MM", in UTC
+    Returns:
+        float: Unix timestamp
+    Raises:
+        ValueError: If the text is not in one of those formats
+    """
+    text = text.strip()
+    try:
+        moment = datetime.strptime(text, "%Y-%m-%d %H:%M")
+    except ValueError:
+        moment = datetime.strptime(text, "%Y-%m-%d")
+        if end_of_day:
+            moment += timedelta(days=1) - timedelta(microseconds=1)
+    return moment.replace(tzinfo=timezone.utc).timestamp()
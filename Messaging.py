@@ -0,0 +1,280 @@
+import asyncio
+import functools
+import io
+import time
+from collections import deque
+
+import discord
+
+from PointSystem import logger
+
+# Discord rejects messages longer than 2000 characters
+MESSAGE_LIMIT = 2000
+# Responses that would need more messages than this are sent as a file instead
+MAX_CHUNKS = 5
+# Discord allows roughly 5 messages per 5 seconds in a channel
+CHANNEL_RATE = 1.0
+CHANNEL_BURST = 5
+# Discord fails interactions that are not acknowledged within 3 seconds, so defer well before that
+DEFER_THRESHOLD = 1.5
+# Number of recent runs kept per command to estimate its latency
+LATENCY_HISTORY = 20
+# Interaction extras key marking a public "thinking" placeholder that no reply has replaced yet
+DEFERRED_PUBLIC = "deferred_public"
+
+
+def chunk_message(content: str, limit: int = MESSAGE_LIMIT) -> list[str]:
+    """
+    Split a message into chunks that fit within Discord's message length limit.
+    Splits happen at line boundaries, and single lines longer than the limit are hard-split.
+
+    :param content: The full message text
+    :param limit: Maximum number of characters per chunk
+    :return: List of message chunks, empty if content is empty
+    """
+    if not content:
+        return []
+
+    chunks = []
+    current = ""
+    for line in content.split("\n"):
+        # Hard-split lines that can never fit in a single message
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            chunks.append(current)
+            current = line
+        else:
+            current = candidate
+
+    if current.strip():
+        chunks.append(current)
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+class TokenBucket:
+    """
+    Token bucket used to pace outbound sends.
+    Tokens refill continuously at `rate` per second up to `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, tokens: float = 1.0) -> float:
+        """
+        Get the number of seconds until tokens will be available, without taking them
+        """
+        self._refill()
+        if self.tokens >= tokens:
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """
+        Take tokens from the bucket if they are available
+        Returns:
+            float: 0 if the tokens were taken, otherwise the number of seconds until they will be available
+        """
+        wait = self.wait_time(tokens)
+        if wait == 0:
+            self.tokens -= tokens
+        return wait
+
+    async def acquire(self, tokens: float = 1.0):
+        """
+        Wait until tokens are available and take them. Waiters are served in FIFO order.
+        """
+        async with self._lock:
+            wait = self.try_acquire(tokens)
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = self.try_acquire(tokens)
+
+
+# One bucket per channel so a large response in one channel never delays another
+_channel_buckets: dict[int, TokenBucket] = {}
+
+
+def get_channel_bucket(channel_id) -> TokenBucket:
+    """
+    Get or create the send bucket for a channel
+    """
+    bucket = _channel_buckets.get(channel_id)
+    if bucket is None:
+        bucket = TokenBucket(CHANNEL_RATE, CHANNEL_BURST)
+        _channel_buckets[channel_id] = bucket
+    return bucket
+
+
+def _as_file(content: str, filename: str) -> discord.File:
+    return discord.File(io.BytesIO(content.encode("utf-8")), filename=filename)
+
+
+async def respond(interaction: discord.Interaction, content: str = None, **kwargs):
+    """
+    Reply to an interaction, using a followup if the interaction was already responded to or deferred.
+    The first followup to a deferred interaction replaces its "thinking" message and takes that message's
+    visibility, so an ephemeral reply to a public deferral removes the placeholder and is sent on its own.
+    Replies don't ping anyone unless allowed_mentions is given, since they echo text members entered.
+    """
+    if content is not None:
+        kwargs["content"] = content
+    kwargs.setdefault("allowed_mentions", discord.AllowedMentions.none())
+    if interaction.response.is_done():
+        if interaction.extras.pop(DEFERRED_PUBLIC, None) is True and kwargs.get("ephemeral"):
+            await interaction.delete_original_response()
+        return await interaction.followup.send(**kwargs)
+    return await interaction.response.send_message(**kwargs)
+
+
+async def send_long_message(interaction: discord.Interaction, content: str, ephemeral: bool = False,
+                            filename: str = "response.txt"):
+    """
+    Send a response of any length to an interaction.
+    Content is split at line boundaries into message-sized chunks. The first chunk answers the
+    interaction and the rest are sent as followups paced by the channel's token bucket.
+    Content that would need more than MAX_CHUNKS messages is sent as a text file attachment.
+
+    :param interaction: The Discord interaction to answer
+    :param content: The full response text
+    :param ephemeral: Whether the messages should only be visible to the caller
+    :param filename: Name of the attachment used for very long responses
+    """
+    chunks = chunk_message(content)
+    if not chunks:
+        await respond(interaction, "Nothing to show.", ephemeral=ephemeral)
+        return
+
+    if len(chunks) > MAX_CHUNKS:
+        logger.info(f"Response is {len(content)} characters, sending as attachment {filename}")
+        header = chunks[0].split("\n", 1)[0][:MESSAGE_LIMIT - 50]
+        await respond(interaction, f"{header}\n(Full response attached)", file=_as_file(content, filename),
+                      ephemeral=ephemeral)
+        return
+
+    await respond(interaction, chunks[0], ephemeral=ephemeral)
+    bucket = get_channel_bucket(interaction.channel_id)
+    for chunk in chunks[1:]:
+        await bucket.acquire()
+        await interaction.followup.send(content=chunk, ephemeral=ephemeral,
+                                        allowed_mentions=discord.AllowedMentions.none())
+
+
+async def send_channel_message(channel, content: str = None, file: discord.File = None,
+                               filename: str = "message.txt"):
+    """
+    Send a message or file to a channel through the channel's token bucket, splitting long content.
+
+    :param channel: The channel to send to
+    :param content: Optional message text
+    :param file: Optional file to attach
+    :param filename: Name of the attachment used for very long content
+    """
+    bucket = get_channel_bucket(channel.id)
+    chunks = chunk_message(content) if content else []
+
+    if len(chunks) > MAX_CHUNKS:
+        header = chunks[0].split("\n", 1)[0][:MESSAGE_LIMIT - 50]
+        await bucket.acquire()
+        await channel.send(f"{header}\n(Full message attached)", file=_as_file(content, filename))
+        chunks = []
+    else:
+        for chunk in chunks:
+            await bucket.acquire()
+            await channel.send(chunk)
+
+    if file is not None:
+        await bucket.acquire()
+        await channel.send(file=file)
+
+
+class LatencyTracker:
+    """
+    Keeps a short history of how long each command took to run
+    """
+
+    def __init__(self, size: int = LATENCY_HISTORY):
+        self.size = size
+        self._history: dict[str, deque] = {}
+
+    def record(self, name: str, seconds: float):
+        """
+        Record one run of a command
+        """
+        history = self._history.get(name)
+        if history is None:
+            history = deque(maxlen=self.size)
+            self._history[name] = history
+        history.append(seconds)
+
+    def estimate(self, name: str):
+        """
+        Estimate how long a command will take as the 90th percentile of its recent runs
+        Returns:
+            float: Estimated seconds, or None if the command has never run
+        """
+        history = self._history.get(name)
+        if not history:
+            return None
+        ordered = sorted(history)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))]
+
+    def should_defer(self, name: str, threshold: float = DEFER_THRESHOLD, default: bool = False) -> bool:
+        """
+        Decide whether a command should be deferred before it runs
+        Args:
+            name (str): Command name
+            threshold (float): Deferral threshold in seconds
+            default (bool): Decision used when the command has no history yet
+        """
+        estimate = self.estimate(name)
+        if estimate is None:
+            return default
+        return estimate >= threshold
+
+
+latency_tracker = LatencyTracker()
+
+
+def auto_defer(threshold: float = DEFER_THRESHOLD, slow: bool = False, ephemeral: bool = False):
+    """
+    Decorator that defers an interaction up front when the command's recent runs were slow.
+    Deferred commands must reply through `respond` or `send_long_message` so the result goes out as a followup,
+    which also keeps ephemeral replies private after a public deferral.
+
+    :param threshold: Commands whose estimated latency is at least this many seconds are deferred
+    :param slow: Whether to defer on the first runs before any latency history exists
+    :param ephemeral: Whether the "thinking" message, and so the command's first reply, is only visible to the caller
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(interaction: discord.Interaction, *args, **kwargs):
+            name = func.__name__
+            if latency_tracker.should_defer(name, threshold, default=slow) and not interaction.response.is_done():
+                await interaction.response.defer(thinking=True, ephemeral=ephemeral)
+                interaction.extras[DEFERRED_PUBLIC] = not ephemeral
+            start = time.monotonic()
+            try:
+                return await func(interaction, *args, **kwargs)
+            finally:
+                latency_tracker.record(name, time.monotonic() - start)
+
+        return wrapper
+
+    return decorator
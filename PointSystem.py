@@ -1,13 +1,35 @@
-import os
+import io
+import numbers
 import time
+import uuid
+from datetime import datetime, timedelta, timezone
 
 import pandas as pd
 
+import GuildData
+import Ledger
+import Rules
+import Terms
 from CheckRoles import check_pledge
+from Storage import PLEDGE_ID
 from logging_config import setup_logging
 
 logger = setup_logging()
 
+# Name of the daily rank snapshots document in each guild's storage
+RANK_SNAPSHOTS = "rank_snapshots"
+# Number of daily rank snapshots kept
+RANK_SNAPSHOT_DAYS = 60
+# (label, days back) of the rank movements shown next to the current rankings
+RANK_MOVEMENT_PERIODS = [("1d", 1), ("7d", 7)]
+# Largest point change allowed in one request
+POINT_LIMIT = 35
+# Maximum number of rows in one bulk import
+MAX_IMPORT_ROWS = 500
+# Accepted bulk import headers -> pending points column
+IMPORT_COLUMNS = {"pledge": "Name", "name": "Name", "change": "Point_Change", "point_change": "Point_Change",
+                  "points": "Point_Change", "comment": "Comments", "comments": "Comments"}
+
 
 def get_points_csv():
     """
@@ -16,25 +38,75 @@ def get_points_csv():
         A pandas DataFrame
     """
     try:
-        if not os.path.exists("Points.csv"):
-            df = pd.DataFrame(columns=["Time", "Name", "Point_Change", "Comments"])
-            df.to_csv("Points.csv", index=False)
+        storage = GuildData.storage()
+        if not storage.exists("points"):
+            # Creates the file with all required columns
+            df = storage.read_table("points")
         else:
             try:
-                df = pd.read_csv("Points.csv")
+                df = storage.read_table("points")
                 # Verify required columns exist
                 required_columns = ["Time", "Name", "Point_Change", "Comments"]
                 if not all(col in df.columns for col in required_columns):
-                    df = pd.DataFrame(columns=required_columns)
+                    df = pd.DataFrame(columns=required_columns + ["Requester", "Approver"])
             except:
-                df = pd.DataFrame(columns=["Time", "Name", "Point_Change", "Comments"])
+                df = pd.DataFrame(columns=["Time", "Name", "Point_Change", "Comments", "Requester", "Approver"])
     except Exception as e:
         logger.error(f"Error in get_points_csv: {str(e)}")
-        return pd.DataFrame(columns=["Time", "Name", "Point_Change", "Comments"])
+        return pd.DataFrame(columns=["Time", "Name", "Point_Change", "Comments", "Requester", "Approver"])
     return df
 
 
-def update_points(name: str, point_change: int, comment: str):
+def _member_id(value):
+    # Discord user IDs are stored as text, since they are too large to pass through a float exactly
+    return None if value is None or pd.isna(value) else str(int(value))
+
+
+def clean_change(name: str, point_change, comment: str):
+    """
+    Validate and sanitize a points change before it is written to the ledger. Every path into the
+    ledger goes through this, whether a change is applied directly or approved from the pending points.
+
+    Args:
+        name (str): The name of the pledge
+        point_change (int): The number of points to add/subtract, at most POINT_LIMIT either way
+        comment (str): A required comment about the point change
+
+    Returns:
+        tuple: (name, point_change, comment) sanitized, or None if the change is invalid
+    """
+    # Input validation
+    if not isinstance(name, str) or not name.strip():
+        logger.error("Invalid name provided: empty or wrong type")
+        return None
+
+    if not isinstance(point_change, numbers.Real) or pd.isna(point_change):
+        logger.error(f"Invalid point_change type: {type(point_change)}")
+        return None
+
+    # Convert to int and validate range
+    point_change = int(point_change)
+    if abs(point_change) > POINT_LIMIT:  # Enforce point limit
+        return None
+
+    if not comment or not isinstance(comment, str) or not comment.strip():
+        logger.error("Comment is required and cannot be empty")
+        return None
+
+    # Sanitize inputs
+    name = name.strip()
+    comment = comment.strip()
+    # Remove any non-printable characters
+    comment = ''.join(c for c in comment if c.isprintable())
+    # Truncate very long comments
+    if len(comment) > 500:
+        logger.warning(f"Comment too long ({len(comment)} chars), truncating")
+        comment = comment[:497] + "..."
+    return name, point_change, comment
+
+
+def update_points(name: str, point_change: int, comment: str, requester: str = None, approver: str = None,
+                  requester_id: int = None, approver_id: int = None):
     """
     Update points for a pledge with comprehensive error handling and validation.
 
@@ -42,59 +114,25 @@ def update_points(name: str, point_change: int, comment: str):
         name (str): The name of the pledge
         point_change (int): The number of points to add/subtract
         comment (str): A required comment about the point change
+        requester (str): The display name of the member who requested the change, if known
+        approver (str): The display name of the member who approved the change, if known
+        requester_id (int): The Discord user ID of the requester, which audits filter on
+        approver_id (int): The Discord user ID of the approver, which audits filter on
 
     Returns:
         int: 0 for success, 1 for failure
     """
     try:
-        # Input validation
-        if not isinstance(name, str) or not name.strip():
-            logger.error("Invalid name provided: empty or wrong type")
-            return 1
-
-        if not isinstance(point_change, (int, float)):
-            logger.error(f"Invalid point_change type: {type(point_change)}")
-            return 1
-
-        # Convert to int and validate range
-        point_change = int(point_change)
-        if abs(point_change) > 35:  # Enforce point limit
-            return 1
-
-        if not comment or not isinstance(comment, str) or not comment.strip():
-            logger.error("Comment is required and cannot be empty")
+        cleaned = clean_change(name, point_change, comment)
+        if cleaned is None:
             return 1
-
-        # Sanitize inputs
-        name = name.strip()
-        point_change = int(point_change)  # Convert float to int if necessary
-        comment = comment.strip()
-
-        # Validate and sanitize comment
-        if comment is not None:
-            if not isinstance(comment, str):
-                logger.warning(f"Invalid comment type: {type(comment)}, converting to string")
-                comment = str(comment)
-            comment = comment.strip()
-            # Remove any non-printable characters
-            comment = ''.join(c for c in comment if c.isprintable())
-            # Truncate very long comments
-            if len(comment) > 500:
-                logger.warning(f"Comment too long ({len(comment)} chars), truncating")
-                comment = comment[:497] + "..."
+        name, point_change, comment = cleaned
 
         # Check if pledge exists
         if not check_pledge(name):
             logger.warning(f"Attempted to update points for non-existent pledge: {name}")
             return 1
 
-        # Get current points data
-        try:
-            df = get_points_csv()
-        except Exception as e:
-            logger.error(f"Failed to read points CSV: {str(e)}")
-            return 1
-
         # Prepare new row with validation
         try:
             current_time = time.time()
@@ -102,13 +140,15 @@ def update_points(name: str, point_change: int, comment: str):
                 "Time": current_time,
                 "Name": name,
                 "Point_Change": point_change,
-                "Comments": comment if comment else ""
+                "Comments": comment if comment else "",
+                "Requester": requester,
+                "Approver": approver,
+                "Requester_ID": _member_id(requester_id),
+                "Approver_ID": _member_id(approver_id)
             }
 
             # Validate the new row
-            if not pd.isna(new_row["Time"]) and not pd.isna(new_row["Point_Change"]):
-                df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-            else:
+            if pd.isna(new_row["Time"]) or pd.isna(new_row["Point_Change"]):
                 logger.error("Invalid data in new row")
                 return 1
 
@@ -116,43 +156,10 @@ def update_points(name: str, point_change: int, comment: str):
             logger.error(f"Error creating new row: {str(e)}")
             return 1
 
-        # Save to CSV with error handling and backup
+        # Append without copying the ledger here; files are replaced atomically so a failed write
+        # leaves the previous file intact
         try:
-            # Create backup of current file
-            if os.path.exists("Points.csv"):
-                # Create backups directory if it doesn't exist
-                backup_dir = "backups"
-                os.makedirs(backup_dir, exist_ok=True)
-
-                # Get list of existing backups sorted by creation time
-                existing_backups = []
-                if os.path.exists(backup_dir):
-                    backup_files = [f for f in os.listdir(backup_dir) if f.startswith("Points_backup_")]
-                    existing_backups = sorted(backup_files, reverse=True)
-
-                # Remove oldest backups if more than 20 exist
-                while len(existing_backups) >= 20:
-                    oldest_backup = os.path.join(backup_dir, existing_backups.pop())
-                    try:
-                        os.remove(oldest_backup)
-                    except Exception as e:
-                        logger.warning(f"Failed to remove old backup {oldest_backup}: {str(e)}")
-
-                # Create new backup
-                backup_name = os.path.join(backup_dir, f"Points_backup_{int(current_time)}.csv")
-                try:
-                    import shutil
-                    shutil.copy2("Points.csv", backup_name)
-                except Exception as e:
-                    logger.warning(f"Failed to create backup: {str(e)}")
-
-            # Save new data
-            df.to_csv("Points.csv", index=False)
-
-            # Verify the save was successful
-            if not os.path.exists("Points.csv"):
-                logger.error("Failed to save points CSV")
-                return 1
+            GuildData.storage().append_rows("points", [new_row])
 
             # Log successful update
             logger.info(f"Successfully updated points for {name}: {point_change:+d} points")
@@ -160,13 +167,6 @@ def update_points(name: str, point_change: int, comment: str):
 
         except Exception as e:
             logger.error(f"Failed to save points CSV: {str(e)}")
-            # Try to restore from backup if save failed
-            if os.path.exists(backup_name):
-                try:
-                    shutil.copy2(backup_name, "Points.csv")
-                    logger.info("Restored from backup after failed save")
-                except Exception as backup_e:
-                    logger.error(f"Failed to restore from backup: {str(backup_e)}")
             return 1
 
     except Exception as e:
@@ -174,21 +174,30 @@ def update_points(name: str, point_change: int, comment: str):
         return 1
 
 
-def get_pledge_points(name, df=None):
+def get_pledge_points(name, df=None, as_of: float = None):
     """
     Get total points for a specific pledge
     Args:
-        name (str): Name of pledge, df (pd.DataFrame): DataFrame of points data (optional, if not given will call get_points_csv)
+        name (str): Name of pledge, df (pd.DataFrame): DataFrame of points data
+            (optional, if not given the ledger totals are used)
+        as_of (float): Unix timestamp to get the total at (optional, defaults to now)
     Returns:
         int: Total points for pledge, or None if pledge doesn't exist
     """
     if check_pledge(name):
+        storage = GuildData.storage()
+        if as_of is not None:
+            return Ledger.get_history().total(storage.pledge_id(name), as_of)
         if df is None:
-            df = get_points_csv()
-            points = df[df["Name"] == name]["Point_Change"].sum()
-            return points
+            try:
+                return Ledger.get_ledger().total(storage.pledge_id(name))
+            except Exception as e:
+                logger.error(f"Error reading ledger totals, summing points file instead: {str(e)}")
+                df = get_points_csv()
+                points = df[storage.pledge_rows("points", df, name)]["Point_Change"].sum()
+                return points
         elif df is not None:
-            points = df[df["Name"] == name]["Point_Change"].sum()
+            points = df[storage.pledge_rows("points", df, name)]["Point_Change"].sum()
             return points
     return None
 
@@ -199,8 +208,7 @@ def get_pledges():
     Returns:
         list: List of pledge names
     """
-    with open('pledges.csv', 'r') as fil:
-        return [line.rstrip('\n') for line in fil]
+    return GuildData.storage().read_pledges()
 
 
 def get_points_graph():
@@ -209,7 +217,7 @@ def get_points_graph():
     Returns:
         str: Filename of generated graph
     """
-    import matplotlib.pyplot as plt
+    from matplotlib.figure import Figure
 
     # Get points for each pledge
     pledges = get_pledges()
@@ -218,32 +226,30 @@ def get_points_graph():
         points.append(get_pledge_points(pledge))
 
     # Create bar graph
-    plt.figure(figsize=(10, 5))
-    plt.bar(pledges, points)
-    plt.title('Pledge Points')
-    plt.xlabel('Pledges')
-    plt.ylabel('Points')
+    figure = Figure(figsize=(10, 5))
+    axes = figure.subplots()
+    axes.bar(pledges, points)
+    axes.set_title('Pledge Points')
+    axes.set_xlabel('Pledges')
+    axes.set_ylabel('Points')
 
     # Save and return filename
-    filename = 'pledge_points_graph.png'
-    plt.savefig(filename)
-    plt.close()
+    filename = GuildData.path('pledge_points_graph.png')
+    figure.savefig(filename)
     return filename
 
 
-def get_ranked_pledges():
+def get_ranked_pledges(as_of: float = None):
     """
     Get a sorted list of pledges by their points, including their most recent comment
+    Args:
+        as_of (float): Unix timestamp to rank the pledges at (optional, defaults to now)
     Returns:
         list: List of formatted strings with rankings, points, and comments
     """
     try:
         # Validate that required files exist
-        if not os.path.exists('pledges.csv'):
-            logger.error("pledges.csv file not found")
-            return ["Error: Pledge file not found"]
-
-        if not os.path.exists('Points.csv'):
+        if not GuildData.storage().exists("points"):
             logger.error("Points.csv file not found")
             return ["Error: Points file not found"]
 
@@ -260,29 +266,42 @@ def get_ranked_pledges():
         # Initialize list to store pledge data
         pledge_points = []
         try:
-            df = get_points_csv()
-            if df.empty:
+            # Totals and latest comments are kept up to date by the ledger instead of re-reading Points.csv
+            ids = GuildData.storage().pledge_ids()
+            if as_of is None:
+                ledger = Ledger.get_ledger()
+
+                def get_total(pledge):
+                    return ledger.total(ids.get(pledge))
+
+                def get_comment(pledge):
+                    return ledger.last_comments.get(ids.get(pledge))
+            else:
+                ledger = Ledger.get_history()
+
+                def get_total(pledge):
+                    return ledger.total(ids.get(pledge), as_of)
+
+                def get_comment(pledge):
+                    return ledger.last_comment(ids.get(pledge), as_of)
+            if not ledger.rows:
                 logger.info("Points file is empty")
                 # Still continue, as pledges might just have 0 points
         except Exception as e:
-            logger.error(f"Error reading points CSV: {str(e)}")
+            logger.error(f"Error reading points ledger: {str(e)}")
             return ["Error reading points data"]
 
         # Process each pledge's points and comments
         for pledge in pledges:
             try:
-                points = get_pledge_points(pledge)
-                if points is None:  # Extra validation
-                    points = 0
-                    logger.warning(f"No points found for {pledge}, defaulting to 0")
+                points = get_total(pledge)
 
                 # Get the most recent comment with additional validation
                 recent_comment = ""
-                pledge_df = df[df["Name"] == pledge]
 
-                if not pledge_df.empty:
+                last_comment = get_comment(pledge)
+                if last_comment is not None:
                     try:
-                        last_comment = pledge_df.iloc[-1]["Comments"]
                         # Comprehensive comment validation
                         if pd.notna(last_comment):
                             # Convert to string and sanitize
@@ -313,6 +332,17 @@ def get_ranked_pledges():
             logger.error(f"Error sorting pledges: {str(e)}")
             return ["Error sorting pledge rankings"]
 
+        # Rank movement is only shown for the current rankings, against the saved daily snapshots
+        movement_bases = []
+        if as_of is None:
+            try:
+                for label, days in RANK_MOVEMENT_PERIODS:
+                    base = get_rank_snapshot(days)
+                    if base:
+                        movement_bases.append((label, base))
+            except Exception as e:
+                logger.warning(f"Error reading rank snapshots: {str(e)}")
+
         # Format rankings into strings
         formatted_rankings = []
         try:
@@ -321,8 +351,11 @@ def get_ranked_pledges():
                 if comment and len(comment) > 100:
                     comment = comment[:97] + "..."
 
+                moves = [f"{_format_movement(base[pledge]['rank'] - i)} {label}"
+                         for label, base in movement_bases if pledge in base]
+                movement_text = f" [{', '.join(moves)}]" if moves else ""
                 comment_text = f" ({comment})" if comment else ""
-                ranking = f"{i}. {pledge}: {points} points{comment_text}"
+                ranking = f"{i}. {pledge}: {points} points{movement_text}{comment_text}"
 
                 # Protect against extremely long lines
                 if len(ranking) > 1000:
@@ -340,13 +373,162 @@ def get_ranked_pledges():
         return ["An unexpected error occurred while retrieving rankings"]
 
 
+def get_term_rankings(term: str) -> list[str]:
+    """
+    Get the final rankings of a closed term from its archive, with each pledge's last comment of the term
+    Args:
+        term (str): Name of the closed term
+    Returns:
+        list: Formatted rankings, or a single message if there is no such term
+    """
+    df = Terms.load_table("points", term)
+    if df is None:
+        return [f"No closed term named {term}"]
+    if df.empty:
+        return [f"No points were recorded in {term}"]
+    totals = df.groupby("Name")["Point_Change"].sum()
+    last_comments = df.sort_values("Time", kind="stable").groupby("Name")["Comments"].last()
+    ranked = sorted(totals.items(), key=lambda x: (x[1], x[0].lower()), reverse=True)
+    rankings = []
+    for i, (pledge, points) in enumerate(ranked, 1):
+        comment = last_comments.get(pledge)
+        comment = str(comment).strip() if pd.notna(comment) else ""
+        if len(comment) > 100:
+            comment = comment[:97] + "..."
+        comment_text = f" ({comment})" if comment else ""
+        rankings.append(f"{i}. {pledge}: {_plain_number(points)} points{comment_text}")
+    return rankings
+
+
+def get_term_points(name: str, term: str):
+    """
+    Get a pledge's total points in a closed term
+    Args:
+        name (str): Name of the pledge, who does not have to be a current pledge
+        term (str): Name of the closed term
+    Returns:
+        int: Total points, or None if there is no such term or the pledge has no points in it
+    """
+    df = Terms.load_table("points", term)
+    if df is None or not (df["Name"] == name).any():
+        return None
+    return _plain_number(df.loc[df["Name"] == name, "Point_Change"].sum())
+
+
+def _format_movement(change: int) -> str:
+    if change > 0:
+        return f"▲{change}"
+    if change < 0:
+        return f"▼{-change}"
+    return "="
+
+
+def _today() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def get_current_ranks() -> dict:
+    """
+    Get every pledge's current rank and points, ranked the same way as get_ranked_pledges
+    Returns:
+        dict: {pledge: {"rank": int, "points": number}}
+    """
+    ledger = Ledger.get_ledger()
+    pledge_points = [(pledge, ledger.total(pledge_id)) for pledge, pledge_id in GuildData.storage().pledge_ids().items()]
+    ranked = sorted(pledge_points, key=lambda x: (x[1], x[0].lower()), reverse=True)
+    return {pledge: {"rank": rank, "points": points} for rank, (pledge, points) in enumerate(ranked, 1)}
+
+
+def preview_rankings(batch: str = None) -> list[str]:
+    """
+    Project the rankings as if the pending points changes were approved, without writing anything.
+    The pending changes are summed per pledge and added to the ledger's current totals.
+    Args:
+        batch (str): Only include the pending changes of this batch (optional, defaults to all of them)
+    Returns:
+        list: Formatted projected rankings with each pledge's pending change and rank movement,
+              or a single message if nothing is pending
+    """
+    try:
+        pending = get_pending_points_csv()
+        if batch:
+            if "Batch" not in pending.columns:
+                return [f"No pending batch {batch}"]
+            pending = pending[pending["Batch"].astype(str) == batch.strip().lower()]
+        current = get_current_ranks()
+        # Changes count towards the pledge they were requested for, even if another one now has its name
+        ids = GuildData.storage().pledge_ids()
+        pending = pending.assign(Owner=GuildData.storage().owner_ids(pending))
+        pending = pending[pending["Owner"].isin(ids.values())]
+        if pending.empty:
+            return [f"No pending points changes in batch {batch}" if batch else "No pending points changes"]
+
+        by_id = pending.groupby("Owner")["Point_Change"].sum()
+        deltas = {pledge: by_id.get(pledge_id, 0) for pledge, pledge_id in ids.items()}
+        projected = [(pledge, _plain_number(entry["points"] + deltas.get(pledge, 0)))
+                     for pledge, entry in current.items()]
+        ranked = sorted(projected, key=lambda x: (x[1], x[0].lower()), reverse=True)
+
+        rankings = []
+        for i, (pledge, points) in enumerate(ranked, 1):
+            delta = _plain_number(deltas.get(pledge, 0))
+            delta_text = f" ({delta:+} pending)" if delta else ""
+            rankings.append(f"{i}. {pledge}: {points} points{delta_text} "
+                            f"[{_format_movement(current[pledge]['rank'] - i)}]")
+        return rankings
+    except Exception as e:
+        logger.error(f"Error previewing rankings: {str(e)}")
+        return ["An unexpected error occurred while previewing rankings"]
+
+
+def _plain_number(value):
+    # numpy scalars -> Python numbers, so whole numbers print without a decimal point
+    value = value.item() if hasattr(value, "item") else value
+    return int(value) if float(value).is_integer() else value
+
+
+def save_rank_snapshot(day: str = None) -> dict:
+    """
+    Save the current ranks and points as the snapshot of a day, keeping the newest RANK_SNAPSHOT_DAYS snapshots
+    Args:
+        day (str): Date of the snapshot as YYYY-MM-DD, defaults to today (UTC)
+    Returns:
+        dict: The saved snapshot
+    """
+    day = day or _today().strftime("%Y-%m-%d")
+    storage = GuildData.storage()
+    snapshots = storage.read_json(RANK_SNAPSHOTS) or {}
+    snapshots[day] = get_current_ranks()
+    for old_day in sorted(snapshots)[:-RANK_SNAPSHOT_DAYS]:
+        del snapshots[old_day]
+    storage.write_json(RANK_SNAPSHOTS, snapshots)
+    logger.info(f"Saved rank snapshot for {day}")
+    return snapshots[day]
+
+
+def get_rank_snapshot(days_ago: int):
+    """
+    Get the newest rank snapshot taken at least a number of days before today (UTC)
+    Args:
+        days_ago (int): 1 for the snapshot from yesterday or earlier, 7 for a week ago or earlier
+    Returns:
+        dict: {pledge: {"rank": int, "points": number}}, or None if there is no such snapshot
+    """
+    snapshots = GuildData.storage().read_json(RANK_SNAPSHOTS) or {}
+    cutoff = (_today() - timedelta(days=days_ago)).strftime("%Y-%m-%d")
+    days = [day for day in snapshots if day <= cutoff]
+    if not days:
+        return None
+    return snapshots[max(days)]
+
+
 def get_points_file():
     """
     Get the name of the points file
     Returns:
         str: Name of the points file
     """
-    return 'Points.csv'
+    return GuildData.path('Points.csv')
 
 
 def get_points_over_time():
@@ -355,52 +537,38 @@ def get_points_over_time():
     Returns:
         str: Filename of generated graph
     """
-    import matplotlib.pyplot as plt
-    # Read points data and convert to pandas DataFrame
-    df = pd.read_csv('Points.csv')
-
-    # Get list of active pledges
-    active_pledges = get_pledges()
+    from matplotlib.figure import Figure
+    # Running totals per pledge come from the cached point history instead of a full pivot of Points.csv
+    history = Ledger.get_history()
 
-    # Filter DataFrame to only include active pledges
-    df = df[df['Name'].isin(active_pledges)]
-
-    # Convert timestamp to datetime
-    df['Time'] = pd.to_datetime(df['Time'], unit='s')
-
-    # Sort by time
-    df = df.sort_values('Time')
-
-    # Calculate cumulative sums for all pledges at once using groupby
-    cumulative_points = df.pivot_table(
-        index='Time',
-        columns='Name',
-        values='Point_Change',
-        aggfunc='sum'
-    ).fillna(0).cumsum()
+    # Only include active pledges
+    active_pledges = GuildData.storage().pledge_ids()
 
     # Create the plot
-    plt.figure(figsize=(10, 6))
-    for pledge in cumulative_points.columns:
-        plt.plot(
-            cumulative_points.index,
-            cumulative_points[pledge],
+    figure = Figure(figsize=(10, 6))
+    axes = figure.subplots()
+    for pledge, pledge_id in active_pledges.items():
+        times, totals = history.series(pledge_id)
+        if len(times) == 0:
+            continue
+        axes.plot(
+            pd.to_datetime(times, unit='s'),
+            totals,
             label=pledge,
             marker='o'
         )
 
-    plt.title('Pledge Points Over Time')
-    plt.xlabel('Date')
-    plt.ylabel('Total Points')
-    plt.legend()
-    plt.grid(True)
-    plt.xticks(rotation=45)
-    plt.tight_layout()
+    axes.set_title('Pledge Points Over Time')
+    axes.set_xlabel('Date')
+    axes.set_ylabel('Total Points')
+    axes.legend()
+    axes.grid(True)
+    axes.tick_params(axis='x', labelrotation=45)
+    figure.tight_layout()
 
     # Save and return filename
-    filename = 'points_over_time.png'
-    plt.savefig(filename)
-    plt.close()
+    filename = GuildData.path('points_over_time.png')
+    figure.savefig(filename)
     return filename
 
 
@@ -411,19 +579,16 @@ def get_pending_points_csv():
         pd.DataFrame: DataFrame containing pending points data
     """
     try:
-        if not os.path.exists("PendingPoints.csv"):
-            # Create new DataFrame with all required columns
-            df = pd.DataFrame(columns=["Time", "Name", "Point_Change", "Comments", "Requester"])
-            df.to_csv("PendingPoints.csv", index=False)
-        else:
-            df = pd.read_csv("PendingPoints.csv")
+        # Created with all required columns if it doesn't exist
+        df = GuildData.storage().read_table("pending")
     except Exception as e:
         logger.error(f"Error in get_pending_points_csv: {str(e)}")
-        return pd.DataFrame(columns=["Time", "Name", "Point_Change", "Comments", "Requester"])
+        return pd.DataFrame(columns=["Time", "Name", "Point_Change", "Comments", "Requester", "Batch", "ID"])
     return df
 
 
-def add_pending_points(name: str, point_change: int, comment: str, requester: str):
+def add_pending_points(name: str, point_change: int, comment: str, requester: str, requester_id: int = None,
+                       role_ids=()):
     """
     Adds a record of pending point changes to the file "PendingPoints.csv". This function helps to
     document the adjustments in points for the specified individual. It logs the event with details
@@ -434,33 +599,283 @@ def add_pending_points(name: str, point_change: int, comment: str, requester: st
     :param point_change: An integer specifying the points to be added (positive) or removed (negative).
     :param comment: A string providing additional information or justification for the point change.
     :param requester: A string representing the name or identifier of the user requesting the change.
-    :return: An integer result. Returns 0 on successful addition and 1 in case of failure.
+    :param requester_id: The Discord user ID of the requester, matched against approval rules.
+    :param role_ids: The Discord role IDs of the requester, matched against approval rules.
+    :return: An integer result. Returns 0 on successful addition and 1 in case of failure. Requests matching
+        one of the guild's approval rules (see Rules.py) are not queued: 2 means the change was applied
+        to the ledger right away, 3 that it was rejected. Approved changes that can't be applied are queued.
     """
     try:
         if not check_pledge(name):
             return 1
 
-        df = get_pending_points_csv()
+        rule = Rules.evaluate(name, point_change, comment, requester_id, role_ids)
+        if rule is not None:
+            if rule["action"] == Rules.REJECT:
+                logger.info(f"Rejected points change for {name} from {requester} by rule: {Rules.describe(rule)}")
+                return 3
+            # Stored without mentions, since /audit and /search_points print it back into channels
+            approver = f"rule: {Rules.describe(rule, mentions=False)}"
+            if update_points(name, point_change, comment, requester, approver, requester_id) == 0:
+                logger.info(f"Approved points change for {name} from {requester} by {approver}")
+                return 2
+            # The change can't be applied directly (e.g. it is over POINT_LIMIT), so a VP reviews it instead
+            logger.warning(f"Could not apply points change for {name} approved by {approver}; queueing it")
 
         new_row = {
             "Time": time.time(),
             "Name": name,
             "Point_Change": point_change,
             "Comments": comment,
-            "Requester": requester
+            "Requester": requester,
+            "ID": _new_pending_id(),
+            "Requester_ID": _member_id(requester_id)
         }
 
-        df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-        df.to_csv("PendingPoints.csv", index=False)
+        GuildData.storage().append_rows("pending", [new_row])
         return 0
     except Exception as e:
         logger.error(f"Error adding pending points: {str(e)}")
         return 1
 
 
-def approve_pending_points(index: int) -> tuple[bool, str, dict]:
+def import_pending_points(data: bytes, requester: str, requester_id: int = None) -> tuple[str, list[str]]:
+    """
+    Validate a CSV file of point changes with pledge, change and comment columns and add every row to the
+    pending points as one batch. All rows are checked at once, and nothing is added unless every row is valid.
+
+    :param data: Contents of the CSV file
+    :param requester: The member importing the changes
+    :param requester_id: The Discord user ID of the member importing the changes
+    :return: (batch ID, []) on success, or (None, list of problems) if the file was rejected
+    """
+    try:
+        df = pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False, skipinitialspace=True)
+    except Exception as e:
+        return None, [f"Could not read the file as CSV: {str(e)}"]
+
+    df = df.rename(columns=lambda column: IMPORT_COLUMNS.get(str(column).strip().lower(), column))
+    missing = [column for column in ["Name", "Point_Change", "Comments"] if column not in df.columns]
+    if missing:
+        return None, ["The file needs pledge, change and comment columns"]
+    if df.empty:
+        return None, ["The file has no rows"]
+    if len(df) > MAX_IMPORT_ROWS:
+        return None, [f"The file has {len(df)} rows, at most {MAX_IMPORT_ROWS} can be imported at once"]
+
+    names = df["Name"].str.strip()
+    comments = df["Comments"].str.strip()
+    changes = pd.to_numeric(df["Point_Change"].str.strip(), errors="coerce")
+    problems = pd.Series("", index=df.index)
+    # Later checks overwrite earlier ones, so each row reports its most basic problem
+    problems[comments == ""] = "a comment is required"
+    problems[changes.abs() > POINT_LIMIT] = f"the change must be between -{POINT_LIMIT} and {POINT_LIMIT}"
+    problems[changes == 0] = "the change cannot be 0"
+    problems[changes.isna() | (changes % 1 != 0)] = "the change must be a whole number"
+    problems[~names.isin(GuildData.storage().read_pledges())] = "unknown pledge"
+    invalid = problems[problems != ""]
+    if not invalid.empty:
+        # Row numbers as they appear in a spreadsheet, after the header
+        return None, [f"Row {row + 2} ({names[row] or 'no pledge'}): {problem}" for row, problem in invalid.items()]
+
+    return _add_pending_batch(names, changes.astype(int), comments, requester, requester_id)
+
+
+def _add_pending_batch(names: pd.Series, changes, comments, requester: str,
+                       requester_id: int = None) -> tuple[str, list[str]]:
+    # Adds validated changes to the pending points with one write, tagged with a new batch ID
+    # Like pending IDs, the letter prefix keeps batch IDs from being read back from CSV as numbers
+    batch = f"b{uuid.uuid4().hex[:7]}"
+    rows = pd.DataFrame({
+        "Time": time.time(),
+        "Name": names,
+        "Point_Change": changes,
+        "Comments": pd.Series(comments, index=names.index).map(
+            lambda comment: comment if len(comment) <= 500 else comment[:497] + "..."),
+        "Requester": requester,
+        "Batch": batch,
+        "ID": [_new_pending_id() for _ in range(len(names))],
+        "Requester_ID": _member_id(requester_id),
+    })
+    try:
+        GuildData.storage().append_rows("pending", rows.to_dict("records"))
+    except Exception as e:
+        logger.error(f"Error adding pending points batch: {str(e)}")
+        return None, [f"Could not save the changes: {str(e)}"]
+    logger.info(f"{requester} requested {len(rows)} pending points changes as batch {batch}")
+    return batch, []
+
+
+def add_pending_points_many(names: list[str], point_change: int, comment: str, requester: str,
+                            requester_id: int = None) -> tuple[str, list[str]]:
+    """
+    Request the same points change for several pledges at once. The changes are added to the pending points
+    with a single write, as one batch that can be approved with approve_pending_batch.
+
+    :param names: Pledge names, duplicates are ignored
+    :param point_change: Points to add (positive) or remove (negative) for each pledge
+    :param comment: Reason for the change
+    :param requester: The member requesting the changes
+    :param requester_id: The Discord user ID of the member requesting the changes
+    :return: (batch ID, []) on success, or (None, list of problems) if nothing was added
+    """
+    names = list(dict.fromkeys(name.strip() for name in names if name and name.strip()))
+    if not names:
+        return None, ["No pledges given"]
+    if not comment or not comment.strip():
+        return None, ["A comment is required"]
+    if point_change == 0 or abs(point_change) > POINT_LIMIT:
+        return None, [f"The change must be between -{POINT_LIMIT} and {POINT_LIMIT} and not 0"]
+    pledges = set(GuildData.storage().read_pledges())
+    unknown = [name for name in names if name not in pledges]
+    if unknown:
+        return None, [f"Unknown pledges: {', '.join(unknown)}"]
+    return _add_pending_batch(pd.Series(names), int(point_change), comment.strip(), requester, requester_id)
+
+
+def _new_pending_id() -> str:
+    # The letter prefix keeps the ID from being read back from CSV as a number
+    return f"p{uuid.uuid4().hex[:7]}"
+
+
+def get_pending_changes() -> pd.DataFrame:
+    """
+    Get the pending points changes, each with a stable ID that does not change as other changes are
+    approved or rejected. Changes requested before pending IDs existed are given one, with a single write.
+    Returns:
+        pd.DataFrame: Pending points changes
+    """
+    df_pending = get_pending_points_csv()
+    if "ID" not in df_pending.columns:
+        df_pending["ID"] = None
+    missing = df_pending["ID"].isna()
+    if missing.any():
+        df_pending.loc[missing, "ID"] = [_new_pending_id() for _ in range(int(missing.sum()))]
+        GuildData.storage().write_table("pending", df_pending)
+    return df_pending
+
+
+def _apply_pending(df_pending: pd.DataFrame, selected: pd.Series, approver: str,
+                   approver_id: int = None) -> tuple[pd.DataFrame, int]:
+    # Applies the selected pending changes with one pending points write and one ledger write.
+    # Changes are validated and sanitized like any other ledger write; invalid changes and changes for
+    # pledges that no longer exist stay pending. Returns (applied changes, number left pending).
+    # The changes leave the pending points before they reach the ledger, so a crash in between can lose an
+    # approval, which is simply made again, but never applies a change twice.
+    storage = GuildData.storage()
+    # Changes go to the pledge they were requested for, by ID, and only while it (or the pledge it was merged
+    # into) is active, even if a removed pledge's name now belongs to another one
+    active = storage.owner_ids(df_pending).isin(storage.pledge_ids().values())
+    now = time.time()
+    ledger_rows = {}
+    for i, row in df_pending[selected & active].iterrows():
+        cleaned = clean_change(row["Name"], row["Point_Change"], row["Comments"])
+        if cleaned is None:
+            logger.warning(f"Leaving invalid pending points change for {row['Name']} pending")
+            continue
+        name, point_change, comment = cleaned
+        ledger_rows[i] = {"Time": now, "Name": name, PLEDGE_ID: row[PLEDGE_ID], "Point_Change": point_change,
+                          "Comments": comment,
+                          "Requester": None if pd.isna(row["Requester"]) else row["Requester"],
+                          "Approver": approver, "Requester_ID": _member_id(row.get("Requester_ID")),
+                          "Approver_ID": _member_id(approver_id)}
+    approved = df_pending.index.isin(list(ledger_rows))
+    changes = df_pending[approved]
+    if not changes.empty:
+        storage.write_table("pending", df_pending[~approved])
+        try:
+            storage.append_rows("points", list(ledger_rows.values()))
+        except Exception:
+            # Put the changes back so they can be approved again
+            storage.write_table("pending", df_pending)
+            raise
+    return changes.reset_index(drop=True), int(selected.sum()) - len(changes)
+
+
+def approve_pending_batch(batch: str, approver: str = None,
+                          approver_id: int = None) -> tuple[bool, str, pd.DataFrame]:
+    """
+    Approve every pending points change of an imported batch, with one ledger write and one pending points write.
+    Changes for pledges that were removed since the import stay pending.
+
+    :param batch: Batch ID returned by import_pending_points
+    :param approver: The member approving the batch, recorded in the ledger
+    :param approver_id: The Discord user ID of the member approving the batch
+    :return: (success, message, approved changes)
+    """
+    try:
+        df_pending = get_pending_points_csv()
+        if "Batch" not in df_pending.columns:
+            return False, f"No pending batch {batch}", pd.DataFrame()
+        in_batch = df_pending["Batch"].astype(str) == batch.strip().lower()
+        if not in_batch.any():
+            return False, f"No pending batch {batch}", pd.DataFrame()
+
+        changes, skipped = _apply_pending(df_pending, in_batch, approver, approver_id)
+        if changes.empty:
+            return False, "None of the batch's changes can be applied: their pledges were removed or " \
+                          "the changes are invalid", changes
+        message = f"Approved {len(changes)} points changes"
+        if skipped:
+            message += f", {skipped} left pending because their pledge was removed or the change is invalid"
+        logger.info(f"Batch {batch}: {message}")
+        return True, message, changes
+
+    except Exception as e:
+        logger.error(f"Error approving batch {batch}: {str(e)}")
+        return False, f"Error: {str(e)}", pd.DataFrame()
+
+
+def approve_pending_ids(ids: list[str], approver: str = None,
+                        approver_id: int = None) -> tuple[pd.DataFrame, list[str], list[str]]:
+    """
+    Approve pending points changes by ID, with one pending points write and one ledger write
+
+    :param ids: IDs of the changes, from get_pending_changes
+    :param approver: The member approving the changes, recorded in the ledger
+    :param approver_id: The Discord user ID of the member approving the changes
+    :return: (approved changes, IDs that could not be approved because they are no longer pending, their
+             pledge was removed or the change is invalid, IDs left untouched by an error that can be retried)
+    """
+    try:
+        df_pending = get_pending_changes()
+        changes, _ = _apply_pending(df_pending, df_pending["ID"].isin(ids), approver, approver_id)
+        failed = [pending_id for pending_id in ids if pending_id not in set(changes["ID"])]
+        if not changes.empty:
+            logger.info(f"{approver} approved {len(changes)} pending points changes")
+        return changes, failed, []
+    except Exception as e:
+        logger.error(f"Error approving pending points: {str(e)}")
+        return pd.DataFrame(), [], list(ids)
+
+
+def reject_pending_ids(ids: list[str]) -> tuple[pd.DataFrame, list[str], list[str]]:
+    """
+    Reject pending points changes by ID, with one pending points write
+
+    :param ids: IDs of the changes, from get_pending_changes
+    :return: (rejected changes, IDs that are no longer pending, IDs left untouched by an error that can be retried)
+    """
+    try:
+        df_pending = get_pending_changes()
+        rejected = df_pending["ID"].isin(ids)
+        changes = df_pending[rejected].reset_index(drop=True)
+        if not changes.empty:
+            GuildData.storage().write_table("pending", df_pending[~rejected])
+        failed = [pending_id for pending_id in ids if pending_id not in set(changes["ID"])]
+        return changes, failed, []
+    except Exception as e:
+        logger.error(f"Error rejecting pending points: {str(e)}")
+        return pd.DataFrame(), [], list(ids)
+
+
+def approve_pending_points(index: int, approver: str = None, approver_id: int = None) -> tuple[bool, str, dict]:
     """
     Approve a pending points change and apply it
+    Args:
+        index (int): Index of the change in the pending points
+        approver (str): The member approving the change, recorded in the ledger
+        approver_id (int): The Discord user ID of the member approving the change
     Returns:
         tuple: (success, message, point_data)
     """
@@ -475,17 +890,10 @@ def approve_pending_points(index: int) -> tuple[bool, str, dict]:
         # Get the point data at the specified index
         point_data = df_pending.iloc[index].to_dict()
 
-        # Apply the points change
-        result = update_points(
-            point_data['Name'],
-            point_data['Point_Change'],
-            point_data['Comments']
-        )
-
-        if result == 0:
-            # Remove the approved entry
-            df_pending = df_pending.drop(index)
-            df_pending.to_csv("PendingPoints.csv", index=False)
+        # Apply the points change the same way as every other approval, to the pledge it was requested for
+        changes, _ = _apply_pending(df_pending, pd.Series(df_pending.index == df_pending.index[index],
+                                                          index=df_pending.index), approver, approver_id)
+        if not changes.empty:
             return True, "Points approved and applied", point_data
 
         return False, "Failed to apply points", point_data
@@ -519,7 +927,7 @@ def reject_pending_points(index: int) -> tuple[bool, str, dict]:
 
         point_data = df_pending.iloc[index].to_dict()
         df_pending = df_pending.drop(index)
-        df_pending.to_csv("PendingPoints.csv", index=False)
+        GuildData.storage().write_table("pending", df_pending)
         return True, "Points rejected", point_data
 
     except Exception as e:
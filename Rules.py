@@ -0,0 +1,176 @@
+import time
+
+import pandas as pd
+
+import GuildData
+import Search
+from Storage import PLEDGE_ID
+from logging_config import setup_logging
+
+logger = setup_logging()
+
+# Name of the approval rules document in each guild's storage
+RULES_NAME = "approval_rules"
+APPROVE = "approve"
+REJECT = "reject"
+ACTIONS = (APPROVE, REJECT)
+# Conditions a rule can have. A rule matches a request when all of its conditions do.
+#   max_change: the absolute point change is at most this
+#   members: the request comes from one of these members, by Discord user ID
+#   roles: the requester has one of these roles, by Discord role ID
+#   duplicate_minutes: the same pledge, change and comment was requested or applied within this many minutes
+# Members are matched by ID because anyone can change their display name to a trusted member's.
+CONDITIONS = ("max_change", "members", "roles", "duplicate_minutes")
+
+
+def get_rules() -> list[dict]:
+    """
+    Get the current guild's approval rules, in the order they are checked
+    """
+    return GuildData.storage().read_json(RULES_NAME) or []
+
+
+def add_rule(action: str, max_change: int = None, members: list[int] = None, roles: list[int] = None,
+             duplicate_minutes: float = None) -> int:
+    """
+    Add an approval rule, checked after the existing ones
+
+    :param action: APPROVE to apply matching requests right away, REJECT to drop them
+    :param max_change: Only match requests changing points by at most this much either way
+    :param members: Only match requests from these members, by Discord user ID
+    :param roles: Only match requests from members with one of these roles, by Discord role ID
+    :param duplicate_minutes: Only match requests repeating one made within this many minutes
+    :return: 0 on success, 1 if the rule is invalid
+    """
+    if action not in ACTIONS:
+        logger.error(f"Invalid approval rule action: {action}")
+        return 1
+    rule = {"action": action}
+    if max_change is not None:
+        if max_change < 0:
+            return 1
+        rule["max_change"] = int(max_change)
+    for condition, ids in (("members", members), ("roles", roles)):
+        ids = list(dict.fromkeys(int(i) for i in ids or []))
+        if ids:
+            rule[condition] = ids
+    if duplicate_minutes is not None:
+        if duplicate_minutes <= 0:
+            return 1
+        rule["duplicate_minutes"] = float(duplicate_minutes)
+    if len(rule) == 1:
+        logger.error("Approval rules need at least one condition")
+        return 1
+
+    rules = get_rules()
+    rules.append(rule)
+    GuildData.storage().write_json(RULES_NAME, rules)
+    logger.info(f"Added approval rule: {describe(rule)}")
+    return 0
+
+
+def remove_rule(index: int) -> int:
+    """
+    Remove an approval rule by its position in get_rules()
+
+    :return: 0 on success, 1 if there is no such rule
+    """
+    rules = get_rules()
+    if not 0 <= index < len(rules):
+        return 1
+    removed = rules.pop(index)
+    GuildData.storage().write_json(RULES_NAME, rules)
+    logger.info(f"Removed approval rule: {describe(removed)}")
+    return 0
+
+
+def describe(rule: dict, mentions: bool = True) -> str:
+    """
+    Describe a rule in words, e.g. "approve |change| <= 5 from <@123>, <@&456>"
+
+    :param rule: The rule
+    :param mentions: Write members and roles as Discord mentions, which Discord shows as their current names.
+        Otherwise they are written as plain IDs, e.g. "from member 123, role 456", for text that is stored.
+    """
+    parts = [rule["action"]]
+    if "max_change" in rule:
+        parts.append(f"|change| <= {rule['max_change']}")
+    if mentions:
+        senders = [f"<@{i}>" for i in rule.get("members", [])] + [f"<@&{i}>" for i in rule.get("roles", [])]
+    else:
+        senders = [f"member {i}" for i in rule.get("members", [])] + [f"role {i}" for i in rule.get("roles", [])]
+    if senders:
+        parts.append(f"from {', '.join(senders)}")
+    if "duplicate_minutes" in rule:
+        parts.append(f"repeated within {rule['duplicate_minutes']:g} minutes")
+    return " ".join(parts)
+
+
+def _same_change(row, pledge_id: str, point_change: int, comment: str) -> bool:
+    change = row["Point_Change"]
+    return (row[PLEDGE_ID] == pledge_id and not pd.isna(change) and change == point_change
+            and str(row["Comments"]).strip().lower() == comment)
+
+
+def _is_duplicate(name: str, point_change: int, comment: str, since: float) -> bool:
+    # Looks for the same change among recent ledger entries and pending requests. Ledger entries come from
+    # the ledger index's time index, so only the window is read however long the history is. The pending
+    # requests are a queue that empties as they are decided, and are already held in memory.
+    # Changes are compared by the pledge they count towards, as text like the ledger index keeps it.
+    storage = GuildData.storage()
+    pledge_id = storage.pledge_id(name)
+    if pledge_id is None:
+        return False
+    pledge_id = str(pledge_id)
+    comment = comment.strip().lower()
+    if any(_same_change(row, pledge_id, point_change, comment) for row in Search.get_index().since(since)):
+        return True
+    pending = storage.read_table("pending")
+    recent = pending[pending["Time"] >= since]
+    recent = recent.assign(**{PLEDGE_ID: storage.owner_ids(recent).astype(str)})
+    return any(_same_change(row, pledge_id, point_change, comment) for row in recent.to_dict("records"))
+
+
+def matches(rule: dict, name: str, point_change: int, comment: str, requester_id: int = None,
+            role_ids=(), now: float = None) -> bool:
+    """
+    Check if a points change request meets every condition of a rule
+
+    :param requester_id: Discord user ID of the member requesting the change
+    :param role_ids: Discord role IDs of the member requesting the change
+    """
+    if "max_change" in rule and abs(point_change) > rule["max_change"]:
+        return False
+    if "members" in rule and requester_id not in rule["members"]:
+        return False
+    if "roles" in rule and not set(role_ids) & set(rule["roles"]):
+        return False
+    if "duplicate_minutes" in rule:
+        since = (now or time.time()) - rule["duplicate_minutes"] * 60
+        if not _is_duplicate(name, point_change, comment, since):
+            return False
+    return True
+
+
+def evaluate(name: str, point_change: int, comment: str, requester_id: int = None, role_ids=(),
+             now: float = None):
+    """
+    Find the first approval rule matching a points change request
+    Args:
+        name (str): The pledge
+        point_change (int): The requested change
+        comment (str): The request's comment
+        requester_id (int): Discord user ID of the member requesting the change
+        role_ids (list): Discord role IDs of the member requesting the change
+        now (float): Time of the request, defaults to now
+    Returns:
+        dict: The matching rule, or None if the request should wait for a person to approve it
+    """
+    for rule in get_rules():
+        try:
+            if matches(rule, name, point_change, comment, requester_id, role_ids, now):
+                return rule
+        except Exception as e:
+            # A broken rule must never approve anything
+            logger.error(f"Skipping approval rule {rule}: {str(e)}")
+    return None
@@ -0,0 +1,126 @@
+import csv
+import io
+
+import pandas as pd
+
+from logging_config import setup_logging
+
+# pyarrow's multithreaded CSV reader is used when it is installed, pandas' C parser otherwise
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+    pa_csv = None
+
+logger = setup_logging()
+
+# Column name -> dtype, for every column of every data file. Point changes, qualities and pledge IDs are
+# nullable integers so a missing value never turns the whole column into floats. Columns not listed are text,
+# including Requester_ID and Approver_ID: Discord user IDs are too large to pass through a float exactly.
+COLUMN_TYPES = {
+    "Time": "float64",
+    "Pledge_ID": "Int64",
+    "Point_Change": "Int64",
+    "Quality": "Int64",
+}
+TEXT = "object"
+
+
+def dtype(column: str) -> str:
+    """
+    Get the dtype a column is loaded as
+    """
+    return COLUMN_TYPES.get(column, TEXT)
+
+
+def empty(columns: list[str]) -> pd.DataFrame:
+    """
+    Get an empty DataFrame with typed columns, so rows appended to it keep their types
+    """
+    return pd.DataFrame({column: pd.Series(dtype=dtype(column)) for column in columns})
+
+
+def _coerce(df: pd.DataFrame, column: str) -> pd.Series:
+    values = df[column]
+    kind = dtype(column)
+    if kind == TEXT:
+        # Missing text is None whichever parser read it, never NaN or the string "nan"
+        return values.astype(object).where(values.notna(), None)
+    numbers = pd.to_numeric(values, errors="coerce")
+    invalid = numbers.isna() & values.notna()
+    if invalid.any():
+        logger.warning(f"Ignoring {int(invalid.sum())} invalid {column} values")
+    if kind == "Int64":
+        fractional = numbers.notna() & (numbers % 1 != 0)
+        if fractional.any():
+            # Keep fractional values exactly rather than truncating them
+            logger.warning(f"{column} has {int(fractional.sum())} fractional values, keeping it as float")
+            return numbers.astype("float64")
+    return numbers.astype(kind)
+
+
+def conform(df: pd.DataFrame, columns: list[str]) -> pd.DataFrame:
+    """
+    Validate a loaded table against its schema: keep only the expected columns, in order, adding any that are
+    missing, and give each its declared dtype. Values that can't be converted become missing and are logged.
+
+    :param df: Table as parsed
+    :param columns: Expected columns
+    :return: The conformed table
+    """
+    conformed = {}
+    for column in columns:
+        if column in df.columns:
+            conformed[column] = _coerce(df, column)
+        else:
+            conformed[column] = pd.Series(index=df.index, dtype=dtype(column))
+    return pd.DataFrame(conformed, index=df.index).reset_index(drop=True)
+
+
+def header(data: bytes) -> list[str]:
+    """
+    Get the column names from the first line of CSV data
+    """
+    first = data.split(b"\n", 1)[0].decode("utf-8").strip()
+    return next(csv.reader([first])) if first else []
+
+
+def read_csv(data: bytes, columns) -> pd.DataFrame:
+    """
+    Parse CSV data into a typed table. Only the expected columns are parsed, each straight into its declared
+    dtype, using the fastest available parser engine.
+
+    :param data: CSV data including the header line
+    :param columns: Expected columns, or a function choosing them from the file's header
+    :return: The table, conformed to the expected columns
+    """
+    names = header(data)
+    if callable(columns):
+        columns = columns(names)
+    usecols = [column for column in names if column in columns]
+    if not usecols:
+        return empty(columns)
+    # Integers are parsed as floats first so values like "5.0" from older files are accepted
+    numeric = [column for column in usecols if dtype(column) != TEXT]
+    df = None
+    if pa_csv is not None:
+        try:
+            types = {column: pa.float64() if column in numeric else pa.string() for column in usecols}
+            df = pa_csv.read_csv(
+                pa.py_buffer(data),
+                parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+                convert_options=pa_csv.ConvertOptions(column_types=types, include_columns=usecols,
+                                                      strings_can_be_null=True),
+            ).to_pandas()
+        except Exception:
+            # Text in a numeric column makes the typed read fail: fall back to pandas
+            df = None
+    if df is None:
+        dtypes = {column: "float64" if column in numeric else str for column in usecols}
+        try:
+            df = pd.read_csv(io.BytesIO(data), usecols=usecols, dtype=dtypes)
+        except ValueError:
+            # Text in a numeric column: read everything as text and let conform() convert value by value
+            df = pd.read_csv(io.BytesIO(data), usecols=usecols, dtype=str)
+    return conform(df, columns)
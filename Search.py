@@ -0,0 +1,234 @@
+import bisect
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+import GuildData
+from Storage import PLEDGE_ID
+from logging_config import setup_logging
+
+logger = setup_logging()
+
+# Maximum number of results returned by a search
+MAX_RESULTS = 25
+# Ledger columns returned for every matching row
+RESULT_COLUMNS = ["Time", "Name", "Point_Change", "Comments", "Requester", "Approver", "Requester_ID", "Approver_ID",
+                  PLEDGE_ID]
+# Columns identifying a pledge or member, each with its own hash index. Pledges are indexed by the ID of the
+# pledge a row counts towards, and members by Discord user ID, since names can be reused or copied; the names
+# are only shown.
+PEOPLE_COLUMNS = [PLEDGE_ID, "Requester_ID", "Approver_ID"]
+
+_TOKEN = re.compile(r"\w+")
+_lock = threading.RLock()
+
+
+def tokenize(text) -> list[str]:
+    """
+    Split a comment into lowercase word tokens
+    """
+    if text is None or (isinstance(text, float) and pd.isna(text)):
+        return []
+    return _TOKEN.findall(str(text).lower())
+
+
+def _text(value):
+    return None if pd.isna(value) else str(value)
+
+
+def _row_key(row) -> tuple:
+    return row["Time"], row["Name"], row["Point_Change"]
+
+
+class LedgerIndex:
+    """
+    Secondary indexes over the points ledger. Every lowercase comment token, pledge ID, requester ID and
+    approver ID maps to the ascending row numbers that have it, and a time index keeps the rows sorted by time, so a
+    query intersects a few short lists instead of scanning the ledger. Rows are only ever appended, so new
+    ledger rows are indexed without touching the old ones.
+    """
+
+    def __init__(self):
+        self.postings: dict[str, list[int]] = {}
+        self.people: dict[str, dict[str, list[int]]] = {column: {} for column in PEOPLE_COLUMNS}
+        self.columns: dict[str, list] = {column: [] for column in RESULT_COLUMNS}
+        # Row times in ascending order, and the row each one belongs to
+        self.sorted_times: list[float] = []
+        self.time_order: list[int] = []
+        self.last_row = None
+        self.version = None
+        self.registry = None
+
+    @property
+    def rows(self) -> int:
+        return len(self.columns["Time"])
+
+    def add(self, df: pd.DataFrame):
+        """
+        Index ledger rows appended after the rows already indexed. Their Pledge_ID is the pledge they count
+        towards, see Storage.owner_ids.
+        """
+        if df.empty:
+            return
+        missing = pd.Series(None, index=df.index, dtype=object)
+        values = [df[column] if column in df.columns else missing for column in RESULT_COLUMNS]
+        for row_values in zip(*values):
+            row = self.rows
+            record = {column: _text(value) for column, value in zip(RESULT_COLUMNS, row_values)}
+            time = record["Time"] = float(row_values[0])
+            change = row_values[2]
+            record["Point_Change"] = change.item() if hasattr(change, "item") else change
+            for column, value in record.items():
+                self.columns[column].append(value)
+            # A token repeated within one comment is only posted once
+            for token in dict.fromkeys(tokenize(record["Comments"])):
+                self.postings.setdefault(token, []).append(row)
+            for column, index in self.people.items():
+                if record[column] is not None:
+                    index.setdefault(record[column].lower(), []).append(row)
+            # Rows usually arrive in time order, which keeps this an append
+            position = bisect.bisect_right(self.sorted_times, time)
+            self.sorted_times.insert(position, time)
+            self.time_order.insert(position, row)
+        self.last_row = _row_key(df.iloc[-1])
+
+    def _time_range(self, start: float = None, end: float = None) -> np.ndarray:
+        low = 0 if start is None else bisect.bisect_left(self.sorted_times, start)
+        high = len(self.sorted_times) if end is None else bisect.bisect_right(self.sorted_times, end)
+        return np.sort(np.asarray(self.time_order[low:high], dtype=np.int64))
+
+    def _row(self, row: int) -> dict:
+        return {column: values[row] for column, values in self.columns.items()}
+
+    def since(self, start: float) -> list[dict]:
+        """
+        Get the rows at or after a Unix timestamp, oldest first. Only the rows in the range are touched.
+        """
+        low = bisect.bisect_left(self.sorted_times, start)
+        return [self._row(row) for row in self.time_order[low:]]
+
+    def query(self, terms: list[str] = (), start: float = None, end: float = None, limit: int = MAX_RESULTS,
+              **people) -> tuple[list[dict], int]:
+        """
+        Find the ledger rows matching every given filter, newest first
+        Args:
+            terms (list): Tokens the comment must contain
+            start (float): Only rows at or after this Unix timestamp
+            end (float): Only rows at or before this Unix timestamp
+            limit (int): Maximum number of rows returned
+            people: Pledge_ID, Requester_ID or Approver_ID the rows must have
+        Returns:
+            tuple: (matching rows as dicts, total number of matches)
+        """
+        lists = [self.postings.get(token, []) for token in dict.fromkeys(terms)]
+        for column, value in people.items():
+            if value:
+                lists.append(self.people[column].get(str(value).strip().lower(), []))
+        if not lists and start is None and end is None:
+            return [], 0
+
+        # Intersect starting from the shortest list so the work is bounded by the most selective filter
+        lists = sorted((np.asarray(rows, dtype=np.int64) for rows in lists), key=len)
+        if start is not None or end is not None:
+            time_rows = self._time_range(start, end)
+            lists.insert(0 if not lists or len(time_rows) <= len(lists[0]) else 1, time_rows)
+        matches = lists[0]
+        for rows in lists[1:]:
+            if matches.size == 0:
+                break
+            matches = np.intersect1d(matches, rows, assume_unique=True)
+
+        times = self.columns["Time"]
+        newest = sorted(matches.tolist(), key=lambda row: times[row], reverse=True)[:limit]
+        return [self._row(row) for row in newest], int(matches.size)
+
+    def search(self, query: str, pledge_id: int = None, requester_id: int = None, start: float = None,
+               end: float = None, limit: int = MAX_RESULTS) -> tuple[list[dict], int]:
+        """
+        Find the ledger rows whose comment contains every word of the query, newest first
+        Args:
+            query (str): Words to search for
+            pledge_id (int): Only rows counting towards the pledge with this ID
+            requester_id (int): Only rows requested by the member with this Discord user ID
+            start (float): Only rows at or after this Unix timestamp
+            end (float): Only rows at or before this Unix timestamp
+            limit (int): Maximum number of rows returned
+        Returns:
+            tuple: (matching rows as dicts, total number of matches)
+        """
+        terms = tokenize(query)
+        if not terms:
+            return [], 0
+        return self.query(terms, start=start, end=end, limit=limit, Requester_ID=requester_id,
+                          **{PLEDGE_ID: pledge_id})
+
+
+def get_index() -> LedgerIndex:
+    """
+    Get the ledger index of the current guild, indexing only the ledger rows added since it was last used
+    """
+    store = GuildData.current()
+    storage = store.storage
+    with _lock:
+        version = storage.version("points")
+        index = store.cache.get("search")
+        if index is not None and index.version == version:
+            return index
+
+        registry = storage.version("pledges")
+        df = storage.read_table("points")
+        df[PLEDGE_ID] = storage.owner_ids(df)
+        appended = index is not None and index.registry == registry and len(df) >= index.rows and (
+            index.rows == 0 or _row_key(df.iloc[index.rows - 1]) == index.last_row)
+        if appended:
+            index.add(df.iloc[index.rows:])
+        else:
+            # First use, or the ledger was rewritten or pledges renamed, merged or removed
+            index = LedgerIndex()
+            index.add(df)
+            logger.info(f"Built ledger index over {index.rows} ledger rows")
+        index.version = version
+        index.registry = registry
+        store.cache["search"] = index
+        return index
+
+
+def _pledge_key(pledge: str):
+    # The ID a pledge filter is matched on. A name no pledge has matches no rows.
+    if not pledge:
+        return None
+    pledge_id = GuildData.storage().pledge_id(pledge.strip())
+    return "unknown" if pledge_id is None else pledge_id
+
+
+def search_points(query: str, pledge: str = None, requester_id: int = None, start: float = None,
+                  end: float = None, limit: int = MAX_RESULTS) -> tuple[list[dict], int]:
+    """
+    Search the comments of the current guild's points ledger. See LedgerIndex.search for the arguments;
+    pledge is the name of a pledge.
+    Returns:
+        tuple: (matching rows as dicts, total number of matches)
+    """
+    return get_index().search(query, pledge_id=_pledge_key(pledge), requester_id=requester_id, start=start,
+                              end=end, limit=limit)
+
+
+def audit(pledge: str = None, requester_id: int = None, approver_id: int = None, start: float = None,
+          end: float = None, limit: int = MAX_RESULTS) -> tuple[list[dict], int]:
+    """
+    List the current guild's points changes matching every given filter, newest first.
+    At least one filter is required.
+    Args:
+        pledge (str): Only changes for this pledge
+        requester_id (int): Only changes requested by the member with this Discord user ID
+        approver_id (int): Only changes approved by the member with this Discord user ID
+        start (float): Only changes at or after this Unix timestamp
+        end (float): Only changes at or before this Unix timestamp
+        limit (int): Maximum number of changes returned
+    Returns:
+        tuple: (matching rows as dicts, total number of matches)
+    """
+    return get_index().query(start=start, end=end, limit=limit, Requester_ID=requester_id,
+                             Approver_ID=approver_id, **{PLEDGE_ID: _pledge_key(pledge)})
@@ -0,0 +1,65 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from ExpiringCache import ExpiringCache
+from PointSystem import logger
+
+# How long a finished result is served to identical requests
+RESULT_TTL = 10.0
+# Maximum number of finished results kept
+MAX_RESULTS = 64
+
+# A single worker keeps pandas/matplotlib work off the event loop. Graphs are drawn on standalone
+# matplotlib Figures rather than through pyplot, so they are safe to render from any thread.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="singleflight")
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent requests into one computation and briefly caches the result.
+    Keys should include the data version so a write is never answered with a stale result.
+    """
+
+    def __init__(self, ttl: float = RESULT_TTL, max_results: int = MAX_RESULTS):
+        self._inflight: dict = {}
+        self._results = ExpiringCache(ttl, max_results)
+
+    async def _compute(self, key, func, args):
+        try:
+            loop = asyncio.get_running_loop()
+            # Carry context variables into the worker thread
+            context = contextvars.copy_context()
+            result = await loop.run_in_executor(_executor, context.run, func, *args)
+            self._results.put(key, result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    async def run(self, key, func, *args):
+        """
+        Get the result of func(*args) for a key, sharing it with every concurrent caller using the same key
+
+        :param key: Hashable key identifying the query and the data version it reads
+        :param func: Blocking function that computes the result
+        :param args: Arguments passed to func
+        :return: The computed or cached result
+        """
+        hit, result = self._results.get(key)
+        if hit:
+            return result
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._compute(key, func, args))
+            self._inflight[key] = task
+        else:
+            logger.info(f"Joining in-flight computation for {key[0] if isinstance(key, tuple) else key}")
+        # Shield so a caller timing out does not cancel the work other callers are waiting on
+        return await asyncio.shield(task)
+
+    def clear(self):
+        """
+        Drop all cached results
+        """
+        self._results.clear()
@@ -0,0 +1,813 @@
+import base64
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+import Schema
+from logging_config import setup_logging
+
+logger = setup_logging()
+
+# Table name -> (file name, columns)
+TABLES = {
+    "points": ("Points.csv", ["Time", "Name", "Point_Change", "Comments", "Requester", "Approver",
+                              "Requester_ID", "Approver_ID"]),
+    "pending": ("PendingPoints.csv", ["Time", "Name", "Point_Change", "Comments", "Requester", "Batch", "ID",
+                                      "Requester_ID"]),
+    "interviews": ("interviews.csv", ["Time", "Pledge", "Brother", "Quality"]),
+}
+PLEDGES_FILE = "pledges.csv"
+# Tables store a pledge ID in place of the pledge name. Table name -> name column it replaces.
+PLEDGE_COLUMNS = {"points": "Name", "pending": "Name", "interviews": "Pledge"}
+PLEDGE_ID = "Pledge_ID"
+REGISTRY_COLUMNS = ["ID", "Name", "Status", "Merged_Into"]
+ACTIVE = "active"
+DELETED = "deleted"
+MERGED = "merged"
+# Directory of read-only archive files, such as the history of closed terms
+ARCHIVE_DIR = "terms"
+# Number of snapshots kept per file
+MAX_BACKUPS = 20
+# Files changed outside this process less than this many nanoseconds before they were read are read again next
+# time, since a second write within the file system's timestamp granularity could leave the signature unchanged
+RACY_WINDOW_NS = 2_000_000_000
+# Number of bytes before a read_tail position that must be unchanged for the position to stay valid
+TAIL_ANCHOR_BYTES = 64
+# With write-behind enabled, buffered writes are flushed once this many have accumulated
+FLUSH_RECORDS = 50
+
+
+def empty_table(table: str) -> pd.DataFrame:
+    """
+    Get an empty DataFrame with a table's columns
+    """
+    return Schema.empty(TABLES[table][1])
+
+
+def stored_columns(table: str) -> list[str]:
+    """
+    Get the columns of a table as stored, with the pledge name column replaced by the pledge ID
+    """
+    column = PLEDGE_COLUMNS.get(table)
+    return [PLEDGE_ID if name == column else name for name in TABLES[table][1]]
+
+
+def parse_table(table: str, data: bytes) -> pd.DataFrame:
+    """
+    Parse a table file's CSV data into typed columns as declared in Schema.py. The file's own columns are
+    kept, so files from older versions, such as those without pledge IDs, are read as they were written.
+    """
+    def columns(header: list[str]) -> list[str]:
+        return header or stored_columns(table)
+
+    return Schema.read_csv(data, columns)
+
+
+class PledgeRegistry:
+    """
+    Pledges with stable integer IDs. Data rows reference pledges by ID, so renaming, merging or
+    removing a pledge only changes its record here and never rewrites the history that references it.
+    Removed pledges are kept as "deleted" records so their history still resolves to a name.
+    """
+
+    def __init__(self):
+        # ID -> {"Name": str, "Status": str, "Merged_Into": int or None}
+        self.records: dict[int, dict] = {}
+
+    @classmethod
+    def parse(cls, text: str) -> "PledgeRegistry":
+        """
+        Read a registry from pledges.csv contents. Older files are a bare list of names, one per line.
+        """
+        registry = cls()
+        lines = text.splitlines()
+        if lines and lines[0].strip() == ",".join(REGISTRY_COLUMNS):
+            df = pd.read_csv(io.StringIO(text), dtype={"Name": str, "Status": str}, keep_default_na=False)
+            for record in df.to_dict("records"):
+                merged_into = record["Merged_Into"]
+                registry.records[int(record["ID"])] = {
+                    "Name": record["Name"],
+                    "Status": record["Status"],
+                    "Merged_Into": int(merged_into) if merged_into != "" else None,
+                }
+        else:
+            for line in lines:
+                if line:
+                    registry.records[len(registry.records) + 1] = {"Name": line, "Status": ACTIVE,
+                                                                   "Merged_Into": None}
+        return registry
+
+    def to_csv(self) -> str:
+        rows = [{"ID": pledge_id, **record} for pledge_id, record in sorted(self.records.items())]
+        df = pd.DataFrame(rows, columns=REGISTRY_COLUMNS)
+        df["Merged_Into"] = df["Merged_Into"].astype("Int64")
+        return df.to_csv(index=False)
+
+    def active_names(self) -> list[str]:
+        return [record["Name"] for _, record in sorted(self.records.items()) if record["Status"] == ACTIVE]
+
+    def find(self, name: str, statuses=(ACTIVE, DELETED)):
+        """
+        Get the ID of the pledge with a name, preferring active pledges. None if there is none.
+        """
+        found = None
+        for pledge_id, record in self.records.items():
+            if record["Name"] == name and record["Status"] in statuses:
+                if record["Status"] == ACTIVE:
+                    return pledge_id
+                found = found or pledge_id
+        return found
+
+    def _new(self, name: str, status: str) -> int:
+        pledge_id = max(self.records, default=0) + 1
+        self.records[pledge_id] = {"Name": name, "Status": status, "Merged_Into": None}
+        return pledge_id
+
+    def add(self, name: str) -> int:
+        """
+        Add an active pledge. A removed pledge with the same name is restored with its history.
+        """
+        pledge_id = self.find(name)
+        if pledge_id is None:
+            return self._new(name, ACTIVE)
+        self.records[pledge_id]["Status"] = ACTIVE
+        return pledge_id
+
+    def remove(self, name: str) -> bool:
+        pledge_id = self.find(name, (ACTIVE,))
+        if pledge_id is None:
+            return False
+        self.records[pledge_id]["Status"] = DELETED
+        return True
+
+    def rename(self, old_name: str, new_name: str) -> bool:
+        pledge_id = self.find(old_name, (ACTIVE,))
+        if pledge_id is None or self.find(new_name, (ACTIVE,)) is not None:
+            return False
+        self.records[pledge_id]["Name"] = new_name
+        return True
+
+    def merge(self, source: str, target: str) -> bool:
+        """
+        Merge one active pledge into another. The source's history counts towards the target from then on.
+        """
+        source_id = self.find(source, (ACTIVE,))
+        target_id = self.find(target, (ACTIVE,))
+        if source_id is None or target_id is None or source_id == target_id:
+            return False
+        self.records[source_id]["Status"] = MERGED
+        self.records[source_id]["Merged_Into"] = target_id
+        return True
+
+    def owner(self, pledge_id: int):
+        """
+        Get the ID of the pledge whose history a pledge's rows count towards, following merges
+        """
+        seen = set()
+        while pledge_id in self.records and pledge_id not in seen:
+            seen.add(pledge_id)
+            record = self.records[pledge_id]
+            if record["Status"] != MERGED or record["Merged_Into"] is None:
+                return pledge_id
+            pledge_id = record["Merged_Into"]
+        return None
+
+    def resolve(self, pledge_id: int) -> str:
+        """
+        Get the name a pledge's history is shown under, following merges
+        """
+        owner = self.owner(pledge_id)
+        return None if owner is None else self.records[owner]["Name"]
+
+    def name_map(self) -> dict:
+        return {pledge_id: self.resolve(pledge_id) for pledge_id in self.records}
+
+    def owner_map(self) -> dict:
+        return {pledge_id: self.owner(pledge_id) for pledge_id in self.records}
+
+    def lookup(self, name: str):
+        """
+        Get the ID of the pledge whose history a name refers to, following merges: the pledge with that name,
+        preferring active pledges, matched exactly and then ignoring case. None if there is none.
+        """
+        for matches in (lambda record: record["Name"] == name,
+                        lambda record: record["Name"].lower() == name.lower()):
+            found = {record["Status"]: pledge_id for pledge_id, record in sorted(self.records.items(), reverse=True)
+                     if matches(record)}
+            for status in (ACTIVE, DELETED, MERGED):
+                if status in found:
+                    return self.owner(found[status])
+        return None
+
+    def ids_for(self, names: pd.Series) -> pd.Series:
+        """
+        Map pledge names to IDs. Names that are not registered are added as removed pledges so their
+        history is kept.
+        """
+        ids = {}
+        for name in names.dropna().unique():
+            pledge_id = self.find(name)
+            if pledge_id is None:
+                pledge_id = self.find(name, (MERGED,))
+            ids[name] = pledge_id if pledge_id is not None else self._new(name, DELETED)
+        return names.map(ids).astype("Int64")
+
+    def fingerprint(self) -> str:
+        """
+        Get a short hash that changes whenever the pledge any pledge ID's rows count towards changes.
+        Totals are kept by pledge ID, so renames leave it unchanged.
+        """
+        content = json.dumps(sorted(self.owner_map().items()), default=str)
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class PledgeTablesMixin:
+    """
+    Pledge operations and ID <-> name translation shared by the storage backends, which provide
+    _load_registry() and _save_registry()
+    """
+
+    def read_pledges(self) -> list[str]:
+        return self._load_registry().active_names()
+
+    def _update_registry(self, change) -> bool:
+        with self._lock:
+            registry = self._load_registry()
+            changed = change(registry)
+            if changed is not False:
+                self._save_registry(registry)
+            return changed is not False
+
+    def add_pledge(self, name: str):
+        self._update_registry(lambda registry: registry.add(name))
+
+    def remove_pledge(self, name: str) -> bool:
+        """
+        Remove a pledge while keeping its history
+        """
+        return self._update_registry(lambda registry: registry.remove(name))
+
+    def rename_pledge(self, old_name: str, new_name: str) -> bool:
+        return self._update_registry(lambda registry: registry.rename(old_name, new_name))
+
+    def merge_pledges(self, source: str, target: str) -> bool:
+        return self._update_registry(lambda registry: registry.merge(source, target))
+
+    def registry_fingerprint(self) -> str:
+        return self._load_registry().fingerprint()
+
+    def pledge_ids(self) -> dict:
+        """
+        Get the ID of every active pledge, by name
+        """
+        registry = self._load_registry()
+        return {record["Name"]: pledge_id for pledge_id, record in registry.records.items()
+                if record["Status"] == ACTIVE}
+
+    def pledge_id(self, name: str):
+        """
+        Get the ID of the pledge whose history a name refers to, which need not be an active pledge.
+        See PledgeRegistry.lookup.
+        """
+        return self._load_registry().lookup(name)
+
+    def pledge_owners(self) -> dict:
+        """
+        Get the ID of the pledge every pledge's rows count towards, following merges
+        """
+        return self._load_registry().owner_map()
+
+    def owner_ids(self, df: pd.DataFrame) -> pd.Series:
+        """
+        Get the ID of the pledge each row of a table read with read_table counts towards
+        """
+        return df[PLEDGE_ID].map(self.pledge_owners()).astype("Int64")
+
+    def pledge_rows(self, table: str, df: pd.DataFrame, name: str) -> pd.Series:
+        """
+        Select the rows of a table read with read_table that count towards the pledge a name refers to.
+        Tables built without pledge IDs are matched by name.
+        """
+        if PLEDGE_ID not in df.columns:
+            return df[PLEDGE_COLUMNS[table]] == name
+        pledge_id = self.pledge_id(name)
+        if pledge_id is None:
+            return pd.Series(False, index=df.index)
+        return (self.owner_ids(df) == pledge_id).fillna(False).astype(bool)
+
+    def resolve(self, table: str, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Add the current names of the pledges stored rows reference, in front of their pledge IDs. Totals and
+        lookups go by Pledge_ID, since names can be reused; the names are for display. The IDs are written
+        back unchanged, so rewriting a table never moves rows to another pledge.
+        """
+        column = PLEDGE_COLUMNS.get(table)
+        if column is None:
+            return df.copy()
+        registry = self._load_registry()
+        if PLEDGE_ID not in df.columns:
+            # Files from before pledge IDs hold names, which refer to the pledges registered under them
+            resolved = df.copy()
+            ids = {name: registry.find(name) or registry.find(name, (MERGED,)) for name in df[column].dropna().unique()}
+            resolved[PLEDGE_ID] = df[column].map(ids).astype("Int64")
+            return resolved
+        resolved = df.copy()
+        resolved.insert(df.columns.get_loc(PLEDGE_ID), column, df[PLEDGE_ID].map(registry.name_map()))
+        return resolved
+
+    def _to_stored(self, table: str, df: pd.DataFrame) -> pd.DataFrame:
+        # Rows keep the pledge IDs they were read with; only new rows are given the ID of their pledge's name
+        column = PLEDGE_COLUMNS.get(table)
+        if column is None or column not in df.columns:
+            return df.reset_index(drop=True).copy()
+        df = df.reset_index(drop=True)
+        if PLEDGE_ID in df.columns:
+            ids = df[PLEDGE_ID].astype("Int64")
+        else:
+            ids = pd.Series(pd.NA, index=df.index, dtype="Int64")
+        missing = ids.isna() & df[column].notna()
+        if missing.any():
+            with self._lock:
+                registry = self._load_registry()
+                count = len(registry.records)
+                ids[missing] = registry.ids_for(df.loc[missing, column])
+                if len(registry.records) != count:
+                    self._save_registry(registry)
+        replaced = [name for name in (column, PLEDGE_ID) if name in df.columns]
+        stored = df.drop(columns=replaced)
+        stored.insert(min(df.columns.get_loc(name) for name in replaced), PLEDGE_ID, ids)
+        return stored
+
+
+def atomic_write(path: str, data):
+    """
+    Replace a file's contents so that readers and crashes only ever see the old or the new file.
+    The data is written to a temporary file in the same directory, flushed to disk and renamed over the target.
+
+    :param path: File to replace
+    :param data: New contents as str or bytes
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    mode = 'wb' if isinstance(data, bytes) else 'w'
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, mode) as tmp:
+            tmp.write(data)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    # Persist the rename itself; not every platform can open a directory
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+def append_frame(df: pd.DataFrame, rows: list[dict]) -> pd.DataFrame:
+    """
+    Append rows to a DataFrame. The new rows are given their schema dtypes first, so appending never
+    upcasts a column, and rows added to an empty frame keep those dtypes.
+    """
+    new = pd.DataFrame(rows)
+    new = Schema.conform(new, list(new.columns))
+    if df.empty:
+        columns = list(dict.fromkeys(list(df.columns) + list(new.columns)))
+        return new.reindex(columns=columns)
+    return pd.concat([df, new], ignore_index=True)
+
+
+class FileStorage(PledgeTablesMixin):
+    """
+    Stores pledges, points, pending points and interviews as CSV files in a directory.
+
+    Tables are kept in memory after they are first read and reloaded if their file changes on disk.
+    With write_behind enabled, table writes only update memory and are written to disk together by flush(),
+    which runs once FLUSH_RECORDS writes have accumulated and should also be called periodically.
+    """
+
+    def __init__(self, root: str, write_behind: bool = False):
+        self.root = root
+        self.write_behind = write_behind
+        self._snapshot_version = None
+        # Table name -> (file signature when loaded or last written, DataFrame as stored)
+        self._tables: dict[str, tuple] = {}
+        # (file signature, PledgeRegistry) of pledges.csv
+        self._registry = None
+        # Path -> signature of the file as this process last wrote it. Atomic replacement gives every write a
+        # new inode, so a matching signature means the file is still our own write and can be trusted at once.
+        self._written: dict[str, tuple] = {}
+        # Tables changed in memory but not yet written, in the order of their last write, and a counter
+        # bumped by every write
+        self._dirty: dict[str, None] = {}
+        self._generation: dict[str, int] = {table: 0 for table in list(TABLES) + ["pledges"]}
+        self._buffered = 0
+        # _lock guards the in-memory state, _flush_lock keeps two flushes from writing at once
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+
+    def path(self, filename: str) -> str:
+        """
+        Get the path of a file in this storage, e.g. for rendered graphs
+        """
+        return os.path.join(self.root, filename)
+
+    def ensure_files(self):
+        """
+        Create any missing data files
+        """
+        os.makedirs(self.root, exist_ok=True)
+        if not os.path.exists(self.path(PLEDGES_FILE)):
+            logger.info(f"Creating {self.path(PLEDGES_FILE)}")
+            atomic_write(self.path(PLEDGES_FILE), PledgeRegistry().to_csv())
+            self._wrote(self.path(PLEDGES_FILE))
+        for table, (filename, columns) in TABLES.items():
+            if not os.path.exists(self.path(filename)):
+                logger.info(f"Creating {self.path(filename)}")
+                atomic_write(self.path(filename), Schema.empty(stored_columns(table)).to_csv(index=False))
+                self._wrote(self.path(filename))
+
+    # Pledge registry
+
+    def _load_registry(self) -> PledgeRegistry:
+        path = self.path(PLEDGES_FILE)
+        with self._lock:
+            signature = self._signature(path)
+            if self._registry is not None and self._registry[0] == signature and self._trusted(path, signature):
+                return self._registry[1]
+            with open(path, 'r') as fil:
+                registry = PledgeRegistry.parse(fil.read())
+            self._registry = (signature, registry)
+            return registry
+
+    def _save_registry(self, registry: PledgeRegistry):
+        path = self.path(PLEDGES_FILE)
+        with self._lock:
+            atomic_write(path, registry.to_csv())
+            self._registry = (self._wrote(path), registry)
+            self._generation["pledges"] += 1
+
+    # Table operations (points ledger, pending points, interviews)
+
+    def exists(self, table: str) -> bool:
+        return table in self._dirty or os.path.exists(self.path(TABLES[table][0]))
+
+    def _signature(self, path: str):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _trusted(self, path: str, signature) -> bool:
+        if signature is None:
+            return False
+        return self._written.get(path) == signature or time.time_ns() - signature[0] > RACY_WINDOW_NS
+
+    def _wrote(self, path: str):
+        # Records a file this process has just written, returning its signature
+        signature = self._signature(path)
+        self._written[path] = signature
+        return signature
+
+    def read_table(self, table: str) -> pd.DataFrame:
+        """
+        Read a table, creating its file if it doesn't exist
+        """
+        path = self.path(TABLES[table][0])
+        with self._lock:
+            cached = self._tables.get(table)
+            if table in self._dirty:
+                return self.resolve(table, cached[1])
+            signature = self._signature(path)
+            if cached is not None and cached[0] == signature and self._trusted(path, signature):
+                return self.resolve(table, cached[1])
+
+            if signature is None:
+                df = Schema.empty(stored_columns(table))
+                atomic_write(path, df.to_csv(index=False))
+                signature = self._wrote(path)
+            else:
+                with open(path, 'rb') as fil:
+                    df = parse_table(table, fil.read())
+            self._tables[table] = (signature, df)
+            return self.resolve(table, df)
+
+    def write_table(self, table: str, df: pd.DataFrame):
+        """
+        Replace the contents of a table. The file is replaced atomically, either now or, with
+        write-behind enabled, on the next flush.
+        Args:
+            table (str): Table name
+            df (pd.DataFrame): New contents
+        """
+        with self._lock:
+            df = self._to_stored(table, df)
+            self._generation[table] += 1
+            if not self.write_behind:
+                path = self.path(TABLES[table][0])
+                atomic_write(path, df.to_csv(index=False))
+                self._tables[table] = (self._wrote(path), df)
+                return
+            self._tables[table] = (None, df)
+            # Flushes write files in the order their tables were last written, so a change that must
+            # reach disk before another (like removing applied pending changes) still does
+            self._dirty.pop(table, None)
+            self._dirty[table] = None
+            self._buffered += 1
+            full = self._buffered >= FLUSH_RECORDS
+        if full:
+            self.flush()
+
+    def append_rows(self, table: str, rows: list[dict]):
+        """
+        Append rows to a table
+        """
+        with self._lock:
+            df = append_frame(self.read_table(table), rows)
+            self.write_table(table, df)
+
+    def pending(self, table: str) -> bool:
+        """
+        Check if a table has changes that are not on disk yet
+        """
+        return table in self._dirty
+
+    def flush(self) -> int:
+        """
+        Write every table changed in memory to disk as one group of atomic file replacements, in the order
+        the tables were written
+        Returns:
+            int: Number of files written
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending = {table: (self._generation[table], self._tables[table][1]) for table in self._dirty}
+                self._buffered = 0
+            for table, (generation, df) in pending.items():
+                path = self.path(TABLES[table][0])
+                atomic_write(path, df.to_csv(index=False))
+                with self._lock:
+                    signature = self._wrote(path)
+                    # A write that arrived while this one was on disk stays dirty for the next flush
+                    if self._generation[table] == generation:
+                        self._dirty.pop(table, None)
+                        self._tables[table] = (signature, df)
+            return len(pending)
+
+    def read_tail(self, table: str, position: dict = None):
+        """
+        Read the rows added to the end of a table since an earlier read, without parsing the rest of the file.
+        Rows are returned as stored; pass them to resolve() for pledge names.
+        Args:
+            table (str): Table name
+            position (dict): Position returned by an earlier call, or None to read the whole table
+        Returns:
+            tuple: (DataFrame of new rows, position after them), or None if the file was rewritten
+                   since position was taken and has to be read in full
+        """
+        self.flush()
+        path = self.path(TABLES[table][0])
+        if not os.path.exists(path):
+            self.read_table(table)
+        with open(path, 'rb') as fil:
+            header = fil.readline()
+            size = os.fstat(fil.fileno()).st_size
+            start = len(header)
+            if position is not None:
+                offset = position["offset"]
+                anchor = base64.b64decode(position["anchor"])
+                if position["header"] != header.decode("utf-8") or not start <= offset <= size:
+                    return None
+                fil.seek(offset - len(anchor))
+                if fil.read(len(anchor)) != anchor:
+                    return None
+                start = offset
+            fil.seek(start)
+            data = fil.read()
+            end = start + len(data)
+            fil.seek(max(0, end - TAIL_ANCHOR_BYTES))
+            anchor = fil.read(end - max(0, end - TAIL_ANCHOR_BYTES))
+
+        new_position = {"offset": end, "anchor": base64.b64encode(anchor).decode("ascii"),
+                        "header": header.decode("utf-8")}
+        if not header.strip():
+            return Schema.empty(stored_columns(table)), new_position
+        return parse_table(table, header + data), new_position
+
+    def read_json(self, name: str):
+        """
+        Read a JSON document of derived data (checkpoints, snapshots) written by write_json
+        Returns:
+            The document, or None if there is none or it can't be read
+        """
+        path = self.path(f"{name}.json")
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as fil:
+                return json.load(fil)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable {path}: {str(e)}")
+            return None
+
+    def write_json(self, name: str, data):
+        """
+        Atomically replace a JSON document of derived data
+        """
+        atomic_write(self.path(f"{name}.json"), json.dumps(data))
+
+    def read_archive(self, name: str):
+        """
+        Read a file written by write_archive
+        Returns:
+            bytes: The file's contents, or None if there is no such file
+        """
+        path = self.path(os.path.join(ARCHIVE_DIR, name))
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as fil:
+            return fil.read()
+
+    def write_archive(self, name: str, data: bytes):
+        """
+        Atomically write a read-only archive file, such as the history of a closed term
+        """
+        os.makedirs(self.path(ARCHIVE_DIR), exist_ok=True)
+        atomic_write(self.path(os.path.join(ARCHIVE_DIR, name)), data)
+
+    def snapshot(self) -> int:
+        """
+        Copy every data file into backups/, keeping the newest MAX_BACKUPS copies of each.
+        Nothing is copied if no file changed since the last snapshot.
+        Returns:
+            int: Number of files copied
+        """
+        self.flush()
+        names = ["pledges"] + list(TABLES)
+        version = self.version(*names)
+        if version == self._snapshot_version:
+            return 0
+        backup_dir = self.path("backups")
+        os.makedirs(backup_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        copied = 0
+        for filename in [PLEDGES_FILE] + [filename for filename, _ in TABLES.values()]:
+            source = self.path(filename)
+            if not os.path.exists(source):
+                continue
+            prefix = os.path.splitext(filename)[0] + "_backup_"
+            try:
+                shutil.copy2(source, os.path.join(backup_dir, f"{prefix}{stamp}.csv"))
+                copied += 1
+            except Exception as e:
+                logger.warning(f"Failed to snapshot {source}: {str(e)}")
+                continue
+
+            # Remove the oldest snapshots beyond MAX_BACKUPS
+            existing = sorted(f for f in os.listdir(backup_dir) if f.startswith(prefix))
+            for old in existing[:-MAX_BACKUPS]:
+                try:
+                    os.remove(os.path.join(backup_dir, old))
+                except Exception as e:
+                    logger.warning(f"Failed to remove old backup {old}: {str(e)}")
+        self._snapshot_version = version
+        return copied
+
+    def version(self, *tables) -> tuple:
+        """
+        Get a version stamp that changes whenever one of the given tables (or "pledges") is written.
+        Tables that reference pledges also change version when the pledge registry does.
+        """
+        version = []
+        for table in _with_registry(tables):
+            path = self.path(PLEDGES_FILE if table == "pledges" else TABLES[table][0])
+            version.append((path, self._generation[table], self._signature(path)))
+        return tuple(version)
+
+    def export(self, table: str):
+        """
+        Get a table's contents for sending as an attachment, with pledge names in place of IDs
+        Returns:
+            tuple: (path or file object, file name)
+        """
+        self.flush()
+        if table == "pledges":
+            return self.path(PLEDGES_FILE), PLEDGES_FILE
+        return _export_table(table, self.read_table(table))
+
+
+def _with_registry(tables) -> list[str]:
+    tables = list(tables)
+    if "pledges" not in tables and any(table in PLEDGE_COLUMNS for table in tables):
+        tables.append("pledges")
+    return tables
+
+
+def _export_table(table: str, df: pd.DataFrame):
+    df = df.drop(columns=[PLEDGE_ID], errors="ignore")
+    return io.BytesIO(df.to_csv(index=False).encode("utf-8")), TABLES[table][0]
+
+
+class MemoryStorage(PledgeTablesMixin):
+    """
+    Keeps the same data as FileStorage in memory. Nothing is written to disk except rendered graphs,
+    which go to a private temporary directory. Useful for tests and benchmarks.
+    """
+
+    def __init__(self):
+        self._registry = PledgeRegistry()
+        self._tables: dict[str, pd.DataFrame] = {table: Schema.empty(stored_columns(table))
+                                                 for table in TABLES}
+        self._versions: dict[str, int] = {table: 0 for table in list(TABLES) + ["pledges"]}
+        self._documents: dict[str, object] = {}
+        self._archives: dict[str, bytes] = {}
+        self._output_dir = None
+        self._lock = threading.RLock()
+
+    def _bump(self, table: str):
+        self._versions[table] += 1
+
+    def path(self, filename: str) -> str:
+        if self._output_dir is None:
+            self._output_dir = tempfile.mkdtemp(prefix="pledgebot_")
+        return os.path.join(self._output_dir, filename)
+
+    def ensure_files(self):
+        pass
+
+    def _load_registry(self) -> PledgeRegistry:
+        return self._registry
+
+    def _save_registry(self, registry: PledgeRegistry):
+        self._registry = registry
+        self._bump("pledges")
+
+    def exists(self, table: str) -> bool:
+        return True
+
+    def read_table(self, table: str) -> pd.DataFrame:
+        return self.resolve(table, self._tables[table])
+
+    def write_table(self, table: str, df: pd.DataFrame):
+        with self._lock:
+            self._tables[table] = self._to_stored(table, df)
+            self._bump(table)
+
+    def append_rows(self, table: str, rows: list[dict]):
+        with self._lock:
+            self.write_table(table, append_frame(self.read_table(table), rows))
+
+    def read_tail(self, table: str, position: dict = None):
+        rows = position["rows"] if position is not None else 0
+        df = self._tables[table]
+        if rows > len(df):
+            return None
+        return df.iloc[rows:].reset_index(drop=True).copy(), {"rows": len(df)}
+
+    def read_json(self, name: str):
+        return self._documents.get(name)
+
+    def write_json(self, name: str, data):
+        self._documents[name] = json.loads(json.dumps(data))
+
+    def read_archive(self, name: str):
+        return self._archives.get(name)
+
+    def write_archive(self, name: str, data: bytes):
+        self._archives[name] = bytes(data)
+
+    def pending(self, table: str) -> bool:
+        return False
+
+    def flush(self) -> int:
+        return 0
+
+    def snapshot(self) -> int:
+        return 0
+
+    def version(self, *tables) -> tuple:
+        return tuple((id(self), table, self._versions[table]) for table in _with_registry(tables))
+
+    def export(self, table: str):
+        if table == "pledges":
+            return io.BytesIO(self._registry.to_csv().encode("utf-8")), PLEDGES_FILE
+        return _export_table(table, self.read_table(table))
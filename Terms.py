@@ -0,0 +1,125 @@
+import gzip
+import re
+import threading
+import time
+
+import pandas as pd
+
+import GuildData
+import Schema
+from Storage import PLEDGE_ID, TABLES, empty_table
+from logging_config import setup_logging
+
+logger = setup_logging()
+
+# Name of the document listing each guild's terms
+TERMS_NAME = "terms"
+# Tables whose history is split by term. Pledges and pending changes carry over to the next term.
+TERM_TABLES = ("points", "interviews")
+
+_lock = threading.RLock()
+
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", name.strip().lower()).strip("-")
+
+
+def _archive_name(slug: str, table: str) -> str:
+    return f"{slug}_{table}.csv.gz"
+
+
+def get_terms() -> dict:
+    """
+    Get the current guild's terms
+    Returns:
+        dict: {"current": name of the current term or None, "started": Unix timestamp or None,
+               "closed": [{"name", "slug", "start", "end", "rows": {table: row count}}, ...] oldest first}
+    """
+    return GuildData.storage().read_json(TERMS_NAME) or {"current": None, "started": None, "closed": []}
+
+
+def find_term(term: str):
+    """
+    Find a closed term by name, ignoring case and punctuation
+    Returns:
+        dict: The term's record from get_terms()["closed"], or None if there is no such closed term
+    """
+    slug = _slug(term)
+    for record in get_terms()["closed"]:
+        if record["slug"] == slug:
+            return record
+    return None
+
+
+def close_term(name: str = None, next_name: str = None) -> int:
+    """
+    Close the current term: its points and interviews are archived as compressed, read-only files and the
+    live tables start over empty, so current-term commands only read the new term's rows.
+
+    :param name: Name of the term being closed, defaults to the name it was started with
+    :param next_name: Name of the term that starts now (optional)
+    :return: 0 on success, 1 if the term has no name, the name is already used or archiving failed
+    """
+    with _lock:
+        terms = get_terms()
+        name = (name or terms["current"] or "").strip()
+        slug = _slug(name)
+        if not slug or find_term(name) is not None:
+            logger.error(f"Cannot close term '{name}': it needs a new, non-empty name")
+            return 1
+
+        storage = GuildData.storage()
+        try:
+            frames = {table: storage.read_table(table) for table in TERM_TABLES}
+            # Archives hold pledge names rather than IDs, so they stay readable whatever happens to the registry
+            for table, df in frames.items():
+                data = gzip.compress(df.drop(columns=[PLEDGE_ID]).to_csv(index=False).encode("utf-8"))
+                storage.write_archive(_archive_name(slug, table), data)
+        except Exception as e:
+            logger.error(f"Error archiving term {name}: {str(e)}")
+            return 1
+
+        now = time.time()
+        times = pd.concat([pd.to_numeric(df["Time"], errors="coerce") for df in frames.values()])
+        start = terms["started"] if terms["started"] is not None else times.min()
+        terms["closed"].append({
+            "name": name,
+            "slug": slug,
+            "start": None if pd.isna(start) else float(start),
+            "end": now,
+            "rows": {table: len(df) for table, df in frames.items()},
+        })
+        terms["current"] = next_name.strip() if next_name and next_name.strip() else None
+        terms["started"] = now
+        # Record the archive before emptying the live tables, so a crash in between loses nothing
+        storage.write_json(TERMS_NAME, terms)
+        for table in TERM_TABLES:
+            storage.write_table(table, empty_table(table))
+        logger.info(f"Closed term {name}: archived {terms['closed'][-1]['rows']}")
+        return 0
+
+
+def load_table(table: str, term: str):
+    """
+    Read a table as it was when a term was closed. Archives never change, so each is decompressed once
+    and kept in memory.
+
+    :param table: "points" or "interviews"
+    :param term: Name of a closed term
+    :return: The table as a DataFrame, or None if there is no such closed term
+    """
+    record = find_term(term)
+    if record is None or table not in TERM_TABLES:
+        return None
+    store = GuildData.current()
+    key = ("term", record["slug"], table)
+    with _lock:
+        df = store.cache.get(key)
+        if df is None:
+            data = store.storage.read_archive(_archive_name(record["slug"], table))
+            if data is None:
+                logger.error(f"Missing {table} archive of term {record['name']}")
+                return None
+            df = Schema.read_csv(gzip.decompress(data), TABLES[table][1])
+            store.cache[key] = df
+        return df.copy()
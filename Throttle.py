@@ -0,0 +1,122 @@
+import os
+
+import discord
+from discord import app_commands
+
+from Messaging import TokenBucket
+from PointSystem import logger
+
+# Each user may spend USER_BURST tokens at once, refilled at USER_RATE tokens per second
+USER_RATE = float(os.getenv("THROTTLE_USER_RATE", "0.2"))
+USER_BURST = float(os.getenv("THROTTLE_USER_BURST", "6"))
+# Shared allowance for everyone in a guild, so many users together cannot saturate the bot either
+GUILD_RATE = float(os.getenv("THROTTLE_GUILD_RATE", "1.0"))
+GUILD_BURST = float(os.getenv("THROTTLE_GUILD_BURST", "20"))
+# Buckets are pruned once this many are being tracked
+MAX_BUCKETS = 1000
+
+# Token cost of each throttled command, reflecting how expensive it is to run.
+# Rendering commands cost the most, commands that only read a CSV cost the least.
+COMMAND_WEIGHTS = {
+    "interactive_plot": 4,
+    "show_points_history": 3,
+    "show_points_graph": 3,
+    "get_interview_summary": 2,
+    "show_logs": 2,
+    "export_points_file": 2,
+    "show_pledge_ranking": 1,
+    "get_interview_rankings": 1,
+    "get_interviews": 1,
+    "list_pending_points": 1,
+}
+
+
+class CommandThrottle:
+    """
+    Per-user and per-guild token bucket limiter for commands
+    """
+
+    def __init__(self, user_rate: float = USER_RATE, user_burst: float = USER_BURST,
+                 guild_rate: float = GUILD_RATE, guild_burst: float = GUILD_BURST, weights: dict = None):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.guild_rate = guild_rate
+        self.guild_burst = guild_burst
+        self.weights = COMMAND_WEIGHTS if weights is None else weights
+        self._user_buckets: dict[int, TokenBucket] = {}
+        self._guild_buckets: dict[int, TokenBucket] = {}
+
+    def _bucket(self, buckets: dict, key, rate: float, burst: float) -> TokenBucket:
+        bucket = buckets.get(key)
+        if bucket is None:
+            if len(buckets) >= MAX_BUCKETS:
+                self._prune(buckets)
+            bucket = TokenBucket(rate, burst)
+            buckets[key] = bucket
+        return bucket
+
+    @staticmethod
+    def _prune(buckets: dict):
+        # Full buckets hold no state worth keeping
+        for key in [key for key, bucket in buckets.items() if bucket.wait_time(bucket.capacity) == 0]:
+            del buckets[key]
+
+    def weight(self, command_name: str) -> float:
+        """
+        Get the token cost of a command
+        """
+        return self.weights.get(command_name, 1)
+
+    def acquire(self, user_id: int, guild_id: int, command_name: str) -> float:
+        """
+        Take tokens for one run of a command if both the user and the guild can afford it
+        Args:
+            user_id (int): ID of the user running the command
+            guild_id (int): ID of the guild, or None in DMs
+            command_name (str): Name of the command
+        Returns:
+            float: 0 if the command may run, otherwise the number of seconds to wait
+        """
+        user_bucket = self._bucket(self._user_buckets, user_id, self.user_rate, self.user_burst)
+        buckets = [(user_bucket, min(self.weight(command_name), self.user_burst))]
+        if guild_id is not None:
+            guild_bucket = self._bucket(self._guild_buckets, guild_id, self.guild_rate, self.guild_burst)
+            buckets.append((guild_bucket, min(self.weight(command_name), self.guild_burst)))
+
+        # Only take tokens when every bucket can pay, so a rejected call costs nothing
+        wait = max(bucket.wait_time(tokens) for bucket, tokens in buckets)
+        if wait > 0:
+            return wait
+        for bucket, tokens in buckets:
+            bucket.try_acquire(tokens)
+        return 0.0
+
+    def limit(self):
+        """
+        App command check that rejects the command with CommandOnCooldown when the caller is over their limit.
+        Runs before the command body, so throttled calls never touch files or render anything.
+        Checks run bottom-up, so place this above the role check to only charge members who may run the command.
+        """
+        def predicate(interaction: discord.Interaction) -> bool:
+            command_name = interaction.command.name if interaction.command else "unknown"
+            guild_id = interaction.guild.id if interaction.guild else None
+            retry_after = self.acquire(interaction.user.id, guild_id, command_name)
+            if retry_after > 0:
+                logger.warning(f"Throttled '{command_name}' for {interaction.user.display_name}, "
+                               f"retry in {retry_after:.1f}s")
+                cooldown = app_commands.Cooldown(self.user_burst, self.user_burst / self.user_rate)
+                raise app_commands.CommandOnCooldown(cooldown, retry_after)
+            return True
+
+        return app_commands.check(predicate)
+
+
+# Shared limiter used by the bot's commands
+throttle = CommandThrottle()
+
+
+def limit():
+    """
+    Throttle a command with the shared limiter
+    """
+    return throttle.limit()
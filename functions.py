@@ -6,8 +6,13 @@ from datetime import datetime
 import discord
 import pandas as pd
 
-from CheckRoles import check_pledge
-from PointSystem import logger, get_pledges
+import GuildData
+import Ledger
+from CheckRoles import BROTHER_ROLE, VP_INTERNAL_ROLE, check_pledge, has_role
+from Messaging import respond, send_long_message
+from PointSystem import (add_pending_points_many, approve_pending_ids, get_pending_changes, get_pledges, logger,
+                         reject_pending_ids)
+from logging_config import LOG_FILE
 
 
 # Initialize logger for this module
@@ -30,33 +35,25 @@ def add_pledge(name):
     if check_pledge(name):
         return 1
     else:
-        with open('pledges.csv', 'a') as fil:
-            fil.write(f"{name}\n")
+        GuildData.storage().add_pledge(name)
     return 0
 
 
 def delete_pledge(name: str):
     """
-    Remove a pledge from the system
+    Remove a pledge from the system. Their points and interviews are kept, and adding a pledge
+    with the same name again restores them.
     Args:
         name (str): Name of pledge to delete
     Returns:
         int: 0 for success, 1 if pledge doesn't exist
     """
-    # Read all pledges
-    pledges = get_pledges()
-    
     # Check if pledge exists
-    if name not in pledges:
+    if name not in get_pledges():
         return 1
     
-    # Remove pledge from list
-    pledges.remove(name)
-    
-    # Write updated list back to file
-    with open('pledges.csv', 'w') as fil:
-        for pledge in pledges:
-            fil.write(f"{pledge}\n")
+    # Mark the pledge as removed in the registry
+    GuildData.storage().remove_pledge(name)
     # Verify the pledge was actually deleted
     if name in get_pledges():
         logger.error(f"Failed to delete pledge {name}")
@@ -66,6 +63,45 @@ def delete_pledge(name: str):
     return 0
 
 
+def rename_pledge(old_name: str, new_name: str):
+    """
+    Rename a pledge. Their points and interviews follow them without rewriting any history.
+    Args:
+        old_name (str): Current name of the pledge
+        new_name (str): New name of the pledge
+    Returns:
+        int: 0 for success, 1 if the pledge doesn't exist or the new name is invalid or taken
+    """
+    if not isinstance(new_name, str) or not new_name.strip() or len(new_name) > 50:
+        return 1
+    if not check_pledge(old_name) or check_pledge(new_name):
+        return 1
+    if not GuildData.storage().rename_pledge(old_name, new_name):
+        logger.error(f"Failed to rename pledge {old_name} to {new_name}")
+        return 1
+    logger.info(f"Renamed pledge {old_name} to {new_name}")
+    return 0
+
+
+def merge_pledges(source: str, target: str):
+    """
+    Merge a pledge into another, e.g. a duplicate created by a typo. The source's points and
+    interviews count towards the target and the source is removed from the pledge list.
+    Args:
+        source (str): Name of the pledge to merge away
+        target (str): Name of the pledge to keep
+    Returns:
+        int: 0 for success, 1 if either pledge doesn't exist or they are the same
+    """
+    if source == target or not check_pledge(source) or not check_pledge(target):
+        return 1
+    if not GuildData.storage().merge_pledges(source, target):
+        logger.error(f"Failed to merge pledge {source} into {target}")
+        return 1
+    logger.info(f"Merged pledge {source} into {target}")
+    return 0
+
+
 def get_recent_logs(hours: int = 24) -> tuple[list[str], str]:
     """
     Retrieve logs from the past specified hours
@@ -80,11 +116,11 @@ def get_recent_logs(hours: int = 24) -> tuple[list[str], str]:
         past_time = now - (hours * 60 * 60)
         
         # Check if log file exists
-        if not os.path.exists('bot.log'):
+        if not os.path.exists(LOG_FILE):
             return [], "Log file does not exist."
             
         # Read and process log files
-        with open('bot.log', 'r') as f:
+        with open(LOG_FILE, 'r') as f:
             logs = f.readlines()
             
         if not logs:
@@ -130,7 +166,7 @@ def clean_old_logs():
     :return: None
     """
     try:
-        if not os.path.exists('bot.log'):
+        if not os.path.exists(LOG_FILE):
             logger.warning("No log file found to clean")
             return
             
@@ -139,7 +175,7 @@ def clean_old_logs():
         cutoff_time = now - (3 * 24 * 60 * 60)  # 3 days in seconds
         
         # Read existing logs
-        with open('bot.log', 'r') as f:
+        with open(LOG_FILE, 'r') as f:
             logs = f.readlines()
             
         if not logs:
@@ -158,7 +194,7 @@ def clean_old_logs():
                 recent_logs.append(line)  # Keep lines we can't parse to be safe
                 
         # Write filtered logs back to file
-        with open('bot.log', 'w') as f:
+        with open(LOG_FILE, 'w') as f:
             f.writelines(recent_logs)
             
         logger.info(f"Cleaned {len(logs) - len(recent_logs)} old log entries")
@@ -166,19 +202,39 @@ def clean_old_logs():
     except Exception as e:
         logger.error(f"Error cleaning old logs: {str(e)}")
 
+
+def _plot_pledge(history, pledge, filename):
+    from matplotlib.figure import Figure
+
+    # The ledger arrays are only converted for plotting, one pledge at a time
+    times, totals = history.series(GuildData.storage().pledge_id(pledge))
+
+    # A standalone Figure has no pyplot global state, so renders on different threads never interfere
+    figure = Figure(figsize=(10, 6))
+    axes = figure.subplots()
+    axes.plot(pd.to_datetime(times, unit='s'), totals, marker='o')
+    axes.set_title(f'Points Over Time - {pledge}')
+    axes.set_xlabel('Date')
+    axes.set_ylabel('Total Points')
+    axes.grid(True)
+    axes.tick_params(axis='x', labelrotation=45)
+    figure.tight_layout()
+    figure.savefig(filename)
+
+
 class PointsPlotView(discord.ui.View):
-    def __init__(self, df, pledges):
+    def __init__(self, history, pledges):
         super().__init__(timeout=300)  # 5 minute timeout
-        self.df = df
+        self.history = history
         self.pledges = pledges
         self.current_pledge = pledges[0] if pledges else None
-        
+
     @discord.ui.button(label="Previous Pledge", style=discord.ButtonStyle.primary)
     async def prev_pledge(self, interaction: discord.Interaction, button: discord.ui.Button):
         if not self.pledges:
             await interaction.response.send_message("No pledges available", ephemeral=True)
             return
-            
+
         current_idx = self.pledges.index(self.current_pledge)
         self.current_pledge = self.pledges[current_idx - 1]
         await self.update_plot(interaction)
@@ -188,96 +244,341 @@ class PointsPlotView(discord.ui.View):
         if not self.pledges:
             await interaction.response.send_message("No pledges available", ephemeral=True)
             return
-            
+
         current_idx = self.pledges.index(self.current_pledge)
         self.current_pledge = self.pledges[(current_idx + 1) % len(self.pledges)]
         await self.update_plot(interaction)
 
     async def update_plot(self, interaction: discord.Interaction):
-        import matplotlib.pyplot as plt
-        
-        # Filter data for current pledge
-        pledge_data = self.df[self.df['Name'] == self.current_pledge].copy()
-        pledge_data = pledge_data.sort_values('Time')
-        pledge_data['Cumulative'] = pledge_data['Point_Change'].cumsum()
-        
-        # Create plot
-        plt.figure(figsize=(10, 6))
-        plt.plot(pledge_data['Time'], pledge_data['Cumulative'], marker='o')
-        plt.title(f'Points Over Time - {self.current_pledge}')
-        plt.xlabel('Date')
-        plt.ylabel('Total Points')
-        plt.grid(True)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        
         # Save temporary file
         temp_filename = f'temp_plot_{int(time.time())}.png'
-        plt.savefig(temp_filename)
-        plt.close()
-        
+        _plot_pledge(self.history, self.current_pledge, temp_filename)
+
         # Send updated plot
         await interaction.response.edit_message(
             content=f"Showing points for: {self.current_pledge}",
             attachments=[discord.File(temp_filename)],
             view=self
         )
-        
+
         # Clean up temporary file
         os.remove(temp_filename)
 
+
 async def interactive_plot(interaction: discord.Interaction):
     """
     Create an interactive plot using Discord's native buttons
-    
+
     Args:
         interaction (discord.Interaction): The Discord interaction
     """
     try:
-        # Read and prepare data
-        import matplotlib.pyplot as plt
-        df = pd.read_csv('Points.csv')
-        df['Time'] = pd.to_datetime(df['Time'], unit='s')
-        
+        # Shared, compact point history of the current guild
+        history = Ledger.get_history()
+
         # Get active pledges
         pledges = get_pledges()
         if not pledges:
-            await interaction.response.send_message("No pledges found in the system.")
+            await respond(interaction, "No pledges found in the system.")
             return
-            
+
         # Create view with initial plot
-        view = PointsPlotView(df, pledges)
-        
+        view = PointsPlotView(history, pledges)
+
         # Generate initial plot
         temp_filename = f'temp_plot_{int(time.time())}.png'
-        pledge_data = df[df['Name'] == view.current_pledge].copy()
-        pledge_data = pledge_data.sort_values('Time')
-        pledge_data['Cumulative'] = pledge_data['Point_Change'].cumsum()
-        
-        plt.figure(figsize=(10, 6))
-        plt.plot(pledge_data['Time'], pledge_data['Cumulative'], marker='o')
-        plt.title(f'Points Over Time - {view.current_pledge}')
-        plt.xlabel('Date')
-        plt.ylabel('Total Points')
-        plt.grid(True)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        plt.savefig(temp_filename)
-        plt.close()
-        
+        _plot_pledge(history, view.current_pledge, temp_filename)
+
         # Send initial message with plot
-        await interaction.response.send_message(
+        await respond(
+            interaction,
             content=f"Showing points for: {view.current_pledge}",
             file=discord.File(temp_filename),
             view=view
         )
-        
+
         # Clean up temporary file
         os.remove(temp_filename)
-        
+
     except Exception as e:
         logger.error(f"Error in interactive_plot: {str(e)}")
-        await interaction.response.send_message(
+        await respond(
+            interaction,
             "An error occurred while creating the interactive plot.",
             ephemeral=True
         )
+
+
+# Pending changes shown on each page of the approval view. Each takes a row of buttons and the
+# navigation buttons take the last of Discord's five rows.
+PENDING_PAGE_SIZE = 4
+
+
+def _format_pending(entry: dict) -> str:
+    emoji = "🔺" if entry["Point_Change"] > 0 else "🔻"
+    return (f"{emoji} {entry['Name']}: {int(entry['Point_Change']):+d} points, "
+            f"requested by {entry['Requester']}\n   {entry['Comments']}")
+
+
+class PendingApprovalView(discord.ui.View):
+    """
+    Pages through the pending points changes with Approve/Reject buttons for each one.
+    Changes are kept in memory by pending ID, so acting on one never shifts the others and
+    pages are redrawn without reading the pending file again.
+    """
+
+    def __init__(self, pending: pd.DataFrame, guild_id=None):
+        super().__init__(timeout=600)  # 10 minute timeout
+        self.guild_id = guild_id
+        # Pending ID -> change, in the order they were requested
+        self.entries: dict[str, dict] = {row["ID"]: row for row in pending.to_dict("records")}
+        self.page = 0
+        self.log: list[str] = []
+        self._render()
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        # Button presses bypass the command tree, so select the guild's data and check the role here
+        GuildData.activate(self.guild_id)
+        if not has_role(interaction, VP_INTERNAL_ROLE):
+            await interaction.response.send_message("You must have the VP Internal role to use this command.",
+                                                    ephemeral=True)
+            return False
+        return True
+
+    def _page_ids(self) -> list[str]:
+        ids = list(self.entries)
+        pages = max(1, -(-len(ids) // PENDING_PAGE_SIZE))
+        self.page = min(self.page, pages - 1)
+        return ids[self.page * PENDING_PAGE_SIZE:(self.page + 1) * PENDING_PAGE_SIZE]
+
+    def content(self) -> str:
+        """
+        Get the message text for the current page
+        """
+        ids = self._page_ids()
+        if not ids:
+            lines = ["No pending points changes left."]
+        else:
+            pages = -(-len(self.entries) // PENDING_PAGE_SIZE)
+            lines = [f"Pending points changes, page {self.page + 1}/{pages} ({len(self.entries)} left):"]
+            lines += [f"{i + 1}. {_format_pending(self.entries[pending_id])}" for i, pending_id in enumerate(ids)]
+        if self.log:
+            lines += ["", *self.log[-5:]]
+        # Stay inside Discord's message limit even with long comments
+        return "\n".join(lines)[:2000]
+
+    def _render(self):
+        self.clear_items()
+        ids = self._page_ids()
+        for row, pending_id in enumerate(ids):
+            for label, style, approve in ((f"Approve {row + 1}", discord.ButtonStyle.success, True),
+                                          (f"Reject {row + 1}", discord.ButtonStyle.danger, False)):
+                button = discord.ui.Button(label=label, style=style, row=row)
+                button.callback = self._entry_callback([pending_id], approve)
+                self.add_item(button)
+
+        nav = PENDING_PAGE_SIZE
+        previous = discord.ui.Button(label="Previous", style=discord.ButtonStyle.secondary, row=nav,
+                                     disabled=self.page == 0)
+        previous.callback = self._turn_page(-1)
+        approve_page = discord.ui.Button(label="Approve page", style=discord.ButtonStyle.success, row=nav,
+                                         disabled=not ids)
+        approve_page.callback = self._entry_callback(ids, True)
+        following = discord.ui.Button(label="Next", style=discord.ButtonStyle.secondary, row=nav,
+                                      disabled=(self.page + 1) * PENDING_PAGE_SIZE >= len(self.entries))
+        following.callback = self._turn_page(1)
+        for button in (previous, approve_page, following):
+            self.add_item(button)
+
+    def _turn_page(self, step: int):
+        async def callback(interaction: discord.Interaction):
+            self.page += step
+            await self._refresh(interaction)
+        return callback
+
+    def _entry_callback(self, ids: list[str], approve: bool):
+        async def callback(interaction: discord.Interaction):
+            self.decide(ids, approve, interaction.user.display_name, interaction.user.id)
+            await self._refresh(interaction)
+        return callback
+
+    def decide(self, ids: list[str], approve: bool, member: str, member_id: int = None):
+        """
+        Approve or reject pending changes and drop them from the view. Changes an error kept from being
+        decided stay in the view so they can be tried again.
+        """
+        if approve:
+            changes, failed, errored = approve_pending_ids(ids, member, member_id)
+        else:
+            changes, failed, errored = reject_pending_ids(ids)
+        verb = "Approved" if approve else "Rejected"
+        for change in changes.to_dict("records"):
+            self.entries.pop(change["ID"], None)
+            self.log.append(f"{'✅' if approve else '❌'} {verb} by {member}: {change['Name']} "
+                            f"{int(change['Point_Change']):+d}")
+        for pending_id in failed:
+            entry = self.entries.pop(pending_id, None)
+            if entry is not None:
+                self.log.append(f"⚠️ Could not {verb.lower()[:-1]} {entry['Name']} {int(entry['Point_Change']):+d}: "
+                                f"no longer pending, the pledge was removed or the change is invalid")
+        if errored:
+            self.log.append(f"⚠️ Could not {verb.lower()[:-1]} {len(errored)} changes because of an error, "
+                            f"they are still listed to try again")
+
+    async def _refresh(self, interaction: discord.Interaction):
+        self._render()
+        await interaction.response.edit_message(content=self.content(), view=self)
+
+
+async def review_pending(interaction: discord.Interaction):
+    """
+    Show the pending points changes with buttons to approve or reject them
+
+    Args:
+        interaction (discord.Interaction): The Discord interaction
+    """
+    try:
+        pending = get_pending_changes()
+        if pending.empty:
+            await respond(interaction, "No pending points changes.", ephemeral=True)
+            return
+        view = PendingApprovalView(pending, interaction.guild_id)
+        await respond(interaction, content=view.content(), view=view)
+    except Exception as e:
+        logger.error(f"Error in review_pending: {str(e)}")
+        await respond(interaction, "An error occurred while loading the pending points changes.", ephemeral=True)
+
+
+# Pledges listed on each page of the pledge picker, the most options a Discord select menu can hold
+PLEDGE_PAGE_SIZE = 25
+
+
+class PledgePickerView(discord.ui.View):
+    """
+    Lets a brother choose any number of pledges for one points change, a page of pledges at a time, and
+    requests the change for all of them as one pending batch. Choices are kept while turning pages.
+    """
+
+    def __init__(self, pledges: list[str], point_change: int, comment: str, guild_id=None):
+        super().__init__(timeout=600)  # 10 minute timeout
+        self.guild_id = guild_id
+        self.pledges = list(pledges)
+        self.point_change = point_change
+        self.comment = comment
+        self.chosen: set[str] = set()
+        self.page = 0
+        self.problem = None
+        self._render()
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        # Component presses bypass the command tree, so select the guild's data and check the role here
+        GuildData.activate(self.guild_id)
+        if not has_role(interaction, BROTHER_ROLE):
+            await interaction.response.send_message("You must have the Brother role to use this command.",
+                                                    ephemeral=True)
+            return False
+        return True
+
+    def _page_pledges(self) -> list[str]:
+        start = self.page * PLEDGE_PAGE_SIZE
+        return self.pledges[start:start + PLEDGE_PAGE_SIZE]
+
+    def chosen_pledges(self) -> list[str]:
+        """
+        Get the chosen pledges in the order they are listed
+        """
+        return [pledge for pledge in self.pledges if pledge in self.chosen]
+
+    def content(self) -> str:
+        pages = -(-len(self.pledges) // PLEDGE_PAGE_SIZE)
+        lines = [f"Choose the pledges for {self.point_change:+d} points each: {self.comment}",
+                 f"Page {self.page + 1}/{pages}, {len(self.chosen)} chosen: {', '.join(self.chosen_pledges())}"]
+        if self.problem:
+            lines.append(f"❌ {self.problem}")
+        # Stay inside Discord's message limit however many pledges are chosen
+        return "\n".join(lines)[:2000]
+
+    def _render(self):
+        self.clear_items()
+        page = self._page_pledges()
+        select = discord.ui.Select(
+            placeholder="Choose pledges", min_values=0, max_values=len(page), row=0,
+            options=[discord.SelectOption(label=pledge, value=pledge, default=pledge in self.chosen)
+                     for pledge in page])
+        select.callback = self._select_callback(select)
+        self.add_item(select)
+
+        previous = discord.ui.Button(label="Previous", style=discord.ButtonStyle.secondary, row=1,
+                                     disabled=self.page == 0)
+        previous.callback = self._turn_page(-1)
+        following = discord.ui.Button(label="Next", style=discord.ButtonStyle.secondary, row=1,
+                                      disabled=(self.page + 1) * PLEDGE_PAGE_SIZE >= len(self.pledges))
+        following.callback = self._turn_page(1)
+        submit = discord.ui.Button(label=f"Request for {len(self.chosen)} pledges", style=discord.ButtonStyle.success,
+                                   row=1, disabled=not self.chosen)
+        submit.callback = self._submit
+        for button in (previous, following, submit):
+            self.add_item(button)
+
+    def choose(self, pledges: list[str]):
+        """
+        Replace the choices on the current page with the given pledges
+        """
+        self.chosen = (self.chosen - set(self._page_pledges())) | set(pledges)
+
+    def _select_callback(self, select: discord.ui.Select):
+        async def callback(interaction: discord.Interaction):
+            self.choose(select.values)
+            await self._refresh(interaction)
+        return callback
+
+    def _turn_page(self, step: int):
+        async def callback(interaction: discord.Interaction):
+            self.page += step
+            await self._refresh(interaction)
+        return callback
+
+    async def _submit(self, interaction: discord.Interaction):
+        names = self.chosen_pledges()
+        batch, problems = add_pending_points_many(names, self.point_change, self.comment,
+                                                  interaction.user.display_name, interaction.user.id)
+        if batch is None:
+            self.problem = "; ".join(problems)
+            await self._refresh(interaction)
+            return
+        self.stop()
+        await interaction.response.edit_message(content=f"Requested as batch {batch}.", view=None)
+        emoji = "🔺" if self.point_change > 0 else "🔻"
+        await send_long_message(
+            interaction,
+            f"{emoji} Points change requested by {interaction.user.display_name} as batch {batch}:\n"
+            f"Pledges: {', '.join(names)}\n"
+            f"Change: {self.point_change:+d} points each\n"
+            f"Comment: {self.comment}\n"
+            f"Status: Awaiting VP Internal approval with /approve_batch"
+        )
+
+    async def _refresh(self, interaction: discord.Interaction):
+        self._render()
+        await interaction.response.edit_message(content=self.content(), view=self)
+
+
+async def pick_pledges(interaction: discord.Interaction, point_change: int, comment: str):
+    """
+    Show a menu for choosing the pledges of a points change requested for several pledges at once
+
+    Args:
+        interaction (discord.Interaction): The Discord interaction
+        point_change (int): Points to add or remove for each chosen pledge
+        comment (str): Reason for the change
+    """
+    try:
+        pledges = get_pledges()
+        if not pledges:
+            await respond(interaction, "No pledges found in the system.", ephemeral=True)
+            return
+        view = PledgePickerView(pledges, point_change, comment, interaction.guild_id)
+        await respond(interaction, content=view.content(), view=view, ephemeral=True)
+    except Exception as e:
+        logger.error(f"Error in pick_pledges: {str(e)}")
+        await respond(interaction, "An error occurred while loading the pledges.", ephemeral=True)
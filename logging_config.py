@@ -1,4 +1,12 @@
 import logging
+import logging.handlers
+import os
+
+# Log file shared by every guild the bot serves
+LOG_FILE = os.getenv("LOG_FILE", "bot.log")
+# The log file is rotated once it reaches LOG_MAX_BYTES, keeping LOG_BACKUPS old files (bot.log.1, ...)
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "5"))
 
 # Define custom logging level for command tracking
 COMMAND_LEVEL = 25  # Set between INFO (20) and WARNING (30)
@@ -16,7 +24,8 @@ def setup_logging():
         level=logging.INFO,
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
         handlers=[
-            logging.FileHandler('bot.log'),   # Log to file
+            # Log to file, rotated by size so it never grows without bound
+            logging.handlers.RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS),
             logging.StreamHandler()           # Log to console
         ]
     )
@@ -1,6 +1,7 @@
 # Import required libraries for Discord bot functionality
 import asyncio  # Asynchronous I/O support
 import functools  # Function and decorator tools
+import io  # In-memory file objects
 import os  # File and path operations
 import platform  # System information
 import ssl  # Secure connection support
@@ -16,11 +17,21 @@ from discord import app_commands  # Discord slash commands
 from discord.ext import commands, tasks  # Discord bot commands and scheduled tasks
 from dotenv import load_dotenv
 
+import Archive
 import CheckRoles
+import GuildData
+import Idempotency
 import Interviews
+import Ledger
+import Messaging
 import PointSystem
+import Rules
+import Search
+import SingleFlight
+import Terms
+import Throttle
 import functions as fn  # Custom functions for pledge management
-from logging_config import setup_logging  # Add this import
+from logging_config import LOG_FILE, setup_logging  # Add this import
 
 # Get configured logger
 logger = setup_logging()
@@ -28,14 +39,39 @@ logger = setup_logging()
 # Initialize SSL context for secure connections
 ssl_context = ssl.create_default_context(cafile=certifi.where())
 
+load_dotenv()  # Load environment variables from .env file
+TOKEN = os.getenv('DISCORD_TOKEN')
+# Minutes between snapshots of the data files into backups/
+SNAPSHOT_MINUTES = float(os.getenv('SNAPSHOT_MINUTES', '60'))
+# Seconds between flushes of buffered data writes to disk
+FLUSH_SECONDS = float(os.getenv('FLUSH_SECONDS', '0.25'))
+
+
+class GuildCommandTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        # Point the data layer at this guild's files. Each interaction is handled in its own task,
+        # so this never leaks into commands running for other guilds.
+        GuildData.activate(interaction.guild_id)
+        return True
+
+
 # Set up Discord bot with required permissions
 intents = discord.Intents.default()
 intents.message_content = True  # Enable message content intent
-bot = commands.Bot(command_prefix='!', intents=intents)
+# Set AUTO_SHARD=1 to let discord.py split the bot's guilds over as many shards as Discord recommends
+bot_class = commands.AutoShardedBot if os.getenv('AUTO_SHARD', '0') == '1' else commands.Bot
+bot = bot_class(command_prefix='!', intents=intents, tree_cls=GuildCommandTree)
 bot.start_time = None
 
-load_dotenv()  # Load environment variables from .env file
-TOKEN = os.getenv('DISCORD_TOKEN')
+AS_OF_FORMAT_ERROR = "❌ Invalid as_of date. Use YYYY-MM-DD or YYYY-MM-DD HH:MM (UTC)."
+DATE_FORMAT_ERROR = "❌ Invalid date. Use YYYY-MM-DD or YYYY-MM-DD HH:MM (UTC)."
+# Largest CSV file accepted by /import_points
+MAX_IMPORT_BYTES = 256 * 1024
+
+# Shares results of read-heavy commands between users running them at the same time
+read_cache = SingleFlight.SingleFlight()
+# Answers retried or double-submitted write commands with their original result
+write_requests = Idempotency.IdempotencyCache()
 
 
 # Event handler for when bot successfully connects to Discord
@@ -44,38 +80,6 @@ async def on_ready():
     if bot.start_time is None:  # Only set on first connection
         bot.start_time = datetime.now(pytz.UTC)
 
-    # Initialize required CSV files if they don't exist
-    try:
-        # Create pledges.csv if it doesn't exist
-        if not os.path.exists('pledges.csv'):
-            logger.info("Creating pledges.csv file")
-            with open('pledges.csv', 'w') as f:
-                f.write("")  # Create empty file
-
-        # Create Points.csv if it doesn't exist
-        if not os.path.exists('Points.csv'):
-            logger.info("Creating Points.csv file")
-            df = pd.DataFrame(columns=["Time", "Name", "Point_Change", "Comments"])
-            df.to_csv("Points.csv", index=False)
-            del df
-
-        # Create PendingPoints.csv if it doesn't exist
-        if not os.path.exists('PendingPoints.csv'):
-            logger.info("Creating PendingPoints.csv file")
-            df = pd.DataFrame(columns=["Time", "Name", "Point_Change", "Comments", "Requester"])
-            df.to_csv("PendingPoints.csv", index=False)
-            del df
-        # Create interviews.csv if it doesn't exist
-        if not os.path.exists('interviews.csv'):
-            logger.info("Creating PendingPoints.csv file")
-            df = pd.DataFrame(columns=["Time", "Pledge", "Brother", "Quality"])
-            df.to_csv("interviews.csv", index=False)
-            del df
-
-
-    except Exception as e:
-        logger.error(f"Error initializing CSV files: {str(e)}")
-
     logger.info(f'{bot.user} has connected to Discord!')
     try:
         # Synchronize slash commands with Discord's API
@@ -96,9 +100,10 @@ def timeout_command(seconds=10):
                 async with asyncio.timeout(seconds):
                     await func(interaction, *args, **kwargs)
             except asyncio.TimeoutError:
-                # Handle timeout case
-                if not interaction.response.is_done():
-                    await interaction.response.send_message("Command timed out after 10 seconds.", ephemeral=True)
+                # Handle timeout case, including commands that were deferred and never followed up
+                deferred = interaction.response.type == discord.InteractionResponseType.deferred_channel_message
+                if not interaction.response.is_done() or deferred:
+                    await Messaging.respond(interaction, f"Command timed out after {seconds} seconds.", ephemeral=True)
 
         return wrapper
 
@@ -144,16 +149,26 @@ async def pledge_name_autocomplete(
         return []
 
 
+async def term_autocomplete(
+        interaction: discord.Interaction,
+        current: str,
+) -> list[app_commands.Choice[str]]:
+    try:
+        names = [record["name"] for record in reversed(Terms.get_terms()["closed"])]
+        return [app_commands.Choice(name=name, value=name) for name in names if current.lower() in name.lower()][:25]
+    except Exception as e:
+        logger.error(f"Error in term_autocomplete: {str(e)}")
+        return []
+
+
 # Convert commands to slash commands
 @bot.tree.command(
     name="add_pledge",
     description="Add a new pledge to the list"
 )
+@CheckRoles.brother_only()
 @log_command()
 async def addpledge(interaction: discord.Interaction, name: str, comment: str = None):
-    if not await CheckRoles.check_brother_role(interaction):
-        return
-
     # Validate name
     name = name.strip()
     if not name:
@@ -182,13 +197,34 @@ async def addpledge(interaction: discord.Interaction, name: str, comment: str =
     name="get_pledge_points",
     description="Get points for a specific pledge"
 )
-@app_commands.autocomplete(name=pledge_name_autocomplete)
+@CheckRoles.brother_only()
+@app_commands.autocomplete(name=pledge_name_autocomplete, term=term_autocomplete)
+@app_commands.describe(as_of="Show the total at a past time: YYYY-MM-DD or YYYY-MM-DD HH:MM (UTC)",
+                       term="Show the total in a closed term")
 @log_command()
-async def getpoints(interaction: discord.Interaction, name: str, comment: str = None):
-    if not await CheckRoles.check_brother_role(interaction):
-        return
+async def getpoints(interaction: discord.Interaction, name: str, comment: str = None, as_of: str = None,
+                    term: str = None):
     comment_text = f"\nComment: {comment}" if comment else ""
     caller = interaction.user.display_name
+    if term:
+        points = PointSystem.get_term_points(name, term)
+        if points is None:
+            await interaction.response.send_message(f"❌ {name} has no points in a closed term named {term}.",
+                                                    ephemeral=True)
+            return
+        await interaction.response.send_message(
+            f"{caller} checked: {name} had {points} points in {term}!{comment_text}")
+        return
+    if as_of:
+        try:
+            timestamp = Ledger.parse_as_of(as_of)
+        except ValueError:
+            await interaction.response.send_message(AS_OF_FORMAT_ERROR, ephemeral=True)
+            return
+        await interaction.response.send_message(
+            f"{caller} checked: {name} had {PointSystem.get_pledge_points(name, as_of=timestamp)} points "
+            f"as of {as_of}!{comment_text}")
+        return
     await interaction.response.send_message(
         f"{caller} checked: {name} has {PointSystem.get_pledge_points(name)} points!{comment_text}")
 
@@ -198,11 +234,10 @@ async def getpoints(interaction: discord.Interaction, name: str, comment: str =
     description="Request a points change for a pledge",
     extras={"emoji": "📝"}
 )
+@CheckRoles.brother_only()
 @app_commands.autocomplete(name=pledge_name_autocomplete)
 @log_command()
 async def updatepoints(interaction: discord.Interaction, name: str, point_change: int, comment: str):
-    if not await CheckRoles.check_brother_role(interaction):
-        return
     override_message = ""
     # Validate inputs
     name = name.strip()
@@ -215,7 +250,7 @@ async def updatepoints(interaction: discord.Interaction, name: str, point_change
         return
 
     if abs(point_change) > 35:
-        if CheckRoles.check_vp_internal_role(interaction):
+        if CheckRoles.has_role(interaction, CheckRoles.VP_INTERNAL_ROLE):
             override_message = "Point Change limit is 35, but limit is overwritten by VP-Internal role."
             pass
         else:
@@ -228,15 +263,25 @@ async def updatepoints(interaction: discord.Interaction, name: str, point_change
         return
 
     # Use add_pending_points instead of direct update
-    result = PointSystem.add_pending_points(name, point_change, comment, interaction.user.display_name)
-    if result == 0:
+    key = Idempotency.request_key("change_pledge_points", interaction.guild_id, interaction.user.id,
+                                  name, point_change, comment)
+    role_ids = [role.id for role in getattr(interaction.user, "roles", [])]
+    result = write_requests.run(key, PointSystem.add_pending_points, name, point_change, comment,
+                                interaction.user.display_name, interaction.user.id, role_ids)
+    if result == 3:
+        await interaction.response.send_message(
+            f"❌ Points change for '{name}' was rejected automatically by an approval rule.",
+            ephemeral=True
+        )
+    elif result in (0, 2):
         emoji = "🔺" if point_change > 0 else "🔻"
+        status = "Approved automatically" if result == 2 else "Awaiting VP Internal approval"
         await interaction.response.send_message(
             f"{emoji} Points change requested by {interaction.user.display_name}:\n"
             f"Pledge: {name}\n"
             f"Change: {point_change:+d} points\n"
             f"Comment: {comment}\n"
-            f"Status: Awaiting VP Internal approval"
+            f"Status: {status}\n"
             f"Extra Messages: {override_message}"
         )
     else:
@@ -246,76 +291,223 @@ async def updatepoints(interaction: discord.Interaction, name: str, point_change
         )
 
 
+@bot.tree.command(
+    name="change_many_pledge_points",
+    description="Request the same points change for several pledges",
+    extras={"emoji": "📝"}
+)
+@Throttle.limit()
+@CheckRoles.brother_only()
+@app_commands.describe(point_change="Points to add or remove for each pledge, chosen from a menu after this")
+@Messaging.auto_defer(ephemeral=True)
+@log_command()
+async def updatemanypoints(interaction: discord.Interaction, point_change: int, comment: str):
+    # Pledges are chosen from a paged menu, which holds any number of them
+    await fn.pick_pledges(interaction, point_change, comment)
+
+
 @bot.tree.command(
     name="list_pledges",
     description="Get list of all pledges"
 )
+@CheckRoles.brother_only()
 @log_command()
 async def getpledges(interaction: discord.Interaction):
-    if not await CheckRoles.check_brother_role(interaction):
-        return
     await interaction.response.send_message(f"Pledges: {PointSystem.get_pledges()}")
 
 
 @bot.tree.command(name="show_points_graph", description="Display current points distribution graph")
+@Throttle.limit()
+@CheckRoles.brother_only()
+@Messaging.auto_defer(slow=True)
 @timeout_command()
 @log_command()
 async def getgraph(interaction: discord.Interaction):
-    if not await CheckRoles.check_brother_role(interaction):
-        return
-    await interaction.response.send_message(file=discord.File(PointSystem.get_points_graph()))
+    version = GuildData.storage().version("points", "pledges")
+    graph = await read_cache.run(("points_graph", version), PointSystem.get_points_graph)
+    await Messaging.respond(interaction, file=discord.File(graph))
 
 
 @bot.tree.command(name="show_pledge_ranking", description="Display current pledge rankings")
+@Throttle.limit()
+@CheckRoles.brother_only()
+@app_commands.autocomplete(term=term_autocomplete)
+@app_commands.describe(as_of="Show the rankings at a past time: YYYY-MM-DD or YYYY-MM-DD HH:MM (UTC)",
+                       term="Show the final rankings of a closed term")
+@Messaging.auto_defer()
 @log_command()
-async def getranking(interaction: discord.Interaction):
-    if not await CheckRoles.check_brother_role(interaction):
+async def getranking(interaction: discord.Interaction, as_of: str = None, term: str = None):
+    if term:
+        rankings = await read_cache.run(("term_rankings", interaction.guild_id, term),
+                                        PointSystem.get_term_rankings, term)
+        await Messaging.send_long_message(interaction, f"Rankings of {term}:\n" + "\n".join(rankings),
+                                          filename="rankings.txt")
         return
-    rankings = PointSystem.get_ranked_pledges()
+    timestamp = None
+    if as_of:
+        try:
+            timestamp = Ledger.parse_as_of(as_of)
+        except ValueError:
+            await Messaging.respond(interaction, AS_OF_FORMAT_ERROR, ephemeral=True)
+            return
+    version = GuildData.storage().version("points", "pledges")
+    rankings = await read_cache.run(("rankings", version, timestamp), PointSystem.get_ranked_pledges, timestamp)
     response = "\n".join(rankings)
-    await interaction.response.send_message(f"Current Rankings:\n{response}")
+    title = f"Rankings as of {as_of}" if as_of else "Current Rankings"
+    await Messaging.send_long_message(interaction, f"{title}:\n{response}", filename="rankings.txt")
 
 
 @bot.tree.command(name="remove_pledge", description="Remove a pledge from the list")
+@CheckRoles.brother_only()
 @app_commands.autocomplete(name=pledge_name_autocomplete)
 @log_command()
 async def deletepledge(interaction: discord.Interaction, name: str):
-    if not await CheckRoles.check_brother_role(interaction):
-        return
     await interaction.response.send_message(f"Exit Code: {fn.delete_pledge(name)}")
 
 
+@bot.tree.command(name="rename_pledge", description="Rename a pledge, keeping their points and interviews")
+@CheckRoles.vp_internal_only()
+@app_commands.autocomplete(name=pledge_name_autocomplete)
+@log_command()
+async def renamepledge(interaction: discord.Interaction, name: str, new_name: str):
+    new_name = new_name.strip()
+    if fn.rename_pledge(name, new_name) == 0:
+        await interaction.response.send_message(f"✅ Renamed {name} to {new_name}")
+    else:
+        await interaction.response.send_message(
+            f"❌ Could not rename {name}. Check that they exist and that {new_name} is not already taken.",
+            ephemeral=True)
+
+
+@bot.tree.command(name="merge_pledges", description="Merge a duplicate pledge into another, combining their history")
+@CheckRoles.vp_internal_only()
+@app_commands.autocomplete(source=pledge_name_autocomplete, target=pledge_name_autocomplete)
+@log_command()
+async def mergepledges(interaction: discord.Interaction, source: str, target: str):
+    if fn.merge_pledges(source, target) == 0:
+        await interaction.response.send_message(f"✅ Merged {source} into {target}")
+    else:
+        await interaction.response.send_message(
+            f"❌ Could not merge {source} into {target}. Both must be existing, different pledges.", ephemeral=True)
+
+
 @bot.tree.command(name="export_points_file", description="Export the points data as CSV file")
+@Throttle.limit()
+@CheckRoles.brother_only()
 @app_commands.default_permissions()
 @log_command()
 async def getpointsfile(interaction: discord.Interaction):
-    if not await CheckRoles.check_brother_role(interaction):
-        return
-    await interaction.response.send_message(file=discord.File(PointSystem.get_points_file()))
+    fp, filename = GuildData.storage().export("points")
+    await interaction.response.send_message(file=discord.File(fp, filename=filename))
 
 
 @bot.tree.command(name="show_points_history", description="Display a graph with points progression over time")
+@Throttle.limit()
+@CheckRoles.brother_only()
+@Messaging.auto_defer(slow=True)
 @timeout_command()
 @log_command()
 async def getpointstime(interaction: discord.Interaction):
-    if not await CheckRoles.check_brother_role(interaction):
+    await Messaging.respond(interaction, file=discord.File(PointSystem.get_points_over_time()))
+
+
+def format_ledger_rows(rows: list[dict]) -> str:
+    """
+    Format points ledger rows, one line each, with who requested and approved them
+    """
+    lines = []
+    for row in rows:
+        when = datetime.fromtimestamp(row["Time"], tz=pytz.utc).strftime("%Y-%m-%d %H:%M")
+        people = [f"{role} {row[column]}" for role, column in (("requested by", "Requester"), ("approved by", "Approver"))
+                  if row[column]]
+        suffix = f" ({', '.join(people)})" if people else ""
+        lines.append(f"{when} {row['Name']}: {int(row['Point_Change']):+d} points - {row['Comments']}{suffix}")
+    return "\n".join(lines)
+
+
+@bot.tree.command(name="search_points", description="Search the comments of past points changes")
+@Throttle.limit()
+@CheckRoles.brother_only()
+@app_commands.autocomplete(pledge=pledge_name_autocomplete)
+@app_commands.describe(query="Words the comment must contain",
+                       pledge="Only points changes for this pledge",
+                       requester="Only points changes requested by this member",
+                       since="Only changes from this time on: YYYY-MM-DD or YYYY-MM-DD HH:MM (UTC)",
+                       until="Only changes up to this time: YYYY-MM-DD or YYYY-MM-DD HH:MM (UTC)")
+@Messaging.auto_defer()
+@log_command()
+async def searchpoints(interaction: discord.Interaction, query: str, pledge: str = None,
+                       requester: discord.Member = None, since: str = None, until: str = None):
+    try:
+        start = Ledger.parse_as_of(since, end_of_day=False) if since else None
+        end = Ledger.parse_as_of(until) if until else None
+    except ValueError:
+        await Messaging.respond(interaction, DATE_FORMAT_ERROR, ephemeral=True)
+        return
+    if not Search.tokenize(query):
+        await Messaging.respond(interaction, "❌ Enter at least one word to search for.", ephemeral=True)
+        return
+
+    results, total = Search.search_points(query, pledge=pledge, start=start, end=end,
+                                          requester_id=requester.id if requester else None)
+    if not results:
+        await Messaging.respond(interaction, f"No points changes found for \"{query}\".", ephemeral=True)
+        return
+
+    title = f"{total} points changes matching \"{query}\""
+    if total > len(results):
+        title += f", newest {len(results)} shown"
+    await Messaging.send_long_message(interaction, f"{title}:\n{format_ledger_rows(results)}",
+                                      filename="search_results.txt")
+
+
+@bot.tree.command(name="audit", description="List past points changes by pledge, requester, approver and date")
+@Throttle.limit()
+@CheckRoles.vp_internal_only()
+@app_commands.autocomplete(pledge=pledge_name_autocomplete)
+@app_commands.describe(pledge="Only points changes for this pledge",
+                       requester="Only points changes requested by this member",
+                       approver="Only points changes approved by this member",
+                       since="Only changes from this time on: YYYY-MM-DD or YYYY-MM-DD HH:MM (UTC)",
+                       until="Only changes up to this time: YYYY-MM-DD or YYYY-MM-DD HH:MM (UTC)")
+@Messaging.auto_defer()
+@log_command()
+async def auditpoints(interaction: discord.Interaction, pledge: str = None, requester: discord.Member = None,
+                      approver: discord.Member = None, since: str = None, until: str = None):
+    try:
+        start = Ledger.parse_as_of(since, end_of_day=False) if since else None
+        end = Ledger.parse_as_of(until) if until else None
+    except ValueError:
+        await Messaging.respond(interaction, DATE_FORMAT_ERROR, ephemeral=True)
+        return
+    if not (pledge or requester or approver or since or until):
+        await Messaging.respond(interaction, "❌ Give at least one filter to audit.", ephemeral=True)
         return
-    await interaction.response.send_message(file=discord.File(PointSystem.get_points_over_time()))
+
+    results, total = Search.audit(pledge=pledge, start=start, end=end,
+                                  requester_id=requester.id if requester else None,
+                                  approver_id=approver.id if approver else None)
+    if not results:
+        await Messaging.respond(interaction, "No points changes match those filters.", ephemeral=True)
+        return
+    title = f"{total} matching points changes"
+    if total > len(results):
+        title += f", newest {len(results)} shown"
+    await Messaging.send_long_message(interaction, f"{title}:\n{format_ledger_rows(results)}",
+                                      filename="audit.txt")
 
 
 @bot.tree.command(name="log_size", description="Get the current size of the bot's log file")
+@CheckRoles.brother_only()
 @app_commands.default_permissions()
 @log_command()
 async def getlogsize(interaction: discord.Interaction):
-    if not await CheckRoles.check_brother_role(interaction):
-        return
-
     try:
-        if not os.path.exists('bot.log'):
+        if not os.path.exists(LOG_FILE):
             await interaction.response.send_message("Log file does not exist.", ephemeral=True)
             return
 
-        size_bytes = os.path.getsize('bot.log')
+        size_bytes = os.path.getsize(LOG_FILE)
 
         # Convert to appropriate unit
         if size_bytes < 1024:
@@ -337,23 +529,33 @@ async def getlogsize(interaction: discord.Interaction):
 @bot.tree.error
 async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
     if isinstance(error, app_commands.CommandOnCooldown):
-        await interaction.response.send_message(
+        await Messaging.respond(
+            interaction,
             f"⏳ This command is on cooldown. Please wait {error.retry_after:.1f} seconds.",
             ephemeral=True
         )
+    elif isinstance(error, app_commands.MissingRole):
+        await Messaging.respond(
+            interaction,
+            f"You must have the {error.missing_role} role to use this command.",
+            ephemeral=True
+        )
     elif isinstance(error, app_commands.MissingPermissions):
-        await interaction.response.send_message(
+        await Messaging.respond(
+            interaction,
             "❌ You don't have permission to use this command.",
             ephemeral=True
         )
     elif isinstance(error, app_commands.TransformerError):
-        await interaction.response.send_message(
+        await Messaging.respond(
+            interaction,
             f"❌ Invalid input: {str(error)}\nPlease check your command and try again.",
             ephemeral=True
         )
     else:
         logger.error(f"Command error: {str(error)}")
-        await interaction.response.send_message(
+        await Messaging.respond(
+            interaction,
             "❌ Oops! Something went wrong. Please try again later or contact Warner if the problem persists.",
             ephemeral=True
         )
@@ -362,13 +564,10 @@ async def on_app_command_error(interaction: discord.Interaction, error: app_comm
 # Interview Commands
 
 @bot.tree.command(name="add_interview", description="Add a new interview. Quality is binary 1 or 0")
+@CheckRoles.brother_only()
 @app_commands.autocomplete(pledge=pledge_name_autocomplete)
 @log_command()
 async def addinterview(interaction: discord.Interaction, pledge: str, brother: str, quality: int):
-    if not await CheckRoles.check_brother_role(interaction):
-        logger.warning(f"Brother {interaction} authentication failed")
-        await interaction.response.send_message("Brother authentication failed.", ephemeral=True)
-        return
     if not CheckRoles.check_pledge(pledge):
         await interaction.response.send_message("Invalid pledge.")
         logger.error(f"Invalid pledge: {pledge}")
@@ -377,20 +576,29 @@ async def addinterview(interaction: discord.Interaction, pledge: str, brother: s
         await interaction.response.send_message("Invalid quality. Quality must be 0 or 1.", ephemeral=True)
         logger.error(f"Invalid quality: {quality}")
         return
-    await interaction.response.send_message(
-        f"Added interview! Exit Code: {Interviews.add_interview(pledge, brother, int(quality), time.time())}")
-
+    key = Idempotency.request_key("add_interview", interaction.guild_id, interaction.user.id, pledge, brother,
+                                  int(quality))
+    result = write_requests.run(key, Interviews.add_interview, pledge, brother, int(quality), time.time())
+    await interaction.response.send_message(f"Added interview! Exit Code: {result}")
 
 
 @bot.tree.command(name="get_interview_rankings", description="Get a list of pledges by number of interviews")
+@Throttle.limit()
+@CheckRoles.brother_only()
+@Messaging.auto_defer()
+@app_commands.autocomplete(term=term_autocomplete)
+@app_commands.describe(term="Show the rankings of a closed term")
 @timeout_command()
 @log_command()
-async def getinterviewrankings(interaction: discord.Interaction):
-    if not await CheckRoles.check_brother_role(interaction):
-        logger.warning(f"Brother {interaction} authentication failed")
-        await interaction.response.send_message("Brother authentication failed.", ephemeral=True)
-        return
-    rankings = Interviews.interview_rankings()
+async def getinterviewrankings(interaction: discord.Interaction, term: str = None):
+    if term:
+        interviews = Terms.load_table("interviews", term)
+        if interviews is None:
+            await Messaging.respond(interaction, f"❌ No closed term named {term}.", ephemeral=True)
+            return
+        rankings = Interviews.interview_rankings(interviews)
+    else:
+        rankings = Interviews.interview_rankings()
     pledges = pd.Series(rankings).index.tolist()
     numbers = pd.Series(rankings).values.tolist()
     response = ""
@@ -399,17 +607,18 @@ async def getinterviewrankings(interaction: discord.Interaction):
         response += f"{n + 1}. "
         response += f"{i}: {numbers[n]} interviews \n"
         n += 1
-    await interaction.response.send_message(response)
+    await Messaging.send_long_message(interaction, response, filename="interview_rankings.txt")
 
 
 @bot.tree.command(name="get_interview_summary", description="Get a summary of all interview data")
+@Throttle.limit()
+@CheckRoles.brother_only()
+@Messaging.auto_defer(slow=True)
 @timeout_command()
 @log_command()
 async def getinterviewsummary(interaction: discord.Interaction):
-    if not await CheckRoles.check_brother_role(interaction):
-        logger.warning(f"Brother {interaction} authentication failed")
-        await interaction.response.send_message("Brother authentication failed.", ephemeral=True)
-    df = Interviews.interview_summary()
+    version = GuildData.storage().version("interviews", "pledges")
+    df = await read_cache.run(("interview_summary", version), Interviews.interview_summary)
     pledges = df["Pledge"].tolist()
     n_interviews = df["NumberOfInterviews"].tolist()
     n_quality = df["NQuality"].tolist()
@@ -420,20 +629,19 @@ async def getinterviewsummary(interaction: discord.Interaction):
         response += f"{pledges[i]}: {n_interviews[i]} interviews \n"
         response += f"      {n_quality[i]} quality interview(s) which is {percent_quality[i]}% of interviews\n"
     try:
-        await interaction.response.send_message(response)
+        await Messaging.send_long_message(interaction, response, filename="interview_summary.txt")
     except discord.HTTPException as e:
-        await interaction.response.send_message(f"An error occurred: {str(e)}", ephemeral=True)
+        await Messaging.respond(interaction, f"An error occurred: {str(e)}", ephemeral=True)
 
 
 @bot.tree.command(name="get_interviews", description="Get a list of all interviews for a specific pledge")
+@Throttle.limit()
+@CheckRoles.brother_only()
 @app_commands.autocomplete(pledge=pledge_name_autocomplete)
+@Messaging.auto_defer()
 @timeout_command()
 @log_command()
 async def getinterviews(interaction: discord.Interaction, pledge: str):
-    if not await CheckRoles.check_brother_role(interaction):
-        logger.warning(f"Brother {interaction} authentication failed")
-        await interaction.response.send_message("Brother authentication failed.", ephemeral=True)
-        return 0
     df = Interviews.get_pledge_interviews(pledge)
     df.drop(columns="Pledge", inplace=True)
     brothers = df["Brother"].tolist()
@@ -449,7 +657,23 @@ async def getinterviews(interaction: discord.Interaction, pledge: str):
     for i in range(len(brothers)):
         response += f"{i + 1}. "
         response += f"Brother: {brothers[i]}; Quality: {quality[i]} \n"
-    await interaction.response.send_message(response)
+    await Messaging.send_long_message(interaction, response, filename="interviews.txt")
+
+
+# Keep the cached role IDs used by the permission checks in sync with the guild
+@bot.event
+async def on_guild_role_create(role: discord.Role):
+    CheckRoles.invalidate_roles(role.guild.id)
+
+
+@bot.event
+async def on_guild_role_update(before: discord.Role, after: discord.Role):
+    CheckRoles.invalidate_roles(after.guild.id)
+
+
+@bot.event
+async def on_guild_role_delete(role: discord.Role):
+    CheckRoles.invalidate_roles(role.guild.id)
 
 
 # Add reconnection logic
@@ -473,16 +697,26 @@ async def midnight_update():
 
         # Send updates to guilds
         for guild in bot.guilds:
+            # Record today's ranks so rankings can show movement since yesterday and last week
+            try:
+                with GuildData.use_guild(guild.id):
+                    PointSystem.save_rank_snapshot()
+            except Exception as e:
+                logger.error(f"Error saving rank snapshot for {guild.name}: {str(e)}")
+
             channel_name = os.getenv("CHANNEL_NAME")
             channel = discord.utils.get(guild.text_channels, name=str(channel_name))
             if channel:
                 try:
-                    await channel.send(file=discord.File('Points.csv'))
-                    await channel.send(file=discord.File('interviews.csv'))
-                    await channel.send(file=discord.File('PendingPoints.csv.csv'))
-                    await channel.send(file=discord.File('pledges.csv'))
-                    rankings = PointSystem.get_ranked_pledges()
-                    await channel.send("Current Pledge Rankings:\n" + "\n".join(rankings))
+                    # Each guild only ever receives its own data
+                    with GuildData.use_guild(guild.id):
+                        for table in ["points", "interviews", "pending", "pledges"]:
+                            fp, filename = GuildData.storage().export(table)
+                            await Messaging.send_channel_message(channel, file=discord.File(fp, filename=filename))
+                        rankings = PointSystem.get_ranked_pledges()
+                        await Messaging.send_channel_message(channel,
+                                                             "Current Pledge Rankings:\n" + "\n".join(rankings),
+                                                             filename="rankings.txt")
                     logger.info(f"Successfully sent midnight update to {guild.name}")
                 except Exception as e:
                     logger.error(f"Error sending midnight update to {guild.name}: {str(e)}")
@@ -491,11 +725,10 @@ async def midnight_update():
 
 
 @bot.tree.command(name="show_logs", description="Get bot logs (defaults to past 24 hours)")
+@Throttle.limit()
+@CheckRoles.brother_only()
 @app_commands.default_permissions()
 async def getlogs(interaction: discord.Interaction, hours: int = 24):
-    if not await CheckRoles.check_brother_role(interaction):
-        return
-
     # Validate hours input
     if hours <= 0:
         await interaction.response.send_message("Hours must be a positive number.", ephemeral=True)
@@ -509,25 +742,19 @@ async def getlogs(interaction: discord.Interaction, hours: int = 24):
         await interaction.response.send_message(error, ephemeral=True)
         return
 
-    with open('recent_logs.txt', 'w') as f:
-        f.writelines(recent_logs)
-
+    log_file = io.BytesIO("".join(recent_logs).encode("utf-8"))
     await interaction.response.send_message(
         f"Showing logs from the past {hours} hours (most recent first):",
-        file=discord.File('recent_logs.txt')
+        file=discord.File(log_file, filename='recent_logs.txt')
     )
 
-    os.remove('recent_logs.txt')
-
 
 @bot.tree.command(name="shutdown",
                   description="Safely shutdown the bot (Admin only). This will require restarting via ssh or direct access")
+@CheckRoles.brother_only()
 @app_commands.default_permissions()
 @log_command()
 async def shutdown(interaction: discord.Interaction):
-    if not await CheckRoles.check_brother_role(interaction):
-        return
-
     try:
         await interaction.response.send_message("🔄 Bot is shutting down...")
         logger.info(f"Bot shutdown initiated by {interaction.user.display_name}")
@@ -535,6 +762,15 @@ async def shutdown(interaction: discord.Interaction):
         # Stop the midnight update task if it's running
         if midnight_update.is_running():
             midnight_update.cancel()
+        if evict_idle_guilds.is_running():
+            evict_idle_guilds.cancel()
+        if snapshot_data.is_running():
+            snapshot_data.cancel()
+        if flush_writes.is_running():
+            flush_writes.cancel()
+        # Make sure every buffered write is on disk before going down
+        await asyncio.to_thread(GuildData.flush_all)
+        await asyncio.to_thread(checkpoint_ledgers)
 
         # Close the bot connection
         await bot.close()
@@ -544,6 +780,48 @@ async def shutdown(interaction: discord.Interaction):
         await interaction.response.send_message(f"❌ Error during shutdown: {str(e)}", ephemeral=True)
 
 
+# Unload the data of guilds that have not used the bot recently
+@tasks.loop(minutes=5)
+async def evict_idle_guilds():
+    try:
+        GuildData.registry.evict_idle()
+    except Exception as e:
+        logger.error(f"Error evicting idle guild data: {str(e)}")
+
+
+def checkpoint_ledgers():
+    # Lets a restart load each guild's point totals from a checkpoint instead of replaying its whole history.
+    # Only guild stores: the default store in DATA_DIR is not used by the bot and may not hold any data files.
+    for store in GuildData.registry.loaded():
+        try:
+            Ledger.checkpoint(store.storage)
+        except Exception as e:
+            logger.error(f"Error checkpointing ledger of guild {store.guild_id}: {str(e)}")
+
+
+# Copy the data files of every loaded guild into its backups/ directory, off the write path,
+# move their history into the columnar archive and checkpoint the point totals
+@tasks.loop(minutes=SNAPSHOT_MINUTES)
+async def snapshot_data():
+    for store in GuildData.registry.loaded():
+        try:
+            await asyncio.to_thread(store.storage.snapshot)
+        except Exception as e:
+            logger.error(f"Error snapshotting data of guild {store.guild_id}: {str(e)}")
+        for table in Archive.ARCHIVE_TABLES:
+            try:
+                await asyncio.to_thread(Archive.update, store.storage, table)
+            except Exception as e:
+                logger.error(f"Error archiving {table} of guild {store.guild_id}: {str(e)}")
+    await asyncio.to_thread(checkpoint_ledgers)
+
+
+# Write buffered data changes of every loaded guild to disk as one group
+@tasks.loop(seconds=FLUSH_SECONDS)
+async def flush_writes():
+    await asyncio.to_thread(GuildData.flush_all)
+
+
 # Start the midnight_update task when the bot is ready
 @midnight_update.before_loop
 async def before_midnight_update():
@@ -558,6 +836,9 @@ async def main():
 
         # Start the midnight update task
         midnight_update.start()
+        evict_idle_guilds.start()
+        snapshot_data.start()
+        flush_writes.start()
 
         # Then connect and start processing events
         await bot.connect()
@@ -566,15 +847,14 @@ async def main():
     finally:
         if not bot.is_closed():
             await bot.close()
+        GuildData.flush_all()
 
 
 @bot.tree.command(name="status", description="Get bot and server status information")
+@CheckRoles.brother_only()
 @app_commands.default_permissions()
 @log_command()
 async def status(interaction: discord.Interaction):
-    if not await CheckRoles.check_brother_role(interaction):
-        return
-
     try:
         # Get bot uptime
         uptime = datetime.now(pytz.UTC) - bot.start_time
@@ -623,49 +903,49 @@ async def status(interaction: discord.Interaction):
 
 
 @bot.tree.command(name="interactive_plot", description="Show an interactive plot of pledge points over time")
+@Throttle.limit()
+@CheckRoles.brother_only()
+@Messaging.auto_defer(slow=True)
 @log_command()
 async def plot(interaction: discord.Interaction):
     """
     Command to display an interactive plot showing pledge points over time
     """
     try:
-        if not await CheckRoles.check_brother_role(interaction):
-            return
-
         # Check if required files exist
-        if not os.path.exists('Points.csv'):
-            await interaction.response.send_message("Error: Points.csv file not found.", ephemeral=True)
+        if not GuildData.storage().exists("points"):
+            await Messaging.respond(interaction, "Error: Points.csv file not found.", ephemeral=True)
             return
 
         # Verify we have pledges
         pledges = PointSystem.get_pledges()
         if not pledges:
-            await interaction.response.send_message("No pledges found in the system.", ephemeral=True)
+            await Messaging.respond(interaction, "No pledges found in the system.", ephemeral=True)
             return
 
         await fn.interactive_plot(interaction)
 
     except Exception as e:
         logger.error(f"Error in plot command: {str(e)}")
-        if not interaction.response.is_done():
-            await interaction.response.send_message(
-                f"An error occurred while creating the interactive plot: {str(e)}",
-                ephemeral=True
-            )
+        await Messaging.respond(
+            interaction,
+            f"An error occurred while creating the interactive plot: {str(e)}",
+            ephemeral=True
+        )
 
 
 @bot.tree.command(
     name="list_pending_points",
     description="List all pending points changes"
 )
+@Throttle.limit()
+@CheckRoles.brother_only()
+@Messaging.auto_defer()
 @log_command()
 async def listpending(interaction: discord.Interaction):
-    if not await CheckRoles.check_brother_role(interaction):
-        return
-
     df = PointSystem.get_pending_points_csv()
     if df.empty:
-        await interaction.response.send_message("No pending points changes.", ephemeral=True)
+        await Messaging.respond(interaction, "No pending points changes.", ephemeral=True)
         return
 
     # Format pending changes
@@ -680,23 +960,125 @@ async def listpending(interaction: discord.Interaction):
             f"Index {idx}: {emoji} {row['Name']}: {row['Point_Change']:+d} points\n"  # Changed format here
             f"   Requested by: {row['Requester']}\n"
             f"   Comment: {row['Comments']}"
+            + (f"\n   Batch: {row['Batch']}" if 'Batch' in row and pd.notna(row['Batch']) else "")
         )
 
-    await interaction.response.send_message(
-        "Pending Points Changes (Resend this command after approval/disapproval becuase indices will change):\n\n" + "\n\n".join(
-            pending_list)
+    await Messaging.send_long_message(
+        interaction,
+        "Pending Points Changes (Resend this command after approval/disapproval becuase indices will change):\n\n"
+        + "\n\n".join(pending_list),
+        filename="pending_points.txt"
     )
 
 
+@bot.tree.command(name="list_terms", description="List the current term and the closed terms")
+@CheckRoles.brother_only()
+@log_command()
+async def listterms(interaction: discord.Interaction):
+    terms = Terms.get_terms()
+    lines = [f"Current term: {terms['current'] or 'unnamed'}"]
+    for record in reversed(terms["closed"]):
+        end = datetime.fromtimestamp(record["end"], tz=pytz.utc).strftime("%Y-%m-%d")
+        lines.append(f"- {record['name']}: closed {end}, {record['rows']['points']} points changes, "
+                     f"{record['rows']['interviews']} interviews")
+    await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
+
+@bot.tree.command(name="close_term",
+                  description="Archive this term's points and interviews and start a new term (VP Internal only)")
+@CheckRoles.vp_internal_only()
+@app_commands.describe(name="Name of the term being closed, e.g. 'Fall 2025'",
+                       next_name="Name of the term that starts now")
+@Messaging.auto_defer(slow=True)
+@log_command()
+async def closeterm(interaction: discord.Interaction, name: str = None, next_name: str = None):
+    closing = name or Terms.get_terms()["current"]
+    if Terms.close_term(name, next_name) == 0:
+        await Messaging.respond(
+            interaction, f"✅ Closed {closing}. Its points and interviews are archived and can be viewed with "
+                         f"the term option of /show_pledge_ranking, /get_pledge_points and /get_interview_rankings.")
+    else:
+        await Messaging.respond(interaction, "❌ Could not close the term. Give it a name that no closed term "
+                                             "already has.", ephemeral=True)
+
+
+@bot.tree.command(name="approval_rules", description="List the rules that approve or reject points requests automatically")
+@CheckRoles.brother_only()
+@log_command()
+async def approvalrules(interaction: discord.Interaction):
+    rules = Rules.get_rules()
+    if not rules:
+        await interaction.response.send_message("No approval rules. Every points request waits for VP Internal.",
+                                                ephemeral=True)
+        return
+    lines = [f"{i + 1}. {Rules.describe(rule)}" for i, rule in enumerate(rules)]
+    # Rules name members and roles as mentions, which must not ping them
+    await interaction.response.send_message("Approval rules, first match wins:\n" + "\n".join(lines), ephemeral=True,
+                                            allowed_mentions=discord.AllowedMentions.none())
+
+
+@bot.tree.command(name="add_approval_rule", description="Approve or reject matching points requests automatically")
+@CheckRoles.vp_internal_only()
+@app_commands.choices(action=[app_commands.Choice(name="Approve", value=Rules.APPROVE),
+                              app_commands.Choice(name="Reject", value=Rules.REJECT)])
+@app_commands.describe(max_change="Only requests changing points by at most this much either way",
+                       requester="Only requests from this member",
+                       role="Only requests from members with this role",
+                       duplicate_minutes="Only requests repeating the same change within this many minutes")
+@log_command()
+async def addapprovalrule(interaction: discord.Interaction, action: app_commands.Choice[str],
+                          max_change: app_commands.Range[int, 0, 35] = None, requester: discord.Member = None,
+                          role: discord.Role = None, duplicate_minutes: app_commands.Range[float, 0.1, 1440.0] = None):
+    members = [requester.id] if requester else None
+    roles = [role.id] if role else None
+    if Rules.add_rule(action.value, max_change, members, roles, duplicate_minutes) == 0:
+        await interaction.response.send_message(f"✅ Added approval rule: {Rules.describe(Rules.get_rules()[-1])}",
+                                                allowed_mentions=discord.AllowedMentions.none())
+    else:
+        await interaction.response.send_message("❌ A rule needs at least one condition.", ephemeral=True)
+
+
+@bot.tree.command(name="remove_approval_rule", description="Remove an approval rule by its number in /approval_rules")
+@CheckRoles.vp_internal_only()
+@log_command()
+async def removeapprovalrule(interaction: discord.Interaction, number: int):
+    if Rules.remove_rule(number - 1) == 0:
+        await interaction.response.send_message(f"✅ Removed approval rule {number}")
+    else:
+        await interaction.response.send_message(f"❌ There is no approval rule {number}.", ephemeral=True)
+
+
+@bot.tree.command(name="preview_pending_rankings",
+                  description="Show the rankings as they would be if the pending points changes were approved")
+@Throttle.limit()
+@CheckRoles.brother_only()
+@app_commands.describe(batch="Only include the changes of this batch")
+@Messaging.auto_defer()
+@log_command()
+async def previewrankings(interaction: discord.Interaction, batch: str = None):
+    version = GuildData.storage().version("points", "pending", "pledges")
+    rankings = await read_cache.run(("preview_rankings", version, batch), PointSystem.preview_rankings, batch)
+    title = (f"Projected rankings with batch {batch} approved" if batch
+             else "Projected rankings with all pending changes approved")
+    await Messaging.send_long_message(interaction, f"{title}:\n" + "\n".join(rankings),
+                                      filename="preview_rankings.txt")
+
+
+@bot.tree.command(name="review_pending_points", description="Approve or reject pending points changes with buttons")
+@CheckRoles.vp_internal_only()
+@Messaging.auto_defer()
+@log_command()
+async def reviewpending(interaction: discord.Interaction):
+    await fn.review_pending(interaction)
+
+
 @bot.tree.command(
     name="approve_points",
     description="Approve pending points changes (VP Internal only). Use comma-separated indices (e.g., '0,1,3')"
 )
+@CheckRoles.vp_internal_only()
 @log_command()
 async def approvepoints(interaction: discord.Interaction, indices: str):
-    if not await CheckRoles.check_vp_internal_role(interaction):
-        return
-
     # Parse indices
     try:
         index_list = [int(idx.strip()) for idx in indices.split(',')]
@@ -709,7 +1091,8 @@ async def approvepoints(interaction: discord.Interaction, indices: str):
 
     responses = []
     for index in index_list:
-        success, message, point_data = PointSystem.approve_pending_points(index)
+        success, message, point_data = PointSystem.approve_pending_points(index, interaction.user.display_name,
+                                                                          interaction.user.id)
         if success:
             emoji = "🔺" if point_data['Point_Change'] > 0 else "🔻"
             responses.append(
@@ -723,18 +1106,16 @@ async def approvepoints(interaction: discord.Interaction, indices: str):
 
     # Reverse the responses so they appear in original index order
     responses.reverse()
-    await interaction.response.send_message("\n\n".join(responses))
+    await Messaging.send_long_message(interaction, "\n\n".join(responses))
 
 
 @bot.tree.command(
     name="reject_points",
     description="Reject pending points changes (VP Internal only). Use comma-separated indices (e.g., '0,1,3')"
 )
+@CheckRoles.vp_internal_only()
 @log_command()
 async def rejectpoints(interaction: discord.Interaction, indices: str):
-    if not await CheckRoles.check_vp_internal_role(interaction):
-        return
-
     # Parse indices
     try:
         index_list = [int(idx.strip()) for idx in indices.split(',')]
@@ -761,7 +1142,50 @@ async def rejectpoints(interaction: discord.Interaction, indices: str):
 
     # Reverse the responses so they appear in original index order
     responses.reverse()
-    await interaction.response.send_message("\n\n".join(responses))
+    await Messaging.send_long_message(interaction, "\n\n".join(responses))
+
+
+@bot.tree.command(
+    name="import_points",
+    description="Request many points changes at once from a CSV file with pledge, change and comment columns"
+)
+@Throttle.limit()
+@CheckRoles.brother_only()
+@app_commands.describe(file="CSV file with a header row of pledge,change,comment")
+@Messaging.auto_defer()
+@log_command()
+async def importpoints(interaction: discord.Interaction, file: discord.Attachment):
+    if file.size > MAX_IMPORT_BYTES:
+        await Messaging.respond(interaction, "❌ The file is too large to import.", ephemeral=True)
+        return
+    batch, problems = PointSystem.import_pending_points(await file.read(), interaction.user.display_name,
+                                                        interaction.user.id)
+    if batch is None:
+        await Messaging.send_long_message(
+            interaction, "❌ Nothing was imported. Fix these rows and try again:\n" + "\n".join(problems),
+            ephemeral=True, filename="import_errors.txt")
+        return
+    count = (PointSystem.get_pending_points_csv()["Batch"] == batch).sum()
+    await Messaging.respond(
+        interaction,
+        f"📝 {interaction.user.display_name} requested {count} points changes as batch {batch}.\n"
+        f"Status: Awaiting VP Internal approval with /approve_batch")
+
+
+@bot.tree.command(name="approve_batch", description="Approve every points change of an imported batch (VP Internal only)")
+@CheckRoles.vp_internal_only()
+@Messaging.auto_defer()
+@log_command()
+async def approvebatch(interaction: discord.Interaction, batch: str):
+    success, message, changes = PointSystem.approve_pending_batch(batch, interaction.user.display_name,
+                                                                  interaction.user.id)
+    if not success:
+        await Messaging.respond(interaction, f"❌ {message}", ephemeral=True)
+        return
+    lines = [f"{'🔺' if row['Point_Change'] > 0 else '🔻'} {row['Name']}: {int(row['Point_Change']):+d} points"
+             f" - {row['Comments']}" for _, row in changes.iterrows()]
+    await Messaging.send_long_message(interaction, f"✅ Batch {batch}: {message}\n" + "\n".join(lines),
+                                      filename="approved_batch.txt")
 
 
 # Run the bot
@@ -770,5 +1194,6 @@ if __name__ == "__main__":
         asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Bot shutdown by user")
+        GuildData.flush_all()
     except Exception as e:
         logger.critical(f"Fatal error during startup: {str(e)}")
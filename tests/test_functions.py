@@ -2,21 +2,38 @@ import os
 # Add project root to Python path
 import sys
 import time
+from datetime import datetime, timedelta, timezone
 from unittest.mock import MagicMock, patch, AsyncMock
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import pytest
+from discord import AllowedMentions, app_commands
 
+import Archive
 import CheckRoles
+import GuildData
+import Idempotency
 import Interviews
+import Ledger
+import Messaging
 import PointSystem
+import Rules
+import Schema
+import Search
+import SingleFlight
+import Storage
+import Terms
+import Throttle
 import functions
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import functions as fn
 
+# Tests read the data files right after each change, so write them synchronously
+GuildData.configure(write_behind=False)
+
 # Fixtures
 @pytest.fixture
 def setup_test_files():
@@ -60,7 +77,7 @@ def setup_test_files():
     
     # Cleanup
     for file in ['pledges.csv', 'Points.csv', 'PendingPoints.csv',
-                 'pledge_points_graph.png', 'points_over_time.png', "Interviews.csv"]:
+                 'pledge_points_graph.png', 'points_over_time.png', 'interviews.csv']:
         if os.path.exists(file):
             os.remove(file)
     
@@ -70,6 +87,14 @@ def setup_test_files():
             os.remove(os.path.join('backups', file))
         os.rmdir('backups')
 
+@pytest.fixture
+def memory_store():
+    """Run the test against an in-memory store instead of files in the working directory"""
+    store = GuildData.GuildStore(None, Storage.MemoryStorage())
+    with GuildData.use_store(store):
+        yield store
+
+
 # Test File Operations
 def test_file_creation(setup_test_files):
     """Test automatic file creation"""
@@ -81,12 +106,12 @@ def test_file_creation(setup_test_files):
     # Test get_points_csv creates file
     df = PointSystem.get_points_csv()
     assert os.path.exists('Points.csv')
-    assert list(df.columns) == ["Time", "Name", "Point_Change", "Comments"]
+    assert list(df.columns) == ["Time", "Name", "Point_Change", "Comments", "Requester", "Approver"]
     
     # Test get_pending_points_csv creates file
     df = PointSystem.get_pending_points_csv()
     assert os.path.exists('PendingPoints.csv')
-    assert list(df.columns) == ["Time", "Name", "Point_Change", "Comments", "Requester"]
+    assert list(df.columns) == ["Time", "Name", "Point_Change", "Comments", "Requester", "Batch", "ID"]
 
 # Test Pledge Management
 def test_pledge_operations(setup_test_files):
@@ -177,6 +202,8 @@ def test_visualization_functions(setup_test_files):
     assert img_points.shape[1] >= 600  # Width
     assert img_timeline.shape[0] >= 400
     assert img_timeline.shape[1] >= 600
+    # Graphs are drawn without pyplot, so rendering from worker threads touches no shared state
+    assert plt.get_fignums() == []
     
     # Clean up
     plt.close('all')
@@ -208,6 +235,7 @@ async def test_interactive_plot(setup_test_files):
     # Mock Discord interaction
     mock_interaction = MagicMock()
     mock_interaction.response = MagicMock()
+    mock_interaction.response.is_done = MagicMock(return_value=False)
     mock_interaction.response.send_message = AsyncMock()
     
     # Test interactive plot generation
@@ -263,6 +291,7 @@ async def test_role_checking():
     mock_interaction.user = MagicMock()
     mock_interaction.user.roles = [brother_role]
     mock_interaction.response = MagicMock()
+    mock_interaction.response.is_done = MagicMock(return_value=False)
     mock_interaction.response.send_message = AsyncMock()
     
     # Test Brother role present
@@ -299,7 +328,7 @@ def test_error_handling(setup_test_files):
         f.write("corrupted,data\n")
     df = PointSystem.get_points_csv()
     assert isinstance(df, pd.DataFrame)
-    assert list(df.columns) == ["Time", "Name", "Point_Change", "Comments"]
+    assert list(df.columns) == ["Time", "Name", "Point_Change", "Comments", "Requester", "Approver"]
 
 # Test Data Validation
 def test_data_validation(setup_test_files):
@@ -472,7 +501,1168 @@ class TestEdgeCases:
         mock_interaction.guild = MagicMock()
         mock_interaction.guild.roles = []
         mock_interaction.response = MagicMock()
+        mock_interaction.response.is_done = MagicMock(return_value=False)
         mock_interaction.response.send_message = AsyncMock()
 
         assert await CheckRoles.check_brother_role(mock_interaction) == False
         assert await CheckRoles.check_vp_internal_role(mock_interaction) == False
+
+
+# Test Outbound Messaging
+class TestMessaging:
+    def test_chunk_message(self):
+        """Test splitting long content at line boundaries"""
+        lines = [f"{i}. Pledge{i}: {i} interviews" for i in range(300)]
+        chunks = Messaging.chunk_message("\n".join(lines))
+        assert len(chunks) > 1
+        assert all(len(chunk) <= Messaging.MESSAGE_LIMIT for chunk in chunks)
+        # No line is split across chunks and nothing is lost
+        assert "\n".join(chunks).split("\n") == lines
+
+        # Lines longer than the limit are hard-split
+        chunks = Messaging.chunk_message("x" * 4500)
+        assert [len(chunk) for chunk in chunks] == [2000, 2000, 500]
+        assert Messaging.chunk_message("") == []
+
+    def test_token_bucket(self):
+        """Test token bucket pacing"""
+        bucket = Messaging.TokenBucket(rate=1.0, capacity=2)
+        assert bucket.try_acquire() == 0
+        assert bucket.try_acquire() == 0
+        assert bucket.try_acquire() > 0
+
+    @pytest.mark.asyncio
+    async def test_send_long_message(self):
+        """Test long responses are sent as a reply plus paced followups"""
+        mock_interaction = MagicMock()
+        mock_interaction.channel_id = 1
+        mock_interaction.response.is_done = MagicMock(return_value=False)
+        mock_interaction.response.send_message = AsyncMock()
+        mock_interaction.followup.send = AsyncMock()
+
+        content = "\n".join(f"line {i} " + "y" * 80 for i in range(60))
+        await Messaging.send_long_message(mock_interaction, content)
+        mock_interaction.response.send_message.assert_called_once()
+        assert mock_interaction.followup.send.call_count == len(Messaging.chunk_message(content)) - 1
+
+        # Very long content goes out as a single attachment
+        mock_interaction.response.send_message.reset_mock()
+        mock_interaction.followup.send.reset_mock()
+        await Messaging.send_long_message(mock_interaction, content * 10)
+        mock_interaction.response.send_message.assert_called_once()
+        assert "file" in mock_interaction.response.send_message.call_args.kwargs
+        mock_interaction.followup.send.assert_not_called()
+
+    def test_latency_tracker(self):
+        """Test deferral decisions from latency history"""
+        tracker = Messaging.LatencyTracker(size=5)
+        assert tracker.estimate("cmd") is None
+        assert tracker.should_defer("cmd", 1.5) is False
+        assert tracker.should_defer("cmd", 1.5, default=True) is True
+
+        for _ in range(5):
+            tracker.record("cmd", 0.1)
+        assert tracker.should_defer("cmd", 1.5) is False
+
+        # Slow runs push the estimate over the threshold and old runs age out
+        for _ in range(5):
+            tracker.record("cmd", 2.0)
+        assert tracker.estimate("cmd") == 2.0
+        assert tracker.should_defer("cmd", 1.5) is True
+
+    @pytest.mark.asyncio
+    async def test_auto_defer(self):
+        """Test slow commands are deferred and answered with a followup"""
+        mock_interaction = MagicMock()
+        mock_interaction.response.is_done = MagicMock(return_value=False)
+        mock_interaction.response.defer = AsyncMock()
+
+        @Messaging.auto_defer(slow=True)
+        async def slow_command(interaction):
+            return "done"
+
+        @Messaging.auto_defer()
+        async def fast_command(interaction):
+            return "done"
+
+        assert await slow_command(mock_interaction) == "done"
+        mock_interaction.response.defer.assert_called_once()
+
+        mock_interaction.response.defer.reset_mock()
+        assert await fast_command(mock_interaction) == "done"
+        mock_interaction.response.defer.assert_not_called()
+        assert Messaging.latency_tracker.estimate("fast_command") is not None
+
+        # Once deferred, replies go through the followup webhook
+        mock_interaction.response.is_done = MagicMock(return_value=True)
+        mock_interaction.followup.send = AsyncMock()
+        await Messaging.respond(mock_interaction, "result")
+        mock_interaction.followup.send.assert_called_once()
+        kwargs = mock_interaction.followup.send.call_args.kwargs
+        assert kwargs["content"] == "result"
+        # Replies echo member input, so they never ping anyone
+        assert kwargs["allowed_mentions"].to_dict() == AllowedMentions.none().to_dict()
+
+    @pytest.mark.asyncio
+    async def test_ephemeral_reply_after_public_deferral(self):
+        """Test an ephemeral reply to a publicly deferred command replaces the placeholder privately"""
+        mock_interaction = MagicMock()
+        mock_interaction.extras = {}
+        mock_interaction.response.is_done = MagicMock(return_value=False)
+        mock_interaction.response.defer = AsyncMock()
+        mock_interaction.delete_original_response = AsyncMock()
+        mock_interaction.followup.send = AsyncMock()
+
+        @Messaging.auto_defer(slow=True)
+        async def failing_command(interaction):
+            interaction.response.is_done = MagicMock(return_value=True)
+            await Messaging.respond(interaction, "❌ Bad input", ephemeral=True)
+            await Messaging.respond(interaction, "More detail", ephemeral=True)
+
+        await failing_command(mock_interaction)
+        mock_interaction.response.defer.assert_called_once_with(thinking=True, ephemeral=False)
+        mock_interaction.delete_original_response.assert_called_once()
+        assert mock_interaction.followup.send.call_count == 2
+        assert mock_interaction.followup.send.call_args.kwargs["ephemeral"] is True
+
+
+# Test Cached Role Checks
+class TestRoleCache:
+    def _interaction(self, guild_roles, member_roles):
+        mock_interaction = MagicMock()
+        mock_interaction.guild.id = 1234
+        mock_interaction.guild.roles = guild_roles
+        mock_interaction.user.roles = member_roles
+        return mock_interaction
+
+    def _role(self, role_id, name):
+        role = MagicMock()
+        role.id = role_id
+        role.name = name
+        return role
+
+    def test_role_cache_invalidation(self):
+        """Test cached role IDs are reused until invalidated"""
+        CheckRoles.invalidate_roles()
+        brother = self._role(1, "Brother")
+        mock_interaction = self._interaction([brother], [brother])
+        assert CheckRoles.has_role(mock_interaction, "Brother")
+
+        # A renamed role keeps its ID, so the cached mapping is stale until the update event
+        brother.name = "Alumni"
+        assert CheckRoles.has_role(mock_interaction, "Brother")
+        CheckRoles.invalidate_roles(1234)
+        assert not CheckRoles.has_role(mock_interaction, "Brother")
+        assert CheckRoles.has_role(mock_interaction, "Alumni")
+
+        # A new role with the name is found without waiting for an event, since a miss rebuilds the mapping
+        replacement = self._role(2, "Brother")
+        mock_interaction.guild.roles = [brother, replacement]
+        mock_interaction.user.roles = [replacement]
+        assert CheckRoles.has_role(mock_interaction, "Brother")
+        assert CheckRoles.get_role_ids(mock_interaction.guild, "Missing") == frozenset()
+
+    def test_require_role_check(self):
+        """Test reusable app command checks"""
+        CheckRoles.invalidate_roles()
+        vp = self._role(3, "VP Internal")
+        mock_interaction = self._interaction([vp], [vp])
+
+        @CheckRoles.vp_internal_only()
+        async def command(interaction):
+            pass
+
+        predicate = command.__discord_app_commands_checks__[0]
+        assert predicate(mock_interaction) is True
+        mock_interaction.user.roles = []
+        with pytest.raises(app_commands.MissingRole):
+            predicate(mock_interaction)
+
+
+# Test Request Coalescing
+class TestSingleFlight:
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_share_one_computation(self):
+        """Test identical concurrent requests run the computation once"""
+        import asyncio
+        calls = []
+
+        def compute(value):
+            calls.append(value)
+            time.sleep(0.05)
+            return value * 2
+
+        flight = SingleFlight.SingleFlight(ttl=60)
+        results = await asyncio.gather(*[flight.run(("double", 1), compute, 21) for _ in range(10)])
+        assert results == [42] * 10
+        assert calls == [21]
+
+        # Served from the result cache afterwards, and a new data version recomputes
+        assert await flight.run(("double", 1), compute, 21) == 42
+        assert calls == [21]
+        assert await flight.run(("double", 2), compute, 21) == 42
+        assert calls == [21, 21]
+
+    def test_data_version(self, setup_test_files):
+        """Test data versions change when a table is written"""
+        storage = GuildData.storage()
+        before = storage.version("points", "pledges")
+        time.sleep(0.01)
+        PointSystem.update_points("TestPledge1", 5, "Version bump")
+        assert storage.version("points", "pledges") != before
+        assert storage.version("interviews") == storage.version("interviews")
+
+
+# Test Command Throttling
+class TestThrottle:
+    def test_weighted_user_limit(self):
+        """Test expensive commands use up a user's allowance faster"""
+        limiter = Throttle.CommandThrottle(user_rate=0.1, user_burst=6, guild_rate=10, guild_burst=100,
+                                           weights={"show_points_history": 3})
+        assert limiter.acquire(1, 10, "show_points_history") == 0
+        assert limiter.acquire(1, 10, "show_points_history") == 0
+        assert limiter.acquire(1, 10, "show_points_history") > 0
+        # Other users have their own allowance
+        assert limiter.acquire(2, 10, "show_points_history") == 0
+
+    def test_guild_limit_does_not_charge_rejected_calls(self):
+        """Test the shared guild limit and that rejected calls cost nothing"""
+        limiter = Throttle.CommandThrottle(user_rate=0.1, user_burst=5, guild_rate=0.1, guild_burst=2, weights={})
+        assert limiter.acquire(1, 10, "cmd") == 0
+        assert limiter.acquire(2, 10, "cmd") == 0
+        assert limiter.acquire(3, 10, "cmd") > 0
+        # User 3 was rejected by the guild bucket, so their own tokens are untouched
+        assert limiter._user_buckets[3].wait_time(5) == 0
+
+    def test_limit_check_raises_cooldown(self):
+        """Test the app command check reports throttling as a cooldown"""
+        limiter = Throttle.CommandThrottle(user_rate=0.1, user_burst=1, weights={})
+
+        @limiter.limit()
+        async def command(interaction):
+            pass
+
+        predicate = command.__discord_app_commands_checks__[0]
+        mock_interaction = MagicMock()
+        mock_interaction.command.name = "cmd"
+        mock_interaction.user.id = 1
+        mock_interaction.guild.id = 10
+        assert predicate(mock_interaction) is True
+        with pytest.raises(app_commands.CommandOnCooldown) as error:
+            predicate(mock_interaction)
+        assert error.value.retry_after > 0
+
+
+# Test Per-Guild Data Isolation
+class TestGuildData:
+    def test_guilds_have_separate_data(self, tmp_path, monkeypatch):
+        """Test each guild reads and writes its own files"""
+        monkeypatch.setattr(GuildData, "registry", GuildData.GuildRegistry(str(tmp_path)))
+
+        with GuildData.use_guild(1):
+            assert fn.add_pledge("GuildOnePledge") == 0
+            assert PointSystem.update_points("GuildOnePledge", 10, "Guild one") == 0
+        with GuildData.use_guild(2):
+            assert PointSystem.get_pledges() == []
+            assert PointSystem.update_points("GuildOnePledge", 10, "Wrong guild") == 1
+
+        with GuildData.use_guild(1):
+            assert PointSystem.get_pledge_points("GuildOnePledge") == 10
+        assert os.path.exists(tmp_path / "1" / "Points.csv")
+        assert os.path.exists(tmp_path / "2" / "interviews.csv")
+        # Outside a guild the default store is used again
+        assert GuildData.current() is GuildData.default_store
+
+    def test_idle_stores_are_evicted(self, tmp_path):
+        """Test stores are loaded lazily and evicted when idle"""
+        registry = GuildData.GuildRegistry(str(tmp_path))
+        store = registry.get(1)
+        assert registry.get(1) is store
+        assert registry.evict_idle(max_idle=60) == 0
+        store.last_used -= 120
+        assert registry.evict_idle(max_idle=60) == 1
+        assert registry.loaded() == []
+
+    def test_memory_stores_are_not_evicted(self, monkeypatch):
+        """Test idle in-memory stores are kept, since evicting them would lose their data"""
+        monkeypatch.setattr(GuildData, "STORAGE_BACKEND", "memory")
+        registry = GuildData.GuildRegistry()
+        store = registry.get(1)
+        store.last_used -= 120
+        assert registry.evict_idle(max_idle=60) == 0
+        assert registry.get(1) is store
+
+
+# Test In-Memory Storage Backend
+class TestMemoryStorage:
+    def test_points_and_interviews_in_memory(self, memory_store, tmp_path, monkeypatch):
+        """Test the full points and interview flow without touching disk"""
+        monkeypatch.chdir(tmp_path)
+        assert fn.add_pledge("MemoryPledge") == 0
+        assert fn.add_pledge("OtherPledge") == 0
+        assert fn.delete_pledge("OtherPledge") == 0
+        assert PointSystem.get_pledges() == ["MemoryPledge"]
+
+        assert PointSystem.update_points("MemoryPledge", 10, "Memory") == 0
+        assert PointSystem.add_pending_points("MemoryPledge", 5, "Pending", "Brother1") == 0
+        success, message, data = PointSystem.approve_pending_points(0)
+        assert success
+        assert PointSystem.get_pledge_points("MemoryPledge") == 15
+        assert PointSystem.get_pending_points_csv().empty
+        assert PointSystem.get_ranked_pledges()[0].startswith("1. MemoryPledge: 15 points")
+
+        assert Interviews.add_interview("MemoryPledge", "Brother1", 1, time.time()) == 0
+        assert Interviews.get_quality_interviews("MemoryPledge") == 1
+
+        # Nothing was written to the working directory
+        assert os.listdir(tmp_path) == []
+
+    def test_stores_do_not_share_state(self):
+        """Test separate in-memory stores are independent"""
+        first = GuildData.GuildStore(None, Storage.MemoryStorage())
+        second = GuildData.GuildStore(None, Storage.MemoryStorage())
+        with GuildData.use_store(first):
+            fn.add_pledge("OnlyInFirst")
+        with GuildData.use_store(second):
+            assert PointSystem.get_pledges() == []
+            assert not CheckRoles.check_pledge("OnlyInFirst")
+
+    def test_configure_data_dir(self, tmp_path):
+        """Test the data directory is configurable"""
+        try:
+            GuildData.configure(data_dir=str(tmp_path))
+            GuildData.default_store.storage.ensure_files()
+            fn.add_pledge("RootPledge")
+            assert os.path.exists(tmp_path / "pledges.csv")
+            with GuildData.use_guild(5):
+                assert PointSystem.get_pledges() == []
+            assert os.path.exists(tmp_path / "guilds" / "5" / "Points.csv")
+        finally:
+            GuildData.configure(data_dir=".")
+
+
+class TestDurableWrites:
+    def test_atomic_write_keeps_old_file_on_failure(self, tmp_path, monkeypatch):
+        """Test a failed write leaves the previous contents and no temp files behind"""
+        target = tmp_path / "Points.csv"
+        Storage.atomic_write(str(target), "old\n")
+
+        def fail_replace(src, dst):
+            raise OSError("disk full")
+
+        monkeypatch.setattr(Storage.os, "replace", fail_replace)
+        with pytest.raises(OSError):
+            Storage.atomic_write(str(target), "new\n")
+        assert target.read_text() == "old\n"
+        assert os.listdir(tmp_path) == ["Points.csv"]
+
+    def test_snapshot_rotation(self, tmp_path, monkeypatch):
+        """Test snapshots are only taken after changes and old ones are rotated out"""
+        storage = Storage.FileStorage(str(tmp_path))
+        storage.ensure_files()
+        storage.add_pledge("SnapPledge")
+        monkeypatch.setattr(Storage, "MAX_BACKUPS", 2)
+
+        assert storage.snapshot() == 4
+        assert storage.snapshot() == 0
+
+        for stamp in ["20240101-000001", "20240101-000002"]:
+            monkeypatch.setattr(Storage.time, "strftime", lambda fmt, stamp=stamp: stamp)
+            storage.append_rows("points", [{"Time": time.time(), "Name": "SnapPledge",
+                                            "Point_Change": 1, "Comments": ""}])
+            assert storage.snapshot() == 4
+        backups = os.listdir(tmp_path / "backups")
+        assert len([f for f in backups if f.startswith("Points_backup_")]) == 2
+        assert "Points_backup_20240101-000002.csv" in backups
+
+
+class TestWriteBehind:
+    def test_writes_are_buffered_until_flush(self, tmp_path):
+        """Test buffered writes are visible immediately but only reach disk on flush"""
+        storage = Storage.FileStorage(str(tmp_path), write_behind=True)
+        storage.ensure_files()
+        store = GuildData.GuildStore(None, storage)
+        with GuildData.use_store(store):
+            fn.add_pledge("BufferedPledge")
+            assert PointSystem.update_points("BufferedPledge", 7, "Buffered") == 0
+            assert Interviews.add_interview("BufferedPledge", "Brother1", 1, time.time()) == 0
+            assert PointSystem.get_pledge_points("BufferedPledge") == 7
+            assert pd.read_csv(tmp_path / "Points.csv").empty
+
+            assert storage.flush() == 2
+            assert pd.read_csv(tmp_path / "Points.csv")["Point_Change"].tolist() == [7]
+            assert len(pd.read_csv(tmp_path / "interviews.csv")) == 1
+            assert storage.flush() == 0
+
+    def test_own_writes_are_not_parsed_again(self, tmp_path):
+        """Test files this process just wrote are served from memory, while outside changes are still seen"""
+        storage = Storage.FileStorage(str(tmp_path), write_behind=True)
+        storage.ensure_files()
+        storage.read_table("points")
+        with patch.object(Storage, "parse_table", wraps=Storage.parse_table) as parse:
+            for i in range(3):
+                storage.append_rows("points", [{"Time": float(i), "Name": None, "Point_Change": 1, "Comments": ""}])
+                storage.flush()
+            assert parse.call_count == 0
+            pd.DataFrame({"Time": [9.0], "Pledge_ID": [None], "Point_Change": [4], "Comments": ["outside"]}).to_csv(
+                tmp_path / "Points.csv", index=False)
+            assert storage.read_table("points")["Comments"].tolist() == ["outside"]
+            assert parse.call_count == 1
+
+    def test_flush_after_record_limit(self, tmp_path, monkeypatch):
+        """Test a group commit happens once enough writes are buffered"""
+        monkeypatch.setattr(Storage, "FLUSH_RECORDS", 3)
+        storage = Storage.FileStorage(str(tmp_path), write_behind=True)
+        storage.ensure_files()
+        for i in range(3):
+            storage.append_rows("pending", [{"Time": time.time(), "Name": "P", "Point_Change": i,
+                                             "Comments": "", "Requester": "B"}])
+        assert len(pd.read_csv(tmp_path / "PendingPoints.csv")) == 3
+
+    def test_external_changes_are_reloaded(self, tmp_path):
+        """Test the in-memory copy is dropped when the file is changed by something else"""
+        storage = Storage.FileStorage(str(tmp_path))
+        storage.ensure_files()
+        storage.append_rows("points", [{"Time": 1.0, "Name": "A", "Point_Change": 1, "Comments": ""}])
+        assert len(storage.read_table("points")) == 1
+        pd.DataFrame({"Time": [1.0, 2.0], "Name": ["A", "B"], "Point_Change": [1, 2],
+                      "Comments": ["", ""]}).to_csv(tmp_path / "Points.csv", index=False)
+        assert len(storage.read_table("points")) == 2
+
+
+class TestLedger:
+    @staticmethod
+    def _row(name, change, comment=""):
+        return {"Time": time.time(), "Name": name, "Point_Change": change, "Comments": comment}
+
+    def test_checkpoint_and_tail_replay(self, tmp_path):
+        """Test a restart loads the checkpoint and only replays rows written after it"""
+        storage = Storage.FileStorage(str(tmp_path))
+        storage.ensure_files()
+        storage.append_rows("points", [self._row("A", 5, "first"), self._row("B", 3)])
+        Ledger.checkpoint(storage)
+
+        storage.append_rows("points", [self._row("A", -2, "latest")])
+        state, replayed = Ledger.load(storage)
+        assert replayed == 1
+        # Totals are kept by pledge ID; A and B were registered as pledges 1 and 2 by their first rows
+        assert state.totals == {1: 3, 2: 3}
+        assert state.last_comments[1] == "latest"
+        assert state.rows == 3
+
+    def test_rewritten_ledger_is_replayed_in_full(self, tmp_path):
+        """Test a checkpoint that no longer matches the file is ignored"""
+        storage = Storage.FileStorage(str(tmp_path))
+        storage.ensure_files()
+        storage.append_rows("points", [self._row("A", 5), self._row("B", 3)])
+        Ledger.checkpoint(storage)
+
+        storage.write_table("points", pd.DataFrame([self._row("C", 1)]))
+        state, replayed = Ledger.load(storage)
+        assert replayed == 1
+        assert state.totals == {3: 1}
+
+    def test_in_memory_ledger_follows_writes(self, memory_store):
+        """Test point totals stay current as points are added"""
+        fn.add_pledge("LedgerPledge")
+        assert PointSystem.get_pledge_points("LedgerPledge") == 0
+        assert PointSystem.update_points("LedgerPledge", 4, "One") == 0
+        assert PointSystem.update_points("LedgerPledge", 6, "Two") == 0
+        assert PointSystem.get_pledge_points("LedgerPledge") == 10
+        assert memory_store.cache["ledger"].rows == 2
+        assert "(Two)" in PointSystem.get_ranked_pledges()[0]
+
+
+class TestPointHistory:
+    def test_totals_and_rankings_as_of(self, memory_store):
+        """Test totals and rankings at past timestamps"""
+        fn.add_pledge("Early")
+        fn.add_pledge("Late")
+        memory_store.storage.write_table("points", pd.DataFrame({
+            "Time": [300.0, 100.0, 200.0, 400.0],
+            "Name": ["Late", "Early", "Early", "Late"],
+            "Point_Change": [4, 5, -1, 10],
+            "Comments": ["l1", "e1", "e2", "l2"],
+        }))
+        assert PointSystem.get_pledge_points("Early", as_of=50.0) == 0
+        assert PointSystem.get_pledge_points("Early", as_of=150.0) == 5
+        assert PointSystem.get_pledge_points("Early", as_of=200.0) == 4
+        assert PointSystem.get_pledge_points("Late", as_of=350.0) == 4
+        assert PointSystem.get_pledge_points("Late") == 14
+
+        rankings = PointSystem.get_ranked_pledges(as_of=250.0)
+        assert rankings[0] == "1. Early: 4 points (e2)"
+        assert rankings[1] == "2. Late: 0 points"
+        assert PointSystem.get_ranked_pledges(as_of=300.0)[0] == "1. Late: 4 points (l1)"
+
+    def test_parse_as_of(self):
+        """Test as_of dates are read as UTC, with plain dates meaning the end of the day"""
+        assert Ledger.parse_as_of("2024-01-01 12:00") == 1704110400.0
+        assert 1704153599 < Ledger.parse_as_of("2024-01-01") < 1704153600
+        with pytest.raises(ValueError):
+            Ledger.parse_as_of("last week")
+
+
+class TestRankSnapshots:
+    def test_rank_movement(self, memory_store):
+        """Test rankings show movement against the daily snapshots"""
+        for pledge in ["Alpha", "Beta", "Gamma"]:
+            fn.add_pledge(pledge)
+        today = datetime.now(timezone.utc)
+        PointSystem.update_points("Gamma", 3, "Start")
+        PointSystem.save_rank_snapshot((today - timedelta(days=8)).strftime("%Y-%m-%d"))
+        PointSystem.update_points("Beta", 5, "Middle")
+        PointSystem.save_rank_snapshot((today - timedelta(days=1)).strftime("%Y-%m-%d"))
+        PointSystem.update_points("Alpha", 10, "Top")
+
+        rankings = PointSystem.get_ranked_pledges()
+        assert rankings[0] == "1. Alpha: 10 points [▲2 1d, ▲2 7d] (Top)"
+        assert rankings[1] == "2. Beta: 5 points [▼1 1d, = 7d] (Middle)"
+        assert rankings[2] == "3. Gamma: 3 points [▼1 1d, ▼2 7d] (Start)"
+        # Past rankings never show movement
+        assert "[" not in PointSystem.get_ranked_pledges(as_of=time.time())[0]
+
+    def test_snapshots_are_pruned(self, memory_store, monkeypatch):
+        """Test only the newest snapshots are kept"""
+        monkeypatch.setattr(PointSystem, "RANK_SNAPSHOT_DAYS", 2)
+        for day in ["2024-01-01", "2024-01-02", "2024-01-03"]:
+            PointSystem.save_rank_snapshot(day)
+        assert sorted(memory_store.storage.read_json(PointSystem.RANK_SNAPSHOTS)) == ["2024-01-02", "2024-01-03"]
+
+
+class TestArchive:
+    @staticmethod
+    def _rows(names, start):
+        return [{"Time": float(start + i), "Name": name, "Point_Change": 1, "Comments": f"c{start + i}"}
+                for i, name in enumerate(names)]
+
+    def test_archive_plus_tail(self, tmp_path):
+        """Test analytics read archived rows plus only the rows written after the archive"""
+        pytest.importorskip("pyarrow")
+        storage = Storage.FileStorage(str(tmp_path))
+        storage.ensure_files()
+        storage.append_rows("points", self._rows(["A", "B", "A"], 0))
+        assert Archive.update(storage, "points") == 3
+        assert Archive.update(storage, "points") == 0
+
+        storage.append_rows("points", self._rows(["B"], 10))
+        df = Archive.load_table("points", storage)
+        assert df["Name"].tolist() == ["A", "B", "A", "B"]
+        assert df["Time"].tolist() == [0.0, 1.0, 2.0, 10.0]
+
+        assert Archive.update(storage, "points") == 1
+        assert len(Archive.load_table("points", storage)) == 4
+
+    def test_rewritten_csv_ignores_archive(self, tmp_path):
+        """Test a rewritten CSV file is read directly instead of the stale archive"""
+        pytest.importorskip("pyarrow")
+        storage = Storage.FileStorage(str(tmp_path))
+        storage.ensure_files()
+        storage.append_rows("points", self._rows(["A", "B"], 0))
+        Archive.update(storage, "points")
+        storage.write_table("points", pd.DataFrame(self._rows(["C"], 5)))
+        assert Archive.load_table("points", storage)["Name"].tolist() == ["C"]
+        assert Archive.update(storage, "points") == 1
+
+    def test_updates_append_parts(self, tmp_path):
+        """Test each update only writes its new rows, and parts are merged once there are too many"""
+        pytest.importorskip("pyarrow")
+        storage = Storage.FileStorage(str(tmp_path))
+        storage.ensure_files()
+        with patch.object(Archive, "MAX_PARTS", 3):
+            for i in range(4):
+                storage.append_rows("points", self._rows(["A", "B"], i * 10))
+                assert Archive.update(storage, "points") == 2
+                parts = sorted(os.listdir(Archive.archive_dir(storage, "points")))
+                assert len(parts) == (i + 1 if i < 3 else 1)
+        df = Archive.load_table("points", storage)
+        assert df["Time"].tolist() == [0.0, 1.0, 10.0, 11.0, 20.0, 21.0, 30.0, 31.0]
+        assert df["Name"].tolist() == ["A", "B"] * 4
+
+    def test_memory_storage_reads_directly(self, memory_store):
+        """Test in-memory stores never use an archive"""
+        assert not Archive.available()
+        memory_store.storage.append_rows("points", self._rows(["A"], 0))
+        assert Archive.update() == 0
+        assert Archive.load_table("points")["Name"].tolist() == ["A"]
+
+
+class TestCompactLedger:
+    def test_arrays_and_views(self):
+        """Test the compact ledger layout and per-pledge views"""
+        history = Ledger.PointHistory(pd.DataFrame({
+            "Time": [3.0, 1.0, 2.0, 4.0, 5.0],
+            "Pledge_ID": [2, 1, 2, 1, 1],
+            "Point_Change": [2, 5, 1, -3, 4],
+            "Comments": ["same", "same", np.nan, "other", "same"],
+        }))
+        assert history.pledge_ids.dtype == np.int32
+        assert history.times.dtype == np.float64
+        assert history.changes.dtype == np.int16
+        assert history.pledges == [2, 1]
+        assert len(history._comments) == 2
+
+        times, totals = history.series(1)
+        assert np.shares_memory(times, history.times)
+        assert times.tolist() == [1.0, 4.0, 5.0]
+        assert totals.tolist() == [5, 2, 6]
+        assert history.series(2)[1].tolist() == [1, 3]
+        assert history.total(2, 2.5) == 1
+        assert history.last_comment(2, 2.5) is None
+        assert history.last_comment(1, 4.0) == "other"
+        assert history.total(99, 10.0) == 0
+        assert history.total(None, 10.0) == 0
+
+        # Rows of a merged pledge count towards the pledge it was merged into
+        merged = Ledger.PointHistory(pd.DataFrame({
+            "Time": [1.0, 2.0], "Pledge_ID": [1, 2], "Point_Change": [5, 1], "Comments": ["", ""]}), {1: 2, 2: 2})
+        assert merged.total(2, 3.0) == 6
+
+    def test_fractional_changes_are_kept(self):
+        """Test point changes that don't fit int16 keep their values"""
+        history = Ledger.PointHistory(pd.DataFrame({
+            "Time": [1.0, 2.0], "Pledge_ID": [1, 1], "Point_Change": [1.5, 40000], "Comments": ["", ""],
+        }))
+        assert history.changes.dtype == np.float64
+        assert history.total(1, 3.0) == 40001.5
+
+
+class TestPledgeRegistry:
+    def test_rename_merge_and_remove_keep_history(self, tmp_path):
+        """Test renames, merges and removals only touch the registry"""
+        storage = Storage.FileStorage(str(tmp_path))
+        storage.ensure_files()
+        with GuildData.use_store(GuildData.GuildStore(None, storage)):
+            for pledge in ["Alice", "Alcie", "Bob"]:
+                assert fn.add_pledge(pledge) == 0
+            PointSystem.update_points("Alice", 5, "Study hours")
+            PointSystem.update_points("Alcie", 3, "Typo entry")
+            Interviews.add_interview("Alcie", "Brother1", 1, time.time())
+            points_file = (tmp_path / "Points.csv").read_bytes()
+            assert "Pledge_ID" in points_file.decode()
+
+            assert fn.merge_pledges("Alcie", "Alice") == 0
+            assert PointSystem.get_pledges() == ["Alice", "Bob"]
+            assert PointSystem.get_pledge_points("Alice") == 8
+            assert Interviews.get_quality_interviews("Alice") == 1
+
+            assert fn.rename_pledge("Alice", "Alicia") == 0
+            assert fn.rename_pledge("Bob", "Alicia") == 1
+            assert PointSystem.get_pledge_points("Alicia") == 8
+            assert PointSystem.get_ranked_pledges()[0].startswith("1. Alicia: 8 points")
+
+            assert fn.delete_pledge("Alicia") == 0
+            assert PointSystem.get_pledges() == ["Bob"]
+            assert fn.add_pledge("Alicia") == 0
+            assert PointSystem.get_pledge_points("Alicia") == 8
+
+            # None of this rewrote the ledger
+            assert (tmp_path / "Points.csv").read_bytes() == points_file
+            fp, _ = storage.export("points")
+            assert "Alicia" in fp.read().decode()
+
+    def test_reused_names_keep_ids(self, tmp_path):
+        """Test a removed pledge's name given to another pledge never moves history between them"""
+        storage = Storage.FileStorage(str(tmp_path))
+        storage.ensure_files()
+        with GuildData.use_store(GuildData.GuildStore(None, storage)):
+            for pledge in ["Bob", "Robert", "Carl", "Dan"]:
+                assert fn.add_pledge(pledge) == 0
+            assert PointSystem.update_points("Bob", 10, "Rush") == 0
+            assert PointSystem.update_points("Robert", 3, "Study") == 0
+            assert PointSystem.add_pending_points("Bob", 4, "Chapter", "Bro1") == 0
+            assert fn.delete_pledge("Bob") == 0
+            assert fn.rename_pledge("Robert", "Bob") == 0
+
+            assert PointSystem.get_pledge_points("Bob") == 3
+            assert PointSystem.get_ranked_pledges()[0].startswith("1. Bob: 3 points")
+            # The old Bob's request stays pending rather than going to the new Bob
+            assert PointSystem.approve_pending_points(0, "VP1")[0] is False
+            assert PointSystem.update_points("Bob", 1, "Event") == 0
+            assert PointSystem.get_pledge_points("Bob") == 4
+            assert Search.audit(pledge="Bob")[1] == 2
+            assert pd.read_csv(tmp_path / "Points.csv")["Pledge_ID"].tolist() == [1, 2, 2]
+
+            # Merged pledges count towards the target but keep their own IDs
+            assert PointSystem.update_points("Carl", 2, "Study") == 0
+            assert fn.merge_pledges("Carl", "Dan") == 0
+            assert PointSystem.get_pledge_points("Dan") == 2
+            assert PointSystem.update_points("Dan", 5, "Rush") == 0
+            assert PointSystem.get_pledge_points("Dan") == 7
+            assert pd.read_csv(tmp_path / "Points.csv")["Pledge_ID"].tolist() == [1, 2, 2, 3, 4]
+
+    def test_legacy_files_are_migrated(self, tmp_path):
+        """Test bare pledge lists and name-based tables from older versions still work"""
+        (tmp_path / "pledges.csv").write_text("Old1\nOld2\n")
+        pd.DataFrame({"Time": [1.0, 2.0], "Name": ["Old1", "Gone"], "Point_Change": [4, 2],
+                      "Comments": ["a", "b"]}).to_csv(tmp_path / "Points.csv", index=False)
+        storage = Storage.FileStorage(str(tmp_path))
+        storage.ensure_files()
+        assert storage.read_pledges() == ["Old1", "Old2"]
+        assert storage.read_table("points")["Name"].tolist() == ["Old1", "Gone"]
+
+        storage.append_rows("points", [{"Time": 3.0, "Name": "Old2", "Point_Change": 1, "Comments": "c"}])
+        stored = pd.read_csv(tmp_path / "Points.csv")
+        assert list(stored.columns) == ["Time", "Pledge_ID", "Point_Change", "Comments"]
+        assert storage.read_table("points")["Name"].tolist() == ["Old1", "Gone", "Old2"]
+        # History of pledges that were deleted before IDs existed is kept under a removed record
+        assert storage.read_pledges() == ["Old1", "Old2"]
+
+
+class TestCommentSearch:
+    def test_search_filters(self, memory_store):
+        """Test searching comments with pledge, requester and time filters"""
+        fn.add_pledge("Alpha")
+        fn.add_pledge("Beta")
+        memory_store.storage.write_table("points", pd.DataFrame({
+            "Time": [100.0, 200.0, 300.0, 400.0],
+            "Name": ["Alpha", "Beta", "Alpha", "Beta"],
+            "Point_Change": [-5, -5, 3, 2],
+            "Comments": ["Missing study hours", "missed STUDY hours again", "Study hours done", "Cleaned up"],
+            "Requester": ["Bro1", "Bro2", "Bro1", None],
+            "Requester_ID": ["1", "2", "1", None],
+        }))
+        results, total = Search.search_points("study hours")
+        assert total == 3
+        assert [row["Time"] for row in results] == [300.0, 200.0, 100.0]
+        assert Search.search_points("study", pledge="alpha")[1] == 2
+        assert Search.search_points("hours", requester_id=2)[0][0]["Name"] == "Beta"
+        assert Search.search_points("hours", start=150.0, end=250.0)[1] == 1
+        assert Search.search_points("study nothing") == ([], 0)
+        assert Search.search_points("hours", limit=1)[1] == 3
+
+    def test_index_is_incremental(self, memory_store):
+        """Test new ledger rows are indexed without rebuilding the index"""
+        fn.add_pledge("Gamma")
+        assert PointSystem.update_points("Gamma", 2, "Chapter attendance", "Bro1", requester_id=1) == 0
+        index = Search.get_index()
+        assert Search.search_points("attendance", requester_id=1)[1] == 1
+        assert PointSystem.update_points("Gamma", 4, "Late to chapter") == 0
+        assert Search.search_points("chapter")[1] == 2
+        assert Search.get_index() is index
+        assert index.rows == 2
+
+
+class TestAudit:
+    def test_approval_records_requester_and_approver(self, memory_store):
+        """Test approved changes keep who requested and approved them"""
+        fn.add_pledge("Delta")
+        # Discord user IDs are larger than a float can hold exactly
+        bro_id, vp_id = 312345678901234567, 412345678901234567
+        assert PointSystem.add_pending_points("Delta", 5, "Helped at rush", "Bro1", bro_id) == 0
+        assert PointSystem.add_pending_points("Delta", 2, "Rush again", "Bro1", bro_id) == 0
+        success, _, _ = PointSystem.approve_pending_points(0, "VP1", vp_id)
+        assert success
+        changes, _, _ = PointSystem.approve_pending_ids(PointSystem.get_pending_changes()["ID"].tolist(), "VP1", vp_id)
+        assert len(changes) == 1
+        rows = PointSystem.get_points_csv()
+        assert rows[["Requester", "Approver"]].values.tolist() == [["Bro1", "VP1"]] * 2
+        assert rows[["Requester_ID", "Approver_ID"]].values.tolist() == [[str(bro_id), str(vp_id)]] * 2
+        results, total = Search.audit(approver_id=vp_id)
+        assert total == 2
+        assert results[0]["Requester"] == "Bro1"
+        assert Search.audit(requester_id=bro_id)[1] == 2
+
+    def test_audit_ignores_display_names(self, memory_store):
+        """Test a member using someone else's display name is not audited as them"""
+        fn.add_pledge("Delta")
+        assert PointSystem.update_points("Delta", 1, "Real", "VP1", "VP1", 1, 1) == 0
+        assert PointSystem.update_points("Delta", 1, "Spoofed", "VP1", "VP1", 2, 2) == 0
+        results, total = Search.audit(requester_id=1)
+        assert [row["Comments"] for row in results] == ["Real"]
+        assert Search.audit(approver_id=2)[0][0]["Comments"] == "Spoofed"
+
+    def test_audit_filters(self, memory_store):
+        """Test audits combine the time index with the pledge and people indexes"""
+        fn.add_pledge("Alpha")
+        fn.add_pledge("Beta")
+        memory_store.storage.write_table("points", pd.DataFrame({
+            "Time": [300.0, 100.0, 200.0, 400.0],
+            "Name": ["Alpha", "Beta", "Alpha", "Beta"],
+            "Point_Change": [1, 2, 3, 4],
+            "Comments": ["a", "b", "c", "d"],
+            "Requester": ["Bro1", "Bro2", "Bro1", "Bro1"],
+            "Approver": ["VP1", "VP1", "VP2", None],
+            "Requester_ID": ["1", "2", "1", "1"],
+            "Approver_ID": ["11", "11", "12", None],
+        }))
+        assert Search.audit() == ([], 0)
+        results, total = Search.audit(start=150.0, end=350.0)
+        assert [row["Time"] for row in results] == [300.0, 200.0]
+        assert Search.audit(requester_id=1, start=250.0)[1] == 2
+        assert Search.audit(pledge="Alpha", approver_id=11)[0][0]["Point_Change"] == 1
+        assert Search.audit(approver_id=11, end=150.0)[0][0]["Name"] == "Beta"
+        assert Search.audit(requester_id=99) == ([], 0)
+
+        # Rows added out of time order still land in the right place in the time index
+        memory_store.storage.append_rows("points", [
+            {"Time": 150.0, "Name": "Alpha", "Point_Change": 5, "Comments": "e", "Requester": "Bro2"}])
+        assert [row["Time"] for row in Search.audit(start=100.0, end=200.0)[0]] == [200.0, 150.0, 100.0]
+
+
+class TestBulkImport:
+    def test_import_and_approve_batch(self, memory_store):
+        """Test a valid file becomes one pending batch that is approved in one step"""
+        fn.add_pledge("Alpha")
+        fn.add_pledge("Beta")
+        assert PointSystem.add_pending_points("Alpha", 1, "Single request", "Bro2") == 0
+        data = b"Pledge, Change, Comment\nAlpha,5,Rush event\nBeta,-3,Missed rush event\n"
+        batch, problems = PointSystem.import_pending_points(data, "Bro1")
+        assert problems == []
+        pending = PointSystem.get_pending_points_csv()
+        assert (pending["Batch"] == batch).sum() == 2
+
+        success, message, changes = PointSystem.approve_pending_batch(batch.upper(), "VP1")
+        assert success
+        assert len(changes) == 2
+        assert PointSystem.get_pledge_points("Alpha") == 5
+        assert PointSystem.get_pledge_points("Beta") == -3
+        assert PointSystem.get_points_csv()["Approver"].tolist() == ["VP1", "VP1"]
+        # Only the single request is left pending
+        assert PointSystem.get_pending_points_csv()["Comments"].tolist() == ["Single request"]
+        assert PointSystem.approve_pending_batch(batch)[0] is False
+
+    def test_batch_leaves_pending_before_reaching_ledger(self, tmp_path):
+        """Test approved changes are removed from the pending file before the ledger is written"""
+        storage = Storage.FileStorage(str(tmp_path), write_behind=True)
+        storage.ensure_files()
+        with GuildData.use_store(GuildData.GuildStore(None, storage)):
+            fn.add_pledge("Alpha")
+            batch, _ = PointSystem.import_pending_points(b"pledge,change,comment\nAlpha,5,Rush\n", "Bro1")
+            storage.flush()
+            written = []
+            with patch.object(Storage, "atomic_write", side_effect=lambda path, data: written.append(
+                    os.path.basename(path))):
+                assert PointSystem.approve_pending_batch(batch, "VP1")[0]
+                storage.flush()
+        assert written == [Storage.TABLES["pending"][0], Storage.TABLES["points"][0]]
+
+    def test_invalid_rows_reject_the_file(self, memory_store):
+        """Test every invalid row is reported and nothing is added"""
+        fn.add_pledge("Alpha")
+        data = b"pledge,change,comment\nAlpha,5,ok\nGhost,5,who\nAlpha,40,too many\nAlpha,2.5,half\nAlpha,3,\nAlpha,0,zero\n"
+        batch, problems = PointSystem.import_pending_points(data, "Bro1")
+        assert batch is None
+        assert problems == [
+            "Row 3 (Ghost): unknown pledge",
+            "Row 4 (Alpha): the change must be between -35 and 35",
+            "Row 5 (Alpha): the change must be a whole number",
+            "Row 6 (Alpha): a comment is required",
+            "Row 7 (Alpha): the change cannot be 0",
+        ]
+        assert PointSystem.get_pending_points_csv().empty
+        assert PointSystem.import_pending_points(b"name,points\nAlpha,5\n", "Bro1")[0] is None
+
+    def test_same_change_for_many_pledges(self, memory_store):
+        """Test one request for several pledges is added as a single batch"""
+        for pledge in ["Alpha", "Beta", "Gamma"]:
+            fn.add_pledge(pledge)
+        batch, problems = PointSystem.add_pending_points_many(["Alpha", "Beta", "Alpha", " "], 5, "Attended chapter",
+                                                              "Bro1")
+        assert problems == []
+        pending = PointSystem.get_pending_points_csv()
+        assert pending["Name"].tolist() == ["Alpha", "Beta"]
+        assert set(pending["Batch"]) == {batch}
+        assert PointSystem.approve_pending_batch(batch, "VP1")[0]
+        assert PointSystem.get_pledge_points("Beta") == 5
+
+        assert PointSystem.add_pending_points_many(["Alpha", "Ghost"], 5, "Attended", "Bro1") == (
+            None, ["Unknown pledges: Ghost"])
+        assert PointSystem.add_pending_points_many(["Alpha"], 36, "Attended", "Bro1")[0] is None
+        assert PointSystem.add_pending_points_many(["Alpha"], 5, "  ", "Bro1")[0] is None
+        assert PointSystem.get_pending_points_csv().empty
+
+    @pytest.mark.asyncio
+    async def test_pledge_picker(self, memory_store):
+        """Test pledges are chosen across pages of the menu, however long their names are together"""
+        pledges = [f"Pledge {i:02d} with a rather long name for the menu" for i in range(30)]
+        for pledge in pledges:
+            assert fn.add_pledge(pledge) == 0
+        view = fn.PledgePickerView(fn.get_pledges(), 3, "Attended chapter")
+        interaction = MagicMock()
+        interaction.user.display_name = "Bro1"
+        interaction.user.id = 1
+        interaction.response.edit_message = AsyncMock()
+        interaction.followup.send = AsyncMock()
+
+        select = view.children[0]
+        assert len(select.options) == fn.PLEDGE_PAGE_SIZE
+        select._values = pledges[:2]
+        await select.callback(interaction)
+        await {item.label: item for item in view.children if hasattr(item, "label")}["Next"].callback(interaction)
+        select = view.children[0]
+        assert [option.label for option in select.options] == pledges[25:]
+        select._values = [pledges[29]]
+        await select.callback(interaction)
+        assert view.chosen_pledges() == [pledges[0], pledges[1], pledges[29]]
+
+        buttons = {item.label: item for item in view.children if hasattr(item, "label")}
+        await buttons["Request for 3 pledges"].callback(interaction)
+        pending = PointSystem.get_pending_points_csv()
+        assert pending["Name"].tolist() == [pledges[0], pledges[1], pledges[29]]
+        assert set(pending["Requester_ID"]) == {"1"}
+        assert "as batch" in interaction.followup.send.call_args.kwargs["content"]
+
+
+class TestPendingApproval:
+    def test_pending_ids(self, memory_store):
+        """Test pending changes keep their IDs while others are approved and rejected"""
+        fn.add_pledge("Alpha")
+        memory_store.storage.write_table("pending", pd.DataFrame({
+            "Time": [1.0, 2.0, 3.0], "Name": ["Alpha"] * 3, "Point_Change": [1, 2, 3],
+            "Comments": ["a", "b", "c"], "Requester": ["Bro1"] * 3}))
+        pending = PointSystem.get_pending_changes()
+        ids = pending["ID"].tolist()
+        assert len(set(ids)) == 3
+        # IDs given to older rows are saved
+        assert PointSystem.get_pending_changes()["ID"].tolist() == ids
+
+        rejected, failed, errored = PointSystem.reject_pending_ids([ids[0]])
+        assert rejected["Comments"].tolist() == ["a"] and failed == [] and errored == []
+        approved, failed, errored = PointSystem.approve_pending_ids([ids[2], ids[0]], "VP1")
+        assert approved["Comments"].tolist() == ["c"]
+        assert failed == [ids[0]] and errored == []
+        assert PointSystem.get_pledge_points("Alpha") == 3
+        assert PointSystem.get_pending_changes()["ID"].tolist() == [ids[1]]
+
+    def test_approval_validates_changes(self, memory_store):
+        """Test approved pending changes are checked and sanitized like direct ledger writes"""
+        fn.add_pledge("Alpha")
+        memory_store.storage.write_table("pending", pd.DataFrame({
+            "Time": [1.0, 2.0], "Name": ["Alpha"] * 2, "Point_Change": [4, 40],
+            "Comments": ["  Study\x07 hours ", "Too many"], "Requester": ["Bro1"] * 2}))
+        ids = PointSystem.get_pending_changes()["ID"].tolist()
+        approved, failed, errored = PointSystem.approve_pending_ids(ids, "VP1")
+        assert approved["Point_Change"].tolist() == [4]
+        assert failed == [ids[1]] and errored == []
+        assert PointSystem.get_points_csv()["Comments"].tolist() == ["Study hours"]
+        # The invalid change stays pending instead of reaching the ledger
+        assert PointSystem.get_pending_changes()["ID"].tolist() == [ids[1]]
+
+    @pytest.mark.asyncio
+    async def test_approval_view(self, memory_store):
+        """Test the approval view's buttons act on the changes they were drawn for"""
+        for pledge in ["Alpha", "Beta"]:
+            fn.add_pledge(pledge)
+        batch, _ = PointSystem.add_pending_points_many(["Alpha", "Beta"], 2, "Attended", "Bro1")
+        for i in range(4):
+            assert PointSystem.add_pending_points("Alpha", 1, f"Extra {i}", "Bro2") == 0
+
+        view = fn.PendingApprovalView(PointSystem.get_pending_changes())
+        assert "page 1/2 (6 left)" in view.content()
+        interaction = MagicMock()
+        interaction.user.display_name = "VP1"
+        interaction.response.edit_message = AsyncMock()
+
+        buttons = {item.label: item for item in view.children}
+        await buttons["Reject 2"].callback(interaction)
+        await buttons["Approve page"].callback(interaction)
+        assert PointSystem.get_pledge_points("Alpha") == 4
+        assert PointSystem.get_pledge_points("Beta") == 0
+        assert len(view.entries) == 2
+        assert "page 1/1 (2 left)" in interaction.response.edit_message.call_args.kwargs["content"]
+        assert PointSystem.get_pending_changes()["Comments"].tolist() == ["Extra 2", "Extra 3"]
+        assert PointSystem.get_points_csv()["Approver"].tolist() == ["VP1"] * 3
+
+        # Changes an error kept from being approved stay in the view to try again
+        with patch.object(memory_store.storage, "append_rows", side_effect=OSError("disk full")):
+            await {item.label: item for item in view.children}["Approve page"].callback(interaction)
+        assert len(view.entries) == 2
+        assert "try again" in view.log[-1]
+        assert len(PointSystem.get_pending_changes()) == 2
+        await {item.label: item for item in view.children}["Approve page"].callback(interaction)
+        assert view.entries == {}
+        assert PointSystem.get_pledge_points("Alpha") == 6
+
+
+class TestApprovalRules:
+    def test_rules_route_requests(self, memory_store):
+        """Test matching requests are applied or rejected and only the rest are queued"""
+        fn.add_pledge("Alpha")
+        assert Rules.add_rule(Rules.APPROVE) == 1
+        assert Rules.add_rule("maybe", max_change=5) == 1
+        assert Rules.add_rule(Rules.REJECT, duplicate_minutes=10) == 0
+        assert Rules.add_rule(Rules.APPROVE, max_change=5, members=[101]) == 0
+        assert [Rules.describe(rule) for rule in Rules.get_rules()] == [
+            "reject repeated within 10 minutes", "approve |change| <= 5 from <@101>"]
+
+        assert PointSystem.add_pending_points("Alpha", 3, "Study hours", "Bro1", 101) == 2
+        assert PointSystem.get_pledge_points("Alpha") == 3
+        # The stored approver is printed by /audit, so it must not mention anyone
+        assert PointSystem.get_points_csv()["Approver"].tolist() == ["rule: approve |change| <= 5 from member 101"]
+        # The same change again is a duplicate of the ledger entry
+        assert PointSystem.add_pending_points("Alpha", 3, " study HOURS", "Bro1", 101) == 3
+        # Too large, and from someone else: both wait for a person
+        assert PointSystem.add_pending_points("Alpha", 6, "Event", "Bro1", 101) == 0
+        assert PointSystem.add_pending_points("Alpha", 2, "Other", "Bro2", 102) == 0
+        assert PointSystem.add_pending_points("Alpha", 2, "Other", "Bro3", 103) == 3
+        assert PointSystem.get_pending_changes()["Comments"].tolist() == ["Event", "Other"]
+        assert PointSystem.get_pledge_points("Alpha") == 3
+
+        # Duplicates only count within the window
+        later = time.time() + 11 * 60
+        assert Rules.evaluate("Alpha", 2, "Other", 102, now=later) is None
+
+        assert Rules.remove_rule(0) == 0
+        assert Rules.remove_rule(5) == 1
+        assert PointSystem.add_pending_points("Alpha", 2, "Other", "Bro1", 101) == 2
+
+    def test_requesters_matched_by_id(self, memory_store):
+        """Test rules trust member and role IDs, never display names"""
+        fn.add_pledge("Alpha")
+        assert Rules.add_rule(Rules.APPROVE, roles=[7]) == 0
+        # A member renamed to look like a trusted one still waits for approval
+        assert PointSystem.add_pending_points("Alpha", 2, "Study", "Bro1", 999, [8]) == 0
+        assert PointSystem.add_pending_points("Alpha", 2, "Rush", "Anyone", 555, [8, 7]) == 2
+        assert Rules.describe(Rules.get_rules()[0], mentions=False) == "approve from role 7"
+
+    def test_approved_changes_over_limit_are_queued(self, memory_store):
+        """Test a rule-approved change that can't be applied waits for a VP instead of being lost"""
+        fn.add_pledge("Alpha")
+        assert Rules.add_rule(Rules.APPROVE, roles=[7]) == 0
+        assert PointSystem.add_pending_points("Alpha", PointSystem.POINT_LIMIT + 5, "Rush", "Bro1", 1, [7]) == 0
+        assert PointSystem.get_pending_changes()["Point_Change"].tolist() == [PointSystem.POINT_LIMIT + 5]
+        assert PointSystem.get_pledge_points("Alpha") == 0
+
+    def test_duplicates_read_only_the_window(self, memory_store):
+        """Test duplicate checks find recent ledger entries through the time index"""
+        fn.add_pledge("Alpha")
+        now = time.time()
+        memory_store.storage.write_table("points", pd.DataFrame({
+            "Time": [now - 86400 * day for day in range(100, 0, -1)] + [now - 60],
+            "Name": ["Alpha"] * 101, "Point_Change": [2] * 101, "Comments": ["Study"] * 101}))
+        assert Rules.add_rule(Rules.REJECT, duplicate_minutes=5) == 0
+        Search.get_index()
+        with patch.object(memory_store.storage, "read_table", wraps=memory_store.storage.read_table) as read:
+            assert Rules.evaluate("Alpha", 2, "study ", 1, now=now) is not None
+            assert Rules.evaluate("Alpha", 3, "Study", 1, now=now) is None
+        # The ledger is never read in full; only the second check reaches the pending requests
+        assert [call.args[0] for call in read.call_args_list] == ["pending"]
+
+
+class TestIdempotency:
+    def test_repeats_return_original_result(self, memory_store):
+        """Test a repeated request is answered without writing again"""
+        fn.add_pledge("Alpha")
+        cache = Idempotency.IdempotencyCache()
+        key = Idempotency.request_key("change_pledge_points", 1, 42, "Alpha", 5, "Rush")
+        assert key == Idempotency.request_key("change_pledge_points", 1, 42, " Alpha", 5, "Rush ")
+        assert key != Idempotency.request_key("change_pledge_points", 1, 43, "Alpha", 5, "Rush")
+        for _ in range(3):
+            assert cache.run(key, PointSystem.add_pending_points, "Alpha", 5, "Rush", "Bro1") == 0
+        assert len(PointSystem.get_pending_points_csv()) == 1
+
+        # Failures are retried
+        ghost = Idempotency.request_key("add_interview", 1, 42, "Ghost", "Bro1", 1)
+        func = MagicMock(side_effect=[1, 0])
+        assert cache.run(ghost, func) == 1
+        assert cache.run(ghost, func) == 0
+        assert cache.run(ghost, func) == 0
+        assert func.call_count == 2
+
+    def test_window_and_size_limits(self):
+        """Test remembered requests expire and the cache stays bounded"""
+        cache = Idempotency.IdempotencyCache(window=10, max_entries=2)
+        func = MagicMock(return_value=0)
+        with patch("ExpiringCache.time.monotonic", return_value=100.0):
+            for key in ["a", "b", "c"]:
+                cache.run(key, func)
+            cache.run("c", func)
+        assert func.call_count == 3
+        with patch("ExpiringCache.time.monotonic", return_value=105.0):
+            # "a" was the least recently used and was dropped
+            cache.run("a", func)
+            assert func.call_count == 4
+        with patch("ExpiringCache.time.monotonic", return_value=111.0):
+            cache.run("c", func)
+            assert func.call_count == 5
+
+
+class TestRankingPreview:
+    def test_preview_overlays_pending(self, memory_store):
+        """Test projected rankings add pending changes to the totals without writing"""
+        for pledge in ["Alpha", "Beta", "Gamma"]:
+            fn.add_pledge(pledge)
+        PointSystem.update_points("Alpha", 10, "Start")
+        PointSystem.update_points("Beta", 5, "Start")
+        assert PointSystem.preview_rankings() == ["No pending points changes"]
+        PointSystem.add_pending_points("Beta", 4, "Event", "Bro1")
+        PointSystem.add_pending_points("Beta", 3, "Event", "Bro1")
+        batch, _ = PointSystem.add_pending_points_many(["Gamma"], 12, "Event", "Bro1")
+        version = memory_store.storage.version("points", "pending")
+
+        assert PointSystem.preview_rankings() == [
+            "1. Gamma: 12 points (+12 pending) [▲2]",
+            "2. Beta: 12 points (+7 pending) [=]",
+            "3. Alpha: 10 points [▼2]",
+        ]
+        assert PointSystem.preview_rankings(batch)[0] == "1. Gamma: 12 points (+12 pending) [▲2]"
+        assert PointSystem.preview_rankings(batch)[1] == "2. Alpha: 10 points [▼1]"
+        assert PointSystem.preview_rankings("bnothing") == ["No pending points changes in batch bnothing"]
+        assert memory_store.storage.version("points", "pending") == version
+
+
+class TestTerms:
+    def test_close_term_archives_history(self, tmp_path):
+        """Test closing a term archives its rows and leaves the live tables empty"""
+        storage = Storage.FileStorage(str(tmp_path))
+        storage.ensure_files()
+        with GuildData.use_store(GuildData.GuildStore(None, storage)):
+            for pledge in ["Alpha", "Beta"]:
+                fn.add_pledge(pledge)
+            PointSystem.update_points("Alpha", 5, "Study hours")
+            PointSystem.update_points("Beta", 8, "Rush")
+            Interviews.add_interview("Alpha", "Bro1", 1, time.time())
+            assert PointSystem.get_ranked_pledges()[0].startswith("1. Beta: 8")
+
+            assert Terms.close_term() == 1
+            assert Terms.close_term("Fall 2025", "Spring 2026") == 0
+            assert Terms.close_term("fall-2025") == 1
+            assert (tmp_path / "terms" / "fall-2025_points.csv.gz").exists()
+            assert PointSystem.get_points_csv().empty
+            assert PointSystem.get_pledge_points("Beta") == 0
+            PointSystem.update_points("Alpha", 2, "New term")
+            assert PointSystem.get_ranked_pledges()[0] == "1. Alpha: 2 points (New term)"
+
+            assert PointSystem.get_term_rankings("FALL 2025") == [
+                "1. Beta: 8 points (Rush)", "2. Alpha: 5 points (Study hours)"]
+            assert PointSystem.get_term_points("Alpha", "Fall 2025") == 5
+            assert PointSystem.get_term_points("Alpha", "Fall 2024") is None
+            assert PointSystem.get_term_rankings("Fall 2024") == ["No closed term named Fall 2024"]
+            assert Interviews.interview_rankings(Terms.load_table("interviews", "Fall 2025"))["Alpha"] == 1
+            assert Interviews.get_quality_interviews("Alpha") == 0
+
+            terms = Terms.get_terms()
+            assert terms["current"] == "Spring 2026"
+            assert terms["closed"][0]["rows"] == {"points": 2, "interviews": 1}
+            # Archives stay readable after pledges are removed
+            fn.delete_pledge("Beta")
+            assert PointSystem.get_term_points("Beta", "Fall 2025") == 8
+
+
+class TestSchema:
+    def test_read_csv_types(self):
+        """Test data files load with their declared dtypes, keeping text as written"""
+        data = (b"Time,Pledge_ID,Point_Change,Comments,Requester,Extra\n"
+                b"1.5,1,5,\"late,\nagain\",007,x\n2,2,-3.0,,,y\n")
+        df = Schema.read_csv(data, ["Time", "Pledge_ID", "Point_Change", "Comments", "Requester", "Approver"])
+        assert list(df.columns) == ["Time", "Pledge_ID", "Point_Change", "Comments", "Requester", "Approver"]
+        assert df["Point_Change"].dtype == "Int64"
+        assert df["Pledge_ID"].tolist() == [1, 2]
+        assert df["Point_Change"].tolist() == [5, -3]
+        assert df["Comments"].tolist() == ["late,\nagain", None]
+        assert df["Requester"].tolist() == ["007", None]
+        assert df["Approver"].isna().all()
+
+    def test_invalid_values_become_missing(self):
+        """Test values that don't fit a column's type are dropped instead of failing the load"""
+        df = Schema.read_csv(b"Time,Point_Change,Comments\n1,abc,x\n2,4,y\n", ["Time", "Point_Change", "Comments"])
+        assert df["Point_Change"].isna().tolist() == [True, False]
+        assert df["Point_Change"].dtype == "Int64"
+
+    def test_empty_tables_keep_types(self, memory_store):
+        """Test rows appended to a new table keep integer point changes"""
+        fn.add_pledge("Alpha")
+        PointSystem.update_points("Alpha", 3, "Study hours")
+        assert memory_store.storage.read_table("points")["Point_Change"].dtype == "Int64"
+        assert Storage.empty_table("interviews")["Quality"].dtype == "Int64"